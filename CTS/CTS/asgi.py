@@ -3,6 +3,13 @@ ASGI config for CTS project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Live endpoints such as contests/<pk>/results/stream/ (server-sent events)
+only stay open under this application, e.g.
+``gunicorn CTS.asgi:application -k uvicorn.workers.UvicornWorker``; under
+WSGI they answer with one snapshot and let the client reconnect. The other
+streamed responses (exports, Drive downloads) go through CTS.streaming, so
+they are streamed chunk by chunk under either server.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -2,6 +2,7 @@
 Django settings for CTS project.
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -122,9 +123,109 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # File-backed test database so threaded tests get real SQLite locking
+        # (the default shared in-memory database fails instead of waiting)
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# ---------------------------
+# CACHE
+# ---------------------------
+
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at Redis or
+# Memcached so every worker shares the same entries.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'campus-hub'),
+    }
+}
+
+# Seconds the global leaderboard is served from cache before one worker refreshes it
+LEADERBOARD_CACHE_TTL = 30
+
+# Number of top ranks pushed by the live contest results stream
+CONTEST_STREAM_TOP_K = 50
+
+# Seconds a pre-serialized question paper stays cached (edits change the key anyway)
+QUESTION_PAPER_CACHE_TTL = 86400
+
+# Threads used to score submissions against their question paper
+GRADING_WORKERS = 4
+
+# Largest number of users one bulk contest registration may enrol
+CONTEST_BULK_JOIN_MAX = 5000
+
+# Google Drive clients kept per user (file/utils/drive_clients.py): how many
+# users, for how long (seconds), and the socket timeout of their connections
+DRIVE_CLIENT_CACHE_SIZE = 256
+DRIVE_CLIENT_CACHE_TTL = 900
+GOOGLE_DRIVE_HTTP_TIMEOUT = 60
+
+# Optional local copy of the Drive v3 discovery document, to build clients offline
+GOOGLE_DRIVE_DISCOVERY_FILE = os.getenv('GOOGLE_DRIVE_DISCOVERY_FILE')
+
+# Uploads bigger than this are spooled to a temp file by Django instead of memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+
+# Bytes per request of a resumable Drive upload (kept to a multiple of 256 KiB),
+# and how many failed chunks in a row are resumed before giving up
+DRIVE_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DRIVE_UPLOAD_MAX_RESUMES = 5
+
+# Bytes fetched from Drive per ranged request when streaming a download, and
+# retries per chunk on connection errors / 5xx
+DRIVE_DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+DRIVE_DOWNLOAD_RETRIES = 3
+
+# Multi-select Drive operations: most files per request, and how many times
+# rate-limited items of a batch are sent again
+DRIVE_BULK_MAX_ITEMS = 1000
+DRIVE_BATCH_RETRIES = 2
+
+# Recursive Drive folder jobs (file/utils/drive_tree.py): pool threads per job,
+# per-user Drive calls per second (start / floor / ceiling, halved on a rate
+# limit and raised by DRIVE_RATE_STEP per success), retries per call, and how
+# often progress is written to the job row (seconds)
+DRIVE_JOB_WORKERS = 8
+DRIVE_USER_RATE = 10
+DRIVE_USER_MIN_RATE = 1
+DRIVE_USER_MAX_RATE = 20
+DRIVE_RATE_STEP = 0.2
+DRIVE_JOB_MAX_RETRIES = 6
+DRIVE_JOB_PROGRESS_INTERVAL = 1.0
+
+# Uploads, bulk operations and folder jobs run outside the request. 'thread'
+# runs each job on a thread of the web process; 'worker' leaves them queued for
+# `manage.py run_drive_jobs`. Uploads wait in DRIVE_JOB_UPLOAD_DIR until sent.
+DRIVE_JOB_RUNNER = 'thread'
+DRIVE_JOB_UPLOAD_DIR = BASE_DIR / 'drive_uploads'
+# Worker polling interval (seconds), how long a running job may go without a
+# heartbeat before it is queued again, and how many times it is tried
+DRIVE_JOB_POLL_INTERVAL = 1.0
+DRIVE_JOB_STALE_AFTER = 300
+DRIVE_JOB_MAX_ATTEMPTS = 3
+
+# Drive folder listings come from the DriveNode mirror (file/utils/drive_sync.py),
+# which pulls the Drive changes feed when older than this many seconds
+DRIVE_SYNC_INTERVAL = 30
+# How long one user's sync may hold its lock before another may start
+DRIVE_SYNC_LOCK_TIMEOUT = 600
+
+# Seconds the live share-link counts (drive/totalShared/) are cached
+SHARE_STATS_CACHE_TTL = 60
+
+# Accept contest submissions into an append-only journal (202 + receipt) and
+# insert them in batches from a background drainer, for deadline spikes
+SUBMISSION_JOURNAL_ENABLED = False
+SUBMISSION_JOURNAL_DIR = BASE_DIR / 'journal'
+SUBMISSION_DRAIN_INTERVAL = 0.5
+# How often each drainer also drains the other journals (left by dead workers)
+SUBMISSION_SWEEP_INTERVAL = 30
+
 # ---------------------------
 # AUTHENTICATION
 # ---------------------------
@@ -158,6 +259,15 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Default number of posts per page in the forum feed (?page_size= overrides it)
+FORUM_PAGE_SIZE = 20
+# Seconds the total post count shown with each feed page is cached
+FORUM_COUNT_CACHE_TTL = 60
+
+# Buffer likes/dislikes in memory and write net deltas every N seconds (hot posts)
+FORUM_REACTION_BUFFERING = False
+FORUM_REACTION_FLUSH_INTERVAL = 1.0
+
 # ---------------------------
 # CORS & CSRF CONFIG
 # ---------------------------
@@ -0,0 +1,39 @@
+"""
+Streaming bodies that stream under both WSGI and ASGI.
+
+Django consumes an iterator of the "wrong" kind into a list before sending it:
+a sync iterator under ASGI, an async one under WSGI. A large export or a Drive
+download would then sit in memory in full, and an endless event stream would
+never be sent at all. Views hand their sync iterator to `streaming_body()`,
+which keeps it as is under WSGI and, under ASGI, wraps it in an async iterator
+that pulls one chunk at a time from Django's sync thread.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+def is_asgi(request):
+    return isinstance(getattr(request, '_request', request), ASGIRequest)
+
+
+async def _pull(iterator):
+    # thread_sensitive keeps every step on the thread that owns the DB connection
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await next_chunk(iterator, _DONE)
+            if chunk is _DONE:
+                return
+            yield chunk
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+def streaming_body(request, iterable):
+    """`iterable` as StreamingHttpResponse content that is never buffered."""
+    iterator = iter(iterable)
+    return _pull(iterator) if is_asgi(request) else iterator
@@ -0,0 +1,64 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Submission
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = [
+    ('submission_id', 'id'),
+    ('participant_id', 'participant_id'),
+    ('user_id', 'participant__userId_id'),
+    ('username', 'participant__userId__username'),
+    ('contest_id', 'participant__contest_id'),
+    ('contest_title', 'participant__contest__title'),
+    ('submitted_at', 'submitted_at'),
+    ('score', 'score'),
+    ('submission', 'submission'),
+]
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_rows(contest_id):
+    """
+    Yields one dict per submission of a contest, joined with its participant
+    and contest. Rows are fetched with a server-side iterator in chunks, so
+    memory stays flat however many submissions there are.
+    """
+    rows = (
+        Submission.objects.filter(participant__contest_id=contest_id)
+        .order_by('id')
+        .values_list(*(column for _, column in EXPORT_FIELDS))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    names = [name for name, _ in EXPORT_FIELDS]
+    for row in rows:
+        yield dict(zip(names, row))
+
+
+class _Echo:
+    """File-like object whose write() just hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_lines(contest_id, file_format='csv'):
+    """Yields the export of a contest as CSV or JSON Lines text, one line at a time."""
+    if file_format == 'jsonl':
+        for row in export_rows(contest_id):
+            yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+        return
+
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in EXPORT_FIELDS])
+    for row in export_rows(contest_id):
+        row['submitted_at'] = row['submitted_at'].isoformat()
+        row['submission'] = json.dumps(row['submission'], cls=DjangoJSONEncoder)
+        yield writer.writerow(row.values())
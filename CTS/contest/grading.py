@@ -0,0 +1,192 @@
+import logging
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .models import QuestionPaper, Submission
+from .leaderboard import invalidate_leaderboard
+from .ranking import rebuild_rankings
+
+logger = logging.getLogger(__name__)
+
+GRADING_BATCH_SIZE = 500
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'GRADING_WORKERS', 4),
+    thread_name_prefix='grader',
+)
+
+
+def _normalize(answer):
+    """
+    Canonical form of an answer: text is trimmed and lower-cased, and numbers
+    compare by value whether they arrive as 4, 4.0 or "4".
+    """
+    if isinstance(answer, bool):
+        return answer
+    if isinstance(answer, (int, float)):
+        return float(answer)
+    if isinstance(answer, str):
+        text = answer.strip().lower()
+        try:
+            number = float(text)
+        except ValueError:
+            return text
+        return number if math.isfinite(number) else text
+    if isinstance(answer, (list, tuple, set)):
+        # Multi-select answers are compared without regard to order
+        return frozenset(_normalize(a) for a in answer)
+    return answer
+
+
+def _answers_of(submission):
+    """
+    Maps question id -> answer for a submission, which is either
+    {"<question id>": answer, ...} or [{"question_id": ..., "answer": ...}, ...].
+    """
+    if isinstance(submission, dict):
+        submission = submission.get('answers', submission)
+    if isinstance(submission, dict):
+        return {str(key): value for key, value in submission.items()}
+    answers = {}
+    for item in submission or []:
+        if isinstance(item, dict):
+            key = item.get('question_id', item.get('id'))
+            answers[str(key)] = item.get('answer')
+    return answers
+
+
+class AnswerKey:
+    """
+    Pre-processed QuestionPaper used to score many submissions.
+
+    `questions` is a list of {"id": ..., "answer": ..., "marks": ...}
+    (a {"questions": [...]} wrapper is accepted too). Questions without
+    `marks` share whatever is left of `max_score` equally; an optional
+    `negative_marks` is deducted for a wrong (not a missing) answer.
+    """
+
+    def __init__(self, paper):
+        questions = paper.questions
+        if isinstance(questions, dict):
+            questions = questions.get('questions', [])
+
+        # Numbered before filtering, so a question without an answer doesn't shift the ids after it
+        questions = [
+            (position, q) for position, q in enumerate(questions, start=1) if isinstance(q, dict) and 'answer' in q
+        ]
+        fixed = sum(float(q['marks']) for _, q in questions if q.get('marks') is not None)
+        unmarked = [q for _, q in questions if q.get('marks') is None]
+        share = max(paper.max_score - fixed, 0) / len(unmarked) if unmarked else 0
+
+        self.max_score = paper.max_score
+        self.key = {}
+        for position, q in questions:
+            question_id = str(q.get('id', position))
+            marks = float(q['marks']) if q.get('marks') is not None else share
+            self.key[question_id] = (_normalize(q['answer']), marks, float(q.get('negative_marks', 0)))
+
+    def score(self, submission):
+        answers = _answers_of(submission)
+        total = 0.0
+        for question_id, (expected, marks, penalty) in self.key.items():
+            if question_id not in answers or answers[question_id] in (None, ''):
+                continue
+            total += marks if _normalize(answers[question_id]) == expected else -penalty
+        return round(min(max(total, 0.0), self.max_score), 4)
+
+
+def _answer_key(contest_id):
+    paper = QuestionPaper.objects.filter(contest_id=contest_id).first()
+    return AnswerKey(paper) if paper else None
+
+
+def grade_submission(submission_id):
+    """
+    Scores one submission; its post_save signal updates rankings and the
+    leaderboard. If that update fails after the score was stored, the whole
+    contest ranking is rebuilt so it can't drift from the scores.
+    """
+    submission = Submission.objects.select_related('participant').filter(pk=submission_id).first()
+    if submission is None:
+        return None
+    contest_id = submission.participant.contest_id
+    key = _answer_key(contest_id)
+    if key is None:
+        return None
+    submission.score = key.score(submission.submission)
+    try:
+        submission.save(update_fields=['score'])
+    except Exception:
+        rebuild_rankings(contest_id)
+        invalidate_leaderboard()
+        raise
+    return submission.score
+
+
+def _grade_batch(key, submission_ids):
+    try:
+        submissions = list(Submission.objects.filter(pk__in=submission_ids).only('id', 'submission', 'score'))
+        for submission in submissions:
+            submission.score = key.score(submission.submission)
+        with transaction.atomic():
+            Submission.objects.bulk_update(submissions, ['score'], batch_size=GRADING_BATCH_SIZE)
+        return len(submissions)
+    finally:
+        connection.close()
+
+
+def regrade_contest(contest_id, batch_size=GRADING_BATCH_SIZE, only_ungraded=False):
+    """
+    Re-scores every submission of a contest in batches spread over the
+    grading pool, then rebuilds the contest ranking once. Returns the number
+    of submissions graded.
+    """
+    key = _answer_key(contest_id)
+    if key is None:
+        return 0
+
+    submissions = Submission.objects.filter(participant__contest_id=contest_id)
+    if only_ungraded:
+        submissions = submissions.filter(score__isnull=True)
+    ids = list(submissions.order_by('id').values_list('id', flat=True))
+    batches = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+    graded = sum(_executor.map(lambda batch: _grade_batch(key, batch), batches))
+
+    # bulk_update skips the per-row signals, so refresh the derived data here
+    rebuild_rankings(contest_id)
+    invalidate_leaderboard()
+    return graded
+
+
+def _run_in_pool(func, *args):
+    def job():
+        close_old_connections()
+        try:
+            return func(*args)
+        except Exception:
+            logger.exception("Grading %s%r failed", func.__name__, args)
+        finally:
+            connection.close()
+    return _executor.submit(job)
+
+
+def grade_submission_async(submission_id):
+    """Queues a submission for grading once the current transaction commits."""
+    transaction.on_commit(lambda: _run_in_pool(grade_submission, submission_id))
+
+
+def regrade_contest_async(contest_id, **kwargs):
+    """Re-grades a contest from a background thread (its batches still use the pool)."""
+    def job():
+        try:
+            regrade_contest(contest_id, **kwargs)
+        except Exception:
+            logger.exception("Re-grading contest %s failed", contest_id)
+        finally:
+            connection.close()
+    threading.Thread(target=job, name=f'regrade-{contest_id}', daemon=True).start()
@@ -0,0 +1,268 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Participant, Submission
+
+logger = logging.getLogger(__name__)
+
+DRAIN_BATCH_SIZE = 500
+ENTRY_FIELDS = ('receipt', 'participant_id', 'submission', 'received_at')
+RECEIPT_PATTERN = re.compile(rb'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def journal_dir():
+    path = getattr(settings, 'SUBMISSION_JOURNAL_DIR', os.path.join(settings.BASE_DIR, 'journal'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _pending_path(directory, receipt):
+    return os.path.join(directory, 'pending', str(receipt))
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on `path` shared by every process (flock, or msvcrt on Windows)."""
+    with open(path, 'a+b') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _parse_entry(raw):
+    """A journal line as a dict, or None when it is not a complete entry."""
+    try:
+        entry = json.loads(raw)
+        if not all(field in entry for field in ENTRY_FIELDS):
+            return None
+        entry['participant_id'] = int(entry['participant_id'])
+        uuid.UUID(entry['receipt'])
+        if parse_datetime(entry['received_at']) is None:
+            return None
+    except (ValueError, TypeError, AttributeError):
+        return None
+    return entry
+
+
+class SubmissionJournal:
+    """
+    Append-only JSONL journal of accepted submissions for one process.
+
+    enqueue() only appends a line (and fsyncs it), so accepting a submission
+    never waits for the SQLite write lock. A drainer thread reads new lines
+    from the last committed offset and inserts them with bulk_create. Each
+    line carries a receipt id that is unique on Submission, so replaying a
+    journal after a crash never creates duplicates.
+
+    Draining holds a file lock on `<journal>.lock`, so the owner's drainer,
+    other processes' drainers and `manage.py drain_submissions` never move the
+    offset under each other. Lines that can't be parsed are moved to
+    `<journal>.rejected` instead of blocking the journal.
+
+    Every receipt still waiting in a journal has an empty marker file in
+    `pending/`, created before its line is written and removed once it is
+    stored, so receipt lookups never read the journals.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.lock_path = f"{path}.lock"
+        self.rejected_path = f"{path}.rejected"
+        self.directory = os.path.dirname(path)
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._thread = None
+
+    def enqueue(self, participant_id, submission):
+        receipt = uuid.uuid4()
+        line = json.dumps({
+            'receipt': str(receipt),
+            'participant_id': participant_id,
+            'submission': submission,
+            'received_at': timezone.now().isoformat(),
+        })
+        os.makedirs(os.path.join(self.directory, 'pending'), exist_ok=True)
+        open(_pending_path(self.directory, receipt), 'wb').close()
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as journal:
+                journal.write(line + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+        self._ensure_drainer()
+        return receipt
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path, encoding='utf-8') as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, offset):
+        tmp = f"{self.offset_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def drain(self, truncate=False):
+        """Inserts every journaled submission past the saved offset. Returns the number inserted."""
+        with self._drain_lock, _file_lock(self.lock_path):
+            if not os.path.exists(self.path):
+                return 0
+
+            inserted = 0
+            offset = self._read_offset()
+            with open(self.path, 'rb') as journal:
+                journal.seek(offset)
+                while True:
+                    batch, rejected, end = [], [], offset
+                    for raw in journal:
+                        if not raw.endswith(b'\n'):
+                            break  # a line still being written
+                        end += len(raw)
+                        entry = _parse_entry(raw)
+                        if entry is None:
+                            rejected.append(raw)
+                        else:
+                            batch.append(entry)
+                        if len(batch) + len(rejected) >= DRAIN_BATCH_SIZE:
+                            break
+                    if end == offset:
+                        break
+                    if rejected:
+                        self._reject(rejected)
+                    if batch:
+                        inserted += _insert_batch(batch)
+                    self._forget([entry['receipt'] for entry in batch])
+                    offset = end
+                    self._write_offset(offset)
+                    journal.seek(offset)
+
+            if truncate:
+                # Reset a fully drained journal so it doesn't grow forever
+                with self._lock:
+                    if os.path.getsize(self.path) == offset:
+                        open(self.path, 'w').close()
+                        self._write_offset(0)
+            return inserted
+
+    def _reject(self, lines):
+        with open(self.rejected_path, 'ab') as rejected:
+            rejected.writelines(lines)
+        # Those receipts won't be stored, so they must stop answering "queued"
+        self._forget([match.decode() for line in lines for match in RECEIPT_PATTERN.findall(line)])
+        logger.warning("Moved %d unreadable lines from %s to %s", len(lines), self.path, self.rejected_path)
+
+    def _forget(self, receipts):
+        for receipt in receipts:
+            try:
+                os.remove(_pending_path(self.directory, receipt))
+            except FileNotFoundError:
+                pass
+
+    def _ensure_drainer(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='submission-drainer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        interval = getattr(settings, 'SUBMISSION_DRAIN_INTERVAL', 0.5)
+        sweep_interval = getattr(settings, 'SUBMISSION_SWEEP_INTERVAL', 30)
+        swept_at = time.monotonic()
+        while True:
+            time.sleep(interval)
+            try:
+                self.drain(truncate=True)
+                # Journals left behind by recycled or crashed workers have no drainer of their own
+                if time.monotonic() - swept_at >= sweep_interval:
+                    swept_at = time.monotonic()
+                    drain_all(exclude=self.path)
+            except Exception:
+                logger.exception("Error draining submission journal %s", self.path)
+            finally:
+                connection.close()
+
+
+def _insert_batch(entries):
+    from .grading import grade_submission_async
+
+    # Drop entries whose participant was removed meanwhile; they can never be stored
+    participant_ids = {entry['participant_id'] for entry in entries}
+    existing = set(Participant.objects.filter(id__in=participant_ids).values_list('id', flat=True))
+    receipts = {entry['receipt']: entry for entry in entries if entry['participant_id'] in existing}
+
+    with transaction.atomic():
+        Submission.objects.bulk_create(
+            [
+                Submission(receipt=receipt, participant_id=entry['participant_id'], submission=entry['submission'])
+                for receipt, entry in receipts.items()
+            ],
+            ignore_conflicts=True,
+        )
+        # auto_now_add stamped the insert time; keep the time the submission was accepted
+        stored = list(Submission.objects.filter(receipt__in=list(receipts)).only('id', 'receipt', 'submitted_at'))
+        for submission in stored:
+            submission.submitted_at = parse_datetime(receipts[str(submission.receipt)]['received_at'])
+        Submission.objects.bulk_update(stored, ['submitted_at'])
+
+    for submission in stored:
+        grade_submission_async(submission.id)
+    return len(stored)
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+def get_journal():
+    """The journal owned by this process (one file per process, so appends never interleave)."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = SubmissionJournal(os.path.join(journal_dir(), f"submissions-{os.getpid()}.jsonl"))
+        return _journal
+
+
+def all_journals():
+    return [SubmissionJournal(path) for path in sorted(glob.glob(os.path.join(journal_dir(), 'submissions-*.jsonl')))]
+
+
+def drain_all(exclude=None):
+    """Drains the journals of every process, e.g. after a crash or from a dedicated worker."""
+    return sum(journal.drain() for journal in all_journals() if journal.path != exclude)
+
+
+def is_queued(receipt):
+    """Whether a submission with `receipt` is still waiting in any journal."""
+    return os.path.exists(_pending_path(journal_dir(), uuid.UUID(str(receipt))))
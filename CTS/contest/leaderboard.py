@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Submission
+from .serializers import SubmissionSerializer
+
+DATA_KEY = 'contest:leaderboard:data'
+FRESH_KEY = 'contest:leaderboard:fresh'
+LOCK_KEY = 'contest:leaderboard:lock'
+LOCK_TIMEOUT = 30  # seconds; a crashed refresher can't hold the lock longer than this
+WAIT_STEP = 0.05
+
+
+def compute_leaderboard(size=10):
+    top_scores = (
+        Submission.objects
+        .select_related('participant__userId', 'participant__contest')
+        .order_by('-score')[:size]
+    )
+    return SubmissionSerializer(top_scores, many=True).data
+
+
+def get_leaderboard():
+    """
+    Returns the global top 10, served from the cache.
+
+    The serialized data is kept without expiry next to a short-lived
+    "fresh" marker. Once the marker expires (or a score changes), the first
+    worker to grab the lock recomputes it while everyone else keeps serving
+    the previous copy, so an expiry never triggers a stampede of queries.
+    """
+    data = cache.get(DATA_KEY)
+    if data is not None and cache.get(FRESH_KEY):
+        return data
+
+    if cache.add(LOCK_KEY, True, LOCK_TIMEOUT):
+        try:
+            data = compute_leaderboard()
+            cache.set(DATA_KEY, data, None)
+            cache.set(FRESH_KEY, True, getattr(settings, 'LEADERBOARD_CACHE_TTL', 30))
+            return data
+        finally:
+            cache.delete(LOCK_KEY)
+
+    if data is not None:
+        return data
+
+    # Cold cache and someone else is computing it: wait for their result
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        data = cache.get(DATA_KEY)
+        if data is not None:
+            return data
+    return compute_leaderboard()
+
+
+def invalidate_leaderboard():
+    """Marks the cached leaderboard stale; the next request refreshes it."""
+    cache.delete(FRESH_KEY)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ...ingestion import drain_all
+
+
+class Command(BaseCommand):
+    help = "Insert every submission still waiting in the ingestion journals"
+
+    def handle(self, *args, **options):
+        inserted = drain_all()
+        self.stdout.write(self.style.SUCCESS(f"✅ Stored {inserted} journaled submissions."))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...models import Contest
+from ...exports import EXPORT_FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = "Stream every submission of a contest (with participant and contest data) as CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('contest_id', type=int)
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help="File to write to (default: stdout)")
+
+    def handle(self, *args, **options):
+        if not Contest.objects.filter(id=options['contest_id']).exists():
+            raise CommandError(f"Contest {options['contest_id']} does not exist")
+
+        lines = export_lines(options['contest_id'], options['format'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                f.writelines(lines)
+            self.stderr.write(self.style.SUCCESS(f"✅ Exported to {options['output']}"))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
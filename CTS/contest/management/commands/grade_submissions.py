@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from ...models import Contest
+from ...grading import GRADING_BATCH_SIZE, regrade_contest
+
+
+class Command(BaseCommand):
+    help = "Score a contest's submissions against its QuestionPaper in parallel batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('contest_id', type=int)
+        parser.add_argument('--batch-size', type=int, default=GRADING_BATCH_SIZE)
+        parser.add_argument('--only-ungraded', action='store_true', help="Skip submissions that already have a score")
+
+    def handle(self, *args, **options):
+        if not Contest.objects.filter(id=options['contest_id']).exists():
+            raise CommandError(f"Contest {options['contest_id']} does not exist")
+
+        graded = regrade_contest(
+            options['contest_id'],
+            batch_size=options['batch_size'],
+            only_ungraded=options['only_ungraded'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"✅ Graded {graded} submissions."))
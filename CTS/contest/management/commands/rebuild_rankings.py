@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from ...models import Contest
+from ...ranking import rebuild_rankings
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed ContestRanking table from scored submissions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('contest_ids', nargs='*', type=int, help="Contests to rebuild (default: all)")
+
+    def handle(self, *args, **options):
+        contests = Contest.objects.all()
+        if options['contest_ids']:
+            contests = contests.filter(id__in=options['contest_ids'])
+
+        for contest_id in contests.values_list('id', flat=True):
+            count = rebuild_rankings(contest_id)
+            self.stdout.write(f"Contest {contest_id}: ranked {count} participants")
+
+        self.stdout.write(self.style.SUCCESS("✅ Rankings rebuilt."))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from ...models import Contest
+
+
+class Command(BaseCommand):
+    help = "Move contests between upcoming/ongoing/past at their start and deadline times"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true', help="Keep running and wake up at each boundary")
+        parser.add_argument('--max-sleep', type=float, default=60, help="Longest wait between checks in watch mode (seconds)")
+
+    def handle(self, *args, **options):
+        while True:
+            started, finished = Contest.advance_statuses()
+            if started or finished:
+                self.stdout.write(f"{timezone.now():%Y-%m-%d %H:%M:%S} started {started}, finished {finished}")
+            if not options['watch']:
+                break
+
+            # Sleep until the next boundary (new contests are picked up within --max-sleep)
+            next_at = Contest.next_transition_at()
+            delay = options['max_sleep']
+            if next_at:
+                delay = min(delay, max((next_at - timezone.now()).total_seconds(), 0) + 0.1)
+            connection.close()
+            time.sleep(delay)
+
+        self.stdout.write(self.style.SUCCESS("✅ Contest statuses are up to date."))
@@ -0,0 +1,62 @@
+# Generated by Django 5.0 on 2026-10-18 16:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_rankings(apps, schema_editor):
+    Submission = apps.get_model('contest', 'Submission')
+    ContestRanking = apps.get_model('contest', 'ContestRanking')
+
+    best = {}
+    submissions = (
+        Submission.objects.filter(score__isnull=False)
+        .select_related('participant')
+        .order_by('-score', 'submitted_at')
+    )
+    for submission in submissions.iterator(chunk_size=2000):
+        best.setdefault(submission.participant_id, submission)
+
+    entries = []
+    positions = {}
+    for submission in best.values():
+        contest_id = submission.participant.contest_id
+        position, rank, previous_score = positions.get(contest_id, (0, 0, None))
+        position += 1
+        if submission.score != previous_score:
+            rank, previous_score = position, submission.score
+        positions[contest_id] = (position, rank, previous_score)
+        entries.append(ContestRanking(
+            contest_id=contest_id,
+            participant_id=submission.participant_id,
+            submission_id=submission.id,
+            score=submission.score,
+            rank=rank,
+        ))
+    ContestRanking.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContestRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveIntegerField()),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='contest.contest')),
+                ('participant', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ranking', to='contest.participant')),
+                ('submission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contest.submission')),
+            ],
+            options={
+                'ordering': ['rank', 'id'],
+                'indexes': [models.Index(fields=['contest', 'rank'], name='contest_con_contest_20c0ae_idx'), models.Index(fields=['contest', 'score'], name='contest_con_contest_679400_idx')],
+            },
+        ),
+        migrations.RunPython(populate_rankings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0002_contestranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='receipt',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.0 on 2026-10-18 16:48
+
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.dateparse import parse_duration
+
+DURATION_UNITS = {
+    'm': 'minutes', 'min': 'minutes', 'mins': 'minutes', 'minute': 'minutes', 'minutes': 'minutes',
+    'h': 'hours', 'hr': 'hours', 'hrs': 'hours', 'hour': 'hours', 'hours': 'hours',
+    'd': 'days', 'day': 'days', 'days': 'days',
+    'w': 'weeks', 'week': 'weeks', 'weeks': 'weeks',
+}
+
+
+# Copy of contest.models.duration_to_timedelta, so later changes there can't
+# change what this migration does
+def duration_to_timedelta(value):
+    if value and re.fullmatch(r'\s*\d+(?:\.\d+)?\s*', value):
+        return timedelta(minutes=float(value))
+    parsed = parse_duration(value.strip()) if value else None
+    if parsed:
+        return parsed
+    parts = re.findall(r'(\d+(?:\.\d+)?)\s*([a-zA-Z]+)', value or '')
+    if not parts or any(unit.lower() not in DURATION_UNITS for _, unit in parts):
+        return None
+    return sum((timedelta(**{DURATION_UNITS[unit.lower()]: float(amount)}) for amount, unit in parts), timedelta())
+
+
+def populate_schedule(apps, schema_editor):
+    Contest = apps.get_model('contest', 'Contest')
+    now = timezone.now()
+    contests = list(Contest.objects.all())
+    for contest in contests:
+        length = duration_to_timedelta(contest.duration)
+        contest.starts_at = contest.deadline - length if length else None
+        if contest.deadline <= now:
+            contest.status = 'past'
+        elif contest.starts_at is None or contest.starts_at <= now:
+            contest.status = 'ongoing'
+        else:
+            contest.status = 'upcoming'
+    Contest.objects.bulk_update(contests, ['starts_at', 'status'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0003_submission_receipt'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='starts_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='contest',
+            index=models.Index(fields=['status', 'deadline'], name='contest_con_status_615931_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contest',
+            index=models.Index(fields=['status', 'starts_at'], name='contest_con_status_b0f294_idx'),
+        ),
+        migrations.RunPython(populate_schedule, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0004_contest_status_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionpaper',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
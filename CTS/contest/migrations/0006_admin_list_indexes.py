@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-18 16:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0005_questionpaper_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['contest', 'id'], name='contest_par_contest_b41b3d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['userId', 'contest'], name='contest_par_userId__f38645_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['participant', 'id'], name='contest_sub_partici_e46ebf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['score', 'id'], name='contest_sub_score_dc482d_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.0 on 2026-10-18 16:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_participants(apps, schema_editor):
+    """
+    Folds repeated (contest, user) registrations into the oldest row before the
+    unique constraint is added: submissions move over, the extra rows go, and
+    the rankings of the affected contests are rebuilt.
+    """
+    Participant = apps.get_model('contest', 'Participant')
+    Submission = apps.get_model('contest', 'Submission')
+    ContestRanking = apps.get_model('contest', 'ContestRanking')
+
+    duplicates = (
+        Participant.objects.values('contest_id', 'userId_id')
+        .annotate(rows=Count('id'), keep=Min('id'))
+        .filter(rows__gt=1)
+    )
+    contest_ids = set()
+    for group in duplicates:
+        extra = Participant.objects.filter(
+            contest_id=group['contest_id'], userId_id=group['userId_id'],
+        ).exclude(id=group['keep'])
+        if extra.filter(payment_status=True).exists():
+            Participant.objects.filter(id=group['keep']).update(payment_status=True)
+        Submission.objects.filter(participant__in=extra).update(participant_id=group['keep'])
+        extra.delete()
+        contest_ids.add(group['contest_id'])
+
+    if not contest_ids:
+        return
+    ContestRanking.objects.filter(contest_id__in=contest_ids).delete()
+
+    best = {}
+    submissions = (
+        Submission.objects.filter(participant__contest_id__in=contest_ids, score__isnull=False)
+        .select_related('participant')
+        .order_by('-score', 'submitted_at')
+    )
+    for submission in submissions.iterator(chunk_size=2000):
+        best.setdefault(submission.participant_id, submission)
+
+    entries = []
+    positions = {}
+    for submission in best.values():
+        contest_id = submission.participant.contest_id
+        position, rank, previous_score = positions.get(contest_id, (0, 0, None))
+        position += 1
+        if submission.score != previous_score:
+            rank, previous_score = position, submission.score
+        positions[contest_id] = (position, rank, previous_score)
+        entries.append(ContestRanking(
+            contest_id=contest_id,
+            participant_id=submission.participant_id,
+            submission_id=submission.id,
+            score=submission.score,
+            rank=rank,
+        ))
+    ContestRanking.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0006_admin_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_participants, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='participant',
+            constraint=models.UniqueConstraint(fields=('contest', 'userId'), name='unique_contest_participant'),
+        ),
+    ]
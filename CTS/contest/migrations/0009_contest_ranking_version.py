@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contest', '0007_participant_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contest',
+            name='ranking_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,4 +1,37 @@
+import re
+from datetime import timedelta
+
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_duration
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+DURATION_UNITS = {
+    'm': 'minutes', 'min': 'minutes', 'mins': 'minutes', 'minute': 'minutes', 'minutes': 'minutes',
+    'h': 'hours', 'hr': 'hours', 'hrs': 'hours', 'hour': 'hours', 'hours': 'hours',
+    'd': 'days', 'day': 'days', 'days': 'days',
+    'w': 'weeks', 'week': 'weeks', 'weeks': 'weeks',
+}
+
+
+def duration_to_timedelta(value):
+    """
+    Parses free-text contest durations such as "2 hours", "1h 30m", "3 days"
+    or "01:30:00". A bare number ("90") means minutes. Returns None when
+    nothing sensible can be read.
+    """
+    if value and re.fullmatch(r'\s*\d+(?:\.\d+)?\s*', value):
+        return timedelta(minutes=float(value))
+    parsed = parse_duration(value.strip()) if value else None
+    if parsed:
+        return parsed
+    parts = re.findall(r'(\d+(?:\.\d+)?)\s*([a-zA-Z]+)', value or '')
+    if not parts or any(unit.lower() not in DURATION_UNITS for _, unit in parts):
+        return None
+    return sum((timedelta(**{DURATION_UNITS[unit.lower()]: float(amount)}) for amount, unit in parts), timedelta())
+
 
 # Create your models here.
 class Contest(models.Model):
@@ -23,6 +56,10 @@ class Contest(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='upcoming')
     deadline = models.DateTimeField()
     duration = models.CharField(max_length=50)
+    # deadline - duration; None when the duration can't be parsed (open until the deadline)
+    starts_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Bumped on every ranking change; polled by the live results stream
+    ranking_version = models.PositiveIntegerField(default=0, editable=False)
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default='medium')
     prize = models.CharField(max_length=200)
     requirements = models.TextField(blank=True)
@@ -32,14 +69,72 @@ class Contest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'deadline']),
+            models.Index(fields=['status', 'starts_at']),
+        ]
+
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        length = duration_to_timedelta(self.duration)
+        self.starts_at = self.deadline - length if length else None
+        self.status = self.status_at(timezone.now())
+        super().save(*args, **kwargs)
+
+    def status_at(self, now):
+        if self.deadline <= now:
+            return 'past'
+        if self.starts_at is None or self.starts_at <= now:
+            return 'ongoing'
+        return 'upcoming'
+
+    @classmethod
+    def advance_statuses(cls, now=None):
+        """
+        Moves every contest whose boundary has passed to its new status with
+        two bulk UPDATEs on the (status, deadline) / (status, starts_at)
+        indexes. Returns (started, finished).
+        """
+        now = now or timezone.now()
+        finished = cls.objects.filter(status__in=['upcoming', 'ongoing'], deadline__lte=now).update(status='past')
+        started = cls.objects.filter(
+            Q(starts_at__isnull=True) | Q(starts_at__lte=now), status='upcoming'
+        ).update(status='ongoing')
+        return started, finished
+
+    @classmethod
+    def next_transition_at(cls):
+        """The earliest future time at which some contest changes status, or None."""
+        next_start = (
+            cls.objects.filter(status='upcoming', starts_at__isnull=False)
+            .order_by('starts_at').values_list('starts_at', flat=True).first()
+        )
+        next_end = (
+            cls.objects.filter(status__in=['upcoming', 'ongoing'])
+            .order_by('deadline').values_list('deadline', flat=True).first()
+        )
+        times = [t for t in (next_start, next_end) if t]
+        return min(times) if times else None
     
 class Participant(models.Model):
     contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
     userId = models.ForeignKey('auth.User', on_delete=models.CASCADE)
     payment_status = models.BooleanField(default=False)
     registered_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['contest', 'id']),
+            models.Index(fields=['userId', 'contest']),
+        ]
+        constraints = [
+            # One registration per user and contest; bulk joins rely on it to skip duplicates
+            models.UniqueConstraint(fields=['contest', 'userId'], name='unique_contest_participant'),
+        ]
+
     def __str__(self):
         return f"{self.userId.username} - {self.contest.title}"
     
@@ -48,6 +143,14 @@ class Submission(models.Model):
     submission = models.JSONField()
     submitted_at = models.DateTimeField(auto_now_add=True)
     score = models.FloatField(null=True, blank=True)
+    # Set when the submission came in through the ingestion journal (see contest/ingestion.py)
+    receipt = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['participant', 'id']),
+            models.Index(fields=['score', 'id']),
+        ]
 
     def __str__(self):
         return f"Submission by {self.participant.userId.username} for {self.participant.contest.title}"
@@ -56,7 +159,56 @@ class QuestionPaper(models.Model):
     contest = models.ForeignKey(Contest, on_delete=models.CASCADE)
     questions = models.JSONField()
     max_score = models.FloatField()
+    # Part of the delivery cache key (see contest/question_papers.py)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Question Paper for {self.contest.title}"
 
+
+class ContestRanking(models.Model):
+    """
+    Best scored submission of each participant with its precomputed rank.
+    Kept current by contest.ranking whenever a submission is scored, so
+    result pages read ranks from the (contest, rank) index instead of
+    sorting every submission on each request.
+    """
+    contest = models.ForeignKey(Contest, on_delete=models.CASCADE, related_name='rankings')
+    participant = models.OneToOneField(Participant, on_delete=models.CASCADE, related_name='ranking')
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE)
+    score = models.FloatField()
+    rank = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['rank', 'id']
+        indexes = [
+            models.Index(fields=['contest', 'rank']),
+            models.Index(fields=['contest', 'score']),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} {self.participant}"
+
+
+@receiver(post_save, sender=Submission)
+def rank_scored_submission(sender, instance, created, **kwargs):
+    if created and instance.score is None:
+        return
+    from .ranking import update_ranking
+    from .leaderboard import invalidate_leaderboard
+    update_ranking(instance.participant_id)
+    invalidate_leaderboard()
+
+
+@receiver(post_delete, sender=Submission)
+def rank_deleted_submission(sender, instance, **kwargs):
+    from .ranking import update_ranking
+    from .leaderboard import invalidate_leaderboard
+    update_ranking(instance.participant_id)
+    invalidate_leaderboard()
+
+
+@receiver(post_delete, sender=ContestRanking)
+def close_rank_gap(sender, instance, **kwargs):
+    from .ranking import close_rank_gap
+    close_rank_gap(instance)
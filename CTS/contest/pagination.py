@@ -0,0 +1,17 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class RankingPagination(LimitOffsetPagination):
+    default_limit = 50
+    max_limit = 500
+
+
+class NewestFirstCursorPagination(CursorPagination):
+    """
+    Keyset pagination on `-id` for the submission / participant screens, so
+    deep pages cost the same indexed range scan as the first one.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
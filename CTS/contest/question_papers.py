@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from .models import QuestionPaper
+from .serializers import QuestionPaperSerializer
+
+# Bump when the serialized shape changes so entries cached by older code are
+# never served again (v1 still carried the answer key)
+CACHE_FORMAT = 2
+
+
+def _build_entry(paper_id):
+    paper = QuestionPaper.objects.select_related('contest').get(pk=paper_id)
+    body = JSONRenderer().render(QuestionPaperSerializer(paper).data)
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    return {
+        'body': body,
+        'gzip': gzip.compress(body, compresslevel=6),
+        'etag': f'"{digest}"',
+        'gzip_etag': f'"{digest}-gz"',
+    }
+
+
+def accepts_gzip(header):
+    """
+    Whether an Accept-Encoding header allows gzip: listed (or matched by "*")
+    with a non-zero q-value. "gzip;q=0" is an explicit refusal.
+    """
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0.0)) > 0
+
+
+def question_paper_response(request, contest_id):
+    """
+    Serves a contest's question paper from a pre-serialized, pre-compressed
+    cache entry keyed by the paper's and the contest's update times, so
+    editing either (the body carries the contest title) invalidates it.
+    Each representation has a strong ETag and a matching If-None-Match gets
+    a bodiless 304. Returns None when the contest has no paper.
+    """
+    meta = (
+        QuestionPaper.objects.filter(contest_id=contest_id)
+        .values('id', 'updated_at', 'contest__updated_at').first()
+    )
+    if meta is None:
+        return None
+
+    key = (
+        f"contest:question_paper:v{CACHE_FORMAT}:{meta['id']}:"
+        f"{meta['updated_at'].timestamp()}:{meta['contest__updated_at'].timestamp()}"
+    )
+    entry = cache.get(key)
+    if entry is None:
+        entry = _build_entry(meta['id'])
+        cache.set(key, entry, getattr(settings, 'QUESTION_PAPER_CACHE_TTL', 86400))
+
+    use_gzip = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    etag = entry['gzip_etag'] if use_gzip else entry['etag']
+
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if '*' in if_none_match or etag in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry['gzip'] if use_gzip else entry['body'], content_type='application/json')
+        if use_gzip:
+            response['Content-Encoding'] = 'gzip'
+
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    # Let browsers keep a copy but always revalidate with the ETag
+    response['Cache-Control'] = 'no-cache'
+    return response
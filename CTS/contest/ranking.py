@@ -0,0 +1,146 @@
+import time
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+
+from .models import Contest, ContestRanking, Participant, Submission
+
+# SQLite has a single writer; a locked database is retried a few times before giving up
+LOCK_RETRIES = 10
+LOCK_BACKOFF = 0.01  # seconds, doubled on every retry
+
+
+def ranking_version(contest_id):
+    return Contest.objects.filter(pk=contest_id).values_list('ranking_version', flat=True).first() or 0
+
+
+def bump_ranking_version(contest_id):
+    """
+    Tells live result streams (contest.streams) that the ranking changed. The
+    counter is a Contest column, so it is seen by every process (web workers,
+    the grading command, the ASGI server) once the caller's transaction commits.
+    """
+    Contest.objects.filter(pk=contest_id).update(ranking_version=F('ranking_version') + 1)
+
+
+def _best_submission(participant_id):
+    return (
+        Submission.objects.filter(participant_id=participant_id, score__isnull=False)
+        .order_by('-score', 'submitted_at')
+        .first()
+    )
+
+
+def _update_ranking(participant_id):
+    contest_id = Participant.objects.filter(pk=participant_id).values_list('contest_id', flat=True).first()
+    if contest_id is None:
+        return None
+
+    with transaction.atomic():
+        # Write first so the transaction takes the write lock straight away. It
+        # also queues concurrent updates of the same contest behind this one
+        # (a row lock elsewhere), so each one reads the ranks the last one left.
+        Contest.objects.filter(pk=contest_id).update(ranking_version=F('ranking_version'))
+
+        best = _best_submission(participant_id)
+        entry = ContestRanking.objects.filter(participant_id=participant_id).first()
+        if entry is None and best is None:
+            return None
+        old = entry.score if entry else None
+        new = best.score if best else None
+
+        if new is None:
+            # Closing the gap is done by the ContestRanking post_delete handler
+            entry.delete()
+            return None
+
+        others = ContestRanking.objects.filter(contest_id=contest_id).exclude(participant_id=participant_id)
+        if old is None:
+            others.filter(score__lt=new).update(rank=F('rank') + 1)
+        elif new > old:
+            others.filter(score__gte=old, score__lt=new).update(rank=F('rank') + 1)
+        elif new < old:
+            others.filter(score__gte=new, score__lt=old).update(rank=F('rank') - 1)
+
+        rank = others.filter(score__gt=new).count() + 1
+        entry, _ = ContestRanking.objects.update_or_create(
+            participant_id=participant_id,
+            defaults={'contest_id': contest_id, 'submission': best, 'score': new, 'rank': rank},
+        )
+        if new != old:
+            bump_ranking_version(contest_id)
+        return entry
+
+
+def update_ranking(participant_id):
+    """
+    Moves one participant to their new place in the contest ranking.
+
+    Ranks are competition ranks (1 + number of strictly higher scores), so a
+    score change from `old` to `new` only shifts the entries scored between
+    the two by one place. That is a single range UPDATE on the
+    (contest, score) index plus one COUNT for the participant's own rank.
+    A locked database is retried, unless the caller's own transaction is
+    the one holding a read lock (retrying inside it could never succeed).
+    """
+    delay = LOCK_BACKOFF
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return _update_ranking(participant_id)
+        except OperationalError as e:
+            if 'locked' not in str(e) or connection.in_atomic_block or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(delay)
+            delay *= 2
+
+
+def close_rank_gap(entry):
+    """Moves everyone ranked below a removed entry up by one place."""
+    ContestRanking.objects.filter(contest_id=entry.contest_id, score__lt=entry.score).update(rank=F('rank') - 1)
+    bump_ranking_version(entry.contest_id)
+
+
+def rebuild_rankings(contest_id):
+    """Recomputes the whole ranking of a contest from its scored submissions."""
+    best = {}
+    submissions = (
+        Submission.objects.filter(participant__contest_id=contest_id, score__isnull=False)
+        .order_by('-score', 'submitted_at')
+        .only('id', 'participant_id', 'score')
+    )
+    for submission in submissions.iterator(chunk_size=2000):
+        best.setdefault(submission.participant_id, submission)
+
+    entries = []
+    previous_score = None
+    for position, submission in enumerate(best.values(), start=1):
+        if submission.score != previous_score:
+            rank, previous_score = position, submission.score
+        entries.append(ContestRanking(
+            contest_id=contest_id,
+            participant_id=submission.participant_id,
+            submission_id=submission.id,
+            score=submission.score,
+            rank=rank,
+        ))
+
+    with transaction.atomic():
+        ContestRanking.objects.filter(contest_id=contest_id).exclude(participant_id__in=list(best)).delete()
+        ContestRanking.objects.bulk_create(
+            entries,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['participant'],
+            update_fields=['submission', 'score', 'rank'],
+        )
+    bump_ranking_version(contest_id)
+    return len(entries)
+
+
+def rank_of(contest_id, user):
+    """The ranking entry of `user` in a contest, or None if they have no scored submission."""
+    return (
+        ContestRanking.objects.select_related('participant__userId', 'submission')
+        .filter(contest_id=contest_id, participant__userId=user)
+        .first()
+    )
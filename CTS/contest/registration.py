@@ -0,0 +1,73 @@
+import csv
+import io
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from .models import Participant
+
+
+class RegistrationError(ValueError):
+    pass
+
+
+def parse_user_ids(data, upload=None):
+    """
+    Reads user ids from `{"user_ids": [...]}` or from a CSV upload.
+
+    The CSV may have a `user_id` (or `id`) header column; without one the first
+    column of every row is taken. Duplicates are dropped, order is kept.
+    """
+    if upload is not None:
+        text = io.TextIOWrapper(getattr(upload, 'file', upload), encoding='utf-8-sig', newline='')
+        rows = list(csv.reader(text))
+        if rows and rows[0] and not rows[0][0].strip().isdigit():
+            header = [cell.strip().lower() for cell in rows.pop(0)]
+            column = next((header.index(name) for name in ('user_id', 'id') if name in header), None)
+            if column is None:
+                raise RegistrationError("CSV needs a 'user_id' column.")
+        else:
+            column = 0
+        raw = [row[column] for row in rows if len(row) > column and row[column].strip()]
+    else:
+        raw = data.get('user_ids')
+        if not isinstance(raw, list):
+            raise RegistrationError("Send 'user_ids' as a list or upload a CSV as 'file'.")
+
+    try:
+        user_ids = list(dict.fromkeys(int(str(value).strip()) for value in raw))
+    except ValueError:
+        raise RegistrationError("User ids must be integers.")
+
+    if not user_ids:
+        raise RegistrationError("No user ids given.")
+    if len(user_ids) > settings.CONTEST_BULK_JOIN_MAX:
+        raise RegistrationError(f"At most {settings.CONTEST_BULK_JOIN_MAX} users per request.")
+    return user_ids
+
+
+def bulk_register(contest, user_ids, payment_status=True):
+    """
+    Registers every user in `user_ids` for `contest` that isn't registered yet.
+
+    One query finds the known users, one finds the ones already registered,
+    and the rest are inserted in batches. `ignore_conflicts` leans on the
+    (contest, userId) constraint, so a user joining concurrently is skipped
+    instead of failing the whole batch.
+    """
+    known = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    registered = set(
+        Participant.objects.filter(contest=contest, userId_id__in=known).values_list('userId_id', flat=True)
+    )
+    new_ids = [user_id for user_id in user_ids if user_id in known and user_id not in registered]
+
+    Participant.objects.bulk_create(
+        [Participant(contest=contest, userId_id=user_id, payment_status=payment_status) for user_id in new_ids],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    return {
+        "registered": new_ids,
+        "already_registered": [user_id for user_id in user_ids if user_id in registered],
+        "unknown_users": [user_id for user_id in user_ids if user_id not in known],
+    }
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Contest, Participant, Submission, QuestionPaper
+from .models import Contest, Participant, Submission, QuestionPaper, ContestRanking
 
 # -------- Contest Serializer --------
 class ContestSerializer(serializers.ModelSerializer):
@@ -23,6 +23,9 @@ class ContestSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
     def get_participants_count(self, obj):
+        # Annotated by the list/detail querysets; falls back to a COUNT for new instances
+        if hasattr(obj, 'participants_count'):
+            return obj.participants_count
         return obj.participant_set.count()
 
 
@@ -44,12 +47,46 @@ class SubmissionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Submission
         fields = ['id', 'participant', 'participant_name', 'contest_title', 'submission', 'submitted_at', 'score']
+        # The participant comes from the logged-in user and the score from the grader
+        read_only_fields = ['participant', 'score']
 
 
 # -------- QuestionPaper Serializer --------
+# Parts of each question that make up the answer key (see contest/grading.py)
+ANSWER_KEY_FIELDS = ('answer', 'marks', 'negative_marks')
+
+
 class QuestionPaperSerializer(serializers.ModelSerializer):
+    """Public view of a paper: the questions without their answers or marking scheme."""
     contest_title = serializers.CharField(source='contest.title', read_only=True)
 
     class Meta:
         model = QuestionPaper
         fields = ['id', 'contest', 'contest_title', 'questions', 'max_score']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        questions = data['questions']
+        if isinstance(questions, dict):
+            questions = {**questions, 'questions': self.strip_answer_key(questions.get('questions', []))}
+        else:
+            questions = self.strip_answer_key(questions)
+        data['questions'] = questions
+        return data
+
+    @staticmethod
+    def strip_answer_key(questions):
+        return [
+            {k: v for k, v in q.items() if k not in ANSWER_KEY_FIELDS} if isinstance(q, dict) else q
+            for q in questions or []
+        ]
+
+
+# -------- Ranking Serializer --------
+class ContestRankingSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='participant.userId.username', read_only=True)
+    submitted_at = serializers.DateTimeField(source='submission.submitted_at', read_only=True)
+
+    class Meta:
+        model = ContestRanking
+        fields = ['rank', 'score', 'participant', 'username', 'submission', 'submitted_at']
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import ContestRanking
+from .ranking import ranking_version
+from .serializers import ContestRankingSerializer
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.5  # seconds between checks of the contest's ranking version
+ERROR_BACKOFF = 5  # seconds to wait after a failed poll before trying again
+HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments on an idle stream
+RETRY_MS = 3000  # how long EventSource clients wait before reconnecting
+
+
+def _top_ranks(contest_id):
+    entries = (
+        ContestRanking.objects.filter(contest_id=contest_id)
+        .select_related('participant__userId', 'submission')
+        .order_by('rank', 'id')[:getattr(settings, 'CONTEST_STREAM_TOP_K', 50)]
+    )
+    return json.dumps(ContestRankingSerializer(entries, many=True).data, cls=DjangoJSONEncoder)
+
+
+class ContestBroadcaster:
+    """
+    Single producer for one contest's live results.
+
+    It polls the cheap ranking version column and only re-reads the top
+    ranks when that changes, then hands the same payload to every
+    subscriber. Thousands of open streams therefore cost one query per
+    ranking change instead of one per client. Slow subscribers just skip
+    to the latest snapshot. A failing poll (e.g. the database is briefly
+    unavailable) is logged and retried; it never ends the producer.
+    """
+
+    def __init__(self, contest_id):
+        self.contest_id = contest_id
+        self.subscribers = set()
+        self.payload = None
+        self.task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=1)
+        if self.payload is not None:
+            queue.put_nowait(self.payload)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+            _broadcasters.pop(self.contest_id, None)
+
+    def publish(self, payload):
+        self.payload = payload
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+    async def run(self):
+        version = None
+        while True:
+            try:
+                current = await sync_to_async(ranking_version)(self.contest_id)
+                if current != version:
+                    payload = await sync_to_async(_top_ranks)(self.contest_id)
+                    version = current
+                    if payload != self.payload:
+                        self.publish(payload)
+            except Exception:
+                logger.exception("Live results for contest %s failed to refresh", self.contest_id)
+                await asyncio.sleep(ERROR_BACKOFF)
+                continue
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+_broadcasters = {}
+
+
+def get_broadcaster(contest_id):
+    if contest_id not in _broadcasters:
+        _broadcasters[contest_id] = ContestBroadcaster(contest_id)
+    return _broadcasters[contest_id]
+
+
+async def result_events(contest_id):
+    """Async generator of server-sent events with the contest's top ranks."""
+    broadcaster = get_broadcaster(contest_id)
+    queue = broadcaster.subscribe()
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: ranking\ndata: {payload}\n\n"
+    finally:
+        broadcaster.unsubscribe(queue)
+
+
+async def snapshot_event(contest_id):
+    """The current top ranks as one complete event-stream body (for WSGI, see the view)."""
+    payload = await sync_to_async(_top_ranks)(contest_id)
+    return f"retry: {RETRY_MS}\n\nevent: ranking\ndata: {payload}\n\n"
@@ -1,3 +1,653 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError, connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from CTS.streaming import streaming_body
+
+from . import exports, leaderboard, streams
+from .question_papers import accepts_gzip
+from .grading import AnswerKey, grade_submission
+from .ingestion import SubmissionJournal, drain_all
+from .models import Contest, ContestRanking, Participant, QuestionPaper, Submission, duration_to_timedelta
+from .ranking import rebuild_rankings
+
+
+class ContestListQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+
+    def create_contests(self, count):
+        for i in range(count):
+            contest = Contest.objects.create(
+                title=f'Contest {i}',
+                description='...',
+                deadline=timezone.now(),
+                duration='1h',
+                prize='Swag',
+                organizer=self.users[i % 3],
+            )
+            for user in self.users[: i % 3 + 1]:
+                Participant.objects.create(contest=contest, userId=user)
+
+    def test_listing_uses_constant_queries(self):
+        self.create_contests(2)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/contest/contests/')
+        self.assertEqual(len(response.json()), 2)
+
+        self.create_contests(20)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/contest/contests/')
+        self.assertEqual(len(response.json()), 22)
+
+    def test_listing_reports_participants_and_organizer(self):
+        self.create_contests(3)
+        response = self.client.get('/api/contest/contests/')
+        counts = {c['title']: (c['participants_count'], c['organizer_username']) for c in response.json()}
+        self.assertEqual(counts, {
+            'Contest 0': (1, 'user0'),
+            'Contest 1': (2, 'user1'),
+            'Contest 2': (3, 'user2'),
+        })
+
+    def test_detail_uses_single_query(self):
+        self.create_contests(1)
+        contest = Contest.objects.get()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/contest/contests/{contest.id}/')
+        self.assertEqual(response.json()['participants_count'], 1)
+
+
+class SubmissionListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.contests = [
+            Contest.objects.create(
+                title=f'Contest {i}', description='...', deadline=timezone.now(),
+                duration='1h', prize='Swag', organizer=self.users[0],
+            )
+            for i in range(2)
+        ]
+        for contest in self.contests:
+            for n, user in enumerate(self.users):
+                participant = Participant.objects.create(contest=contest, userId=user)
+                Submission.objects.create(participant=participant, submission={}, score=n if n else None)
+
+    def ids(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.json()['results']]
+            url, pages = response.json()['next'], pages + 1
+        return ids, pages
+
+    def test_cursor_walks_every_submission_newest_first(self):
+        ids, pages = self.ids('/api/contest/submissions/?page_size=4')
+        self.assertEqual(ids, list(Submission.objects.order_by('-id').values_list('id', flat=True)))
+        self.assertEqual(pages, 2)
+
+    def test_filters(self):
+        contest, user = self.contests[1], self.users[2]
+        ids, _ = self.ids(f'/api/contest/submissions/?contest={contest.id}')
+        self.assertEqual(len(ids), 3)
+        ids, _ = self.ids(f'/api/contest/submissions/?user={user.id}')
+        self.assertEqual(len(ids), 2)
+        ids, _ = self.ids('/api/contest/submissions/?scored=false')
+        self.assertEqual(set(ids), set(Submission.objects.filter(score__isnull=True).values_list('id', flat=True)))
+        ids, _ = self.ids(f'/api/contest/submissions/?contest={contest.id}&scored=true')
+        self.assertEqual(len(ids), 2)
+
+    def test_page_uses_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/contest/submissions/')
+        self.assertEqual(response.json()['results'][0]['contest_title'], 'Contest 1')
+
+    def test_participants_are_paginated_and_filtered(self):
+        contest = self.contests[0]
+        response = self.client.get(f'/api/contest/contests/{contest.id}/participants/?user={self.users[1].id}')
+        self.assertEqual(len(response.json()['results']), 1)
+        response = self.client.get(f'/api/contest/contests/{contest.id}/participants/?page_size=2')
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIsNotNone(response.json()['next'])
+
+
+class BulkJoinContestTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.organizer = User.objects.create(username='organizer')
+        self.users = [User.objects.create(username=f'student{i}') for i in range(5)]
+        self.contest = Contest.objects.create(
+            title='Midterm', description='...', deadline=timezone.now(),
+            duration='1h', prize='Swag', organizer=self.organizer,
+        )
+        self.url = f'/api/contest/contests/{self.contest.id}/participants/bulk/'
+        self.client.force_authenticate(self.organizer)
+
+    def test_registers_new_users_and_skips_existing(self):
+        Participant.objects.create(contest=self.contest, userId=self.users[0])
+        ids = [u.id for u in self.users] + [self.users[1].id, 999999]
+        with self.assertNumQueries(4):  # contest, known users, existing rows, one insert
+            response = self.client.post(self.url, {'user_ids': ids}, format='json')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['registered'], [u.id for u in self.users[1:]])
+        self.assertEqual(body['already_registered'], [self.users[0].id])
+        self.assertEqual(body['unknown_users'], [999999])
+        self.assertEqual(Participant.objects.filter(contest=self.contest).count(), 5)
+
+    def test_csv_upload(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        csv_file = SimpleUploadedFile(
+            'class.csv', f'name,user_id\na,{self.users[2].id}\nb,{self.users[3].id}\n'.encode(), 'text/csv'
+        )
+        response = self.client.post(self.url, {'file': csv_file}, format='multipart')
+        self.assertEqual(response.json()['registered'], [self.users[2].id, self.users[3].id])
+
+    def test_only_organizer_and_valid_input(self):
+        self.assertEqual(self.client.post(self.url, {'user_ids': 'x'}, format='json').status_code, 400)
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.post(self.url, {'user_ids': [1]}, format='json').status_code, 403)
+
+    def test_single_join_rejects_second_registration(self):
+        self.client.force_authenticate(self.users[0])
+        url = f'/api/contest/contests/{self.contest.id}/join/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+
+
+class SubmissionExportTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer')
+        self.contests = [
+            Contest.objects.create(
+                title=f'Contest {i}', description='...', deadline=timezone.now(),
+                duration='1h', prize='Swag', organizer=self.organizer,
+            )
+            for i in range(2)
+        ]
+        for n in range(5):
+            user = User.objects.create(username=f'user{n}')
+            participant = Participant.objects.create(contest=self.contests[0], userId=user)
+            Submission.objects.create(participant=participant, submission={'1': 'a, "b"\nc'}, score=n)
+        other = Participant.objects.create(contest=self.contests[1], userId=self.organizer)
+        Submission.objects.create(participant=other, submission={}, score=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+        self.url = f'/api/contest/contests/{self.contests[0].id}/submissions/export/'
+
+    def export(self, file_format):
+        response = self.client.get(self.url, {'file_format': file_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    @mock.patch.object(exports, 'EXPORT_CHUNK_SIZE', 2)
+    def test_every_submission_exported_once_across_chunks(self):
+        header, *rows = list(csv.reader(self.export('csv').splitlines(keepends=True)))
+        self.assertEqual(header, [name for name, _ in exports.EXPORT_FIELDS])
+        self.assertEqual([row[3] for row in rows], [f'user{n}' for n in range(5)])
+        self.assertEqual(json.loads(rows[0][-1]), {'1': 'a, "b"\nc'})
+
+        lines = self.export('jsonl').splitlines()
+        self.assertEqual([json.loads(line)['score'] for line in lines], [0, 1, 2, 3, 4])
+
+    def test_only_the_organizer_can_export(self):
+        self.client.force_authenticate(User.objects.get(username='user0'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class ConcurrentRankingTests(TransactionTestCase):
+    WORKERS = 4  # GRADING_WORKERS
+
+    def test_parallel_scoring_keeps_ranks_consistent(self):
+        organizer = User.objects.create(username='organizer')
+        contest = Contest.objects.create(
+            title='Rush', description='...', deadline=timezone.now(), duration='1h', prize='Swag', organizer=organizer,
+        )
+        participants = [
+            Participant.objects.create(contest=contest, userId=User.objects.create(username=f'user{i}'))
+            for i in range(20)
+        ]
+        ids = [
+            Submission.objects.create(participant=participants[i % 20], submission={}).id
+            for i in range(40)
+        ]
+
+        def score(position, submission_id):
+            try:
+                submission = Submission.objects.get(pk=submission_id)
+                submission.score = (position * 7) % 11
+                submission.save(update_fields=['score'])
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            list(pool.map(score, range(40), ids))
+
+        ranks = lambda: sorted(ContestRanking.objects.values_list('participant_id', 'submission_id', 'score', 'rank'))
+        incremental = ranks()
+        rebuild_rankings(contest.id)
+        self.assertEqual(len(incremental), 20)
+        self.assertEqual(incremental, ranks())
+
+
+class ContestRankingTests(TestCase):
+    def setUp(self):
+        users = [User.objects.create(username=name) for name in ('ann', 'ben', 'cat', 'dan')]
+        self.contest = Contest.objects.create(
+            title='Finals', description='...', deadline=timezone.now(),
+            duration='1h', prize='Swag', organizer=users[0],
+        )
+        self.participants = {
+            user.username: Participant.objects.create(contest=self.contest, userId=user) for user in users
+        }
+
+    def submit(self, username, score):
+        return Submission.objects.create(participant=self.participants[username], submission={}, score=score)
+
+    def ranks(self):
+        """Incremental ranks, checked against a full rebuild from scratch."""
+        entries = ContestRanking.objects.filter(contest=self.contest)
+        incremental = {e.participant.userId.username: (e.score, e.rank) for e in entries}
+        rebuild_rankings(self.contest.id)
+        self.assertEqual(incremental, {e.participant.userId.username: (e.score, e.rank) for e in entries.all()})
+        return incremental
+
+    def test_insertion_shifts_lower_scores(self):
+        self.submit('ann', 50)
+        self.submit('ben', 30)
+        self.submit('cat', 40)
+        self.assertEqual(self.ranks(), {'ann': (50, 1), 'cat': (40, 2), 'ben': (30, 3)})
+
+    def test_ties_share_a_rank_and_skip_the_next(self):
+        self.submit('ann', 50)
+        self.submit('ben', 40)
+        self.submit('cat', 40)
+        self.submit('dan', 10)
+        self.assertEqual(self.ranks(), {'ann': (50, 1), 'ben': (40, 2), 'cat': (40, 2), 'dan': (10, 4)})
+
+    def test_score_increase_and_removal(self):
+        self.submit('ann', 50)
+        self.submit('ben', 40)
+        first = self.submit('cat', 40)
+        self.submit('dan', 10)
+
+        self.submit('dan', 45)  # better second attempt
+        self.assertEqual(self.ranks(), {'ann': (50, 1), 'dan': (45, 2), 'ben': (40, 3), 'cat': (40, 3)})
+        self.submit('dan', 20)  # a worse attempt doesn't lower the best
+        self.assertEqual(self.ranks()['dan'], (45, 2))
+
+        first.delete()
+        self.assertEqual(self.ranks(), {'ann': (50, 1), 'dan': (45, 2), 'ben': (40, 3)})
+
+    def test_results_are_paginated_ranking_entries(self):
+        for name, score in (('ann', 50), ('ben', 40), ('cat', 30)):
+            self.submit(name, score)
+        data = APIClient().get(f'/api/contest/contests/{self.contest.id}/results/', {'limit': 2, 'offset': 1}).json()
+        self.assertEqual(data['count'], 3)
+        self.assertEqual([(row['username'], row['rank']) for row in data['results']], [('ben', 2), ('cat', 3)])
+
+
+class LeaderboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_cold_requests_compute_once(self):
+        calls = []
+        started = threading.Event()
+
+        def slow_compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return [{'score': 1}]
+
+        with mock.patch('contest.leaderboard.compute_leaderboard', slow_compute):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                first = pool.submit(leaderboard.get_leaderboard)
+                started.wait()
+                rest = [pool.submit(leaderboard.get_leaderboard) for _ in range(7)]
+                results = [first.result()] + [f.result() for f in rest]
+
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(results, [[{'score': 1}]] * 8)
+
+            # Once stale, the old copy is served while a single refresh runs
+            leaderboard.invalidate_leaderboard()
+            self.assertEqual(leaderboard.get_leaderboard(), [{'score': 1}])
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(leaderboard.get_leaderboard(), [{'score': 1}])
+            self.assertEqual(len(calls), 2)
+
+
+class GradingTests(TestCase):
+    def key(self, questions, max_score=10):
+        return AnswerKey(SimpleNamespace(questions=questions, max_score=max_score))
+
+    def test_unmarked_questions_share_the_rest_of_max_score(self):
+        key = self.key([
+            {'id': 1, 'answer': 'B', 'marks': 4},
+            {'id': 2, 'answer': 'paris'},
+            {'id': 3, 'answer': ['a', 'c']},
+        ])
+        self.assertEqual(key.score({'1': ' b ', '2': 'Paris', '3': ['C', 'A']}), 10)
+        self.assertEqual(key.score({'1': 'b', '2': 'rome'}), 4)
+        self.assertEqual(key.score([{'question_id': 2, 'answer': 'PARIS'}]), 3)
+
+    def test_negative_marks_only_for_wrong_answers_and_never_below_zero(self):
+        key = self.key([
+            {'id': 1, 'answer': 'a', 'marks': 4, 'negative_marks': 1},
+            {'id': 2, 'answer': 'b', 'marks': 4, 'negative_marks': 1},
+            {'id': 3, 'answer': 'c', 'marks': 2, 'negative_marks': 1},
+        ])
+        self.assertEqual(key.score({'1': 'a', '2': 'x', '3': ''}), 3)
+        self.assertEqual(key.score({'1': 'x', '2': 'x'}), 0)
+
+    def test_numbers_compare_by_value(self):
+        key = self.key({'questions': [{'id': 'q1', 'answer': 4, 'marks': 5}, {'id': 'q2', 'answer': '2.50', 'marks': 5}]})
+        self.assertEqual(key.score({'answers': {'q1': '4', 'q2': 2.5}}), 10)
+        self.assertEqual(key.score({'q1': '4.0', 'q2': '2.5 '}), 10)
+        self.assertEqual(key.score({'q1': True, 'q2': 'two'}), 0)
+
+    def test_questions_without_an_answer_keep_their_position(self):
+        key = self.key([{'text': 'Read this first'}, {'answer': 'a', 'marks': 2}, {'answer': 'b', 'marks': 3}])
+        self.assertEqual(key.score({'2': 'a', '3': 'b'}), 5)
+        self.assertEqual(key.score({'1': 'a', '2': 'b'}), 0)
+
+    def test_failed_ranking_update_rebuilds_the_ranking(self):
+        organizer = User.objects.create(username='organizer')
+        contest = Contest.objects.create(
+            title='Quiz', description='...', deadline=timezone.now(), duration='1h', prize='Swag', organizer=organizer,
+        )
+        QuestionPaper.objects.create(contest=contest, max_score=10, questions=[{'id': 1, 'answer': 'a'}])
+        participant = Participant.objects.create(contest=contest, userId=organizer)
+        submission = Submission.objects.create(participant=participant, submission={'1': 'a'})
+
+        with mock.patch('contest.ranking.update_ranking', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                grade_submission(submission.id)
+        self.assertEqual(ContestRanking.objects.get(participant=participant).score, 10)
+
+    def test_public_question_paper_hides_the_answer_key(self):
+        organizer = User.objects.create(username='organizer')
+        contest = Contest.objects.create(
+            title='Quiz', description='...', deadline=timezone.now(), duration='1h', prize='Swag', organizer=organizer,
+        )
+        QuestionPaper.objects.create(contest=contest, max_score=10, questions=[
+            {'id': 1, 'text': '2 + 2?', 'options': ['3', '4'], 'answer': '4', 'marks': 5, 'negative_marks': 1},
+            {'id': 2, 'text': 'Capital of France?', 'answer': 'Paris'},
+        ])
+        response = APIClient().get(f'/api/contest/contests/{contest.id}/questions/')
+        self.assertEqual(response.status_code, 200)
+        questions = json.loads(response.content)['questions']
+        self.assertEqual(questions, [
+            {'id': 1, 'text': '2 + 2?', 'options': ['3', '4']},
+            {'id': 2, 'text': 'Capital of France?'},
+        ])
+
+
+class QuestionPaperDeliveryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        organizer = User.objects.create(username='organizer')
+        self.contest = Contest.objects.create(
+            title='Quiz', description='...', deadline=timezone.now(), duration='1h', prize='Swag', organizer=organizer,
+        )
+        QuestionPaper.objects.create(contest=self.contest, max_score=10, questions=[{'id': 1, 'text': '2 + 2?'}])
+        self.url = f'/api/contest/contests/{self.contest.id}/questions/'
+
+    def test_matching_etag_gets_304(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.content, b'')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_gzip_only_when_accepted(self):
+        zipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING='br, gzip;q=0.8')
+        self.assertEqual(zipped['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(zipped.content))['questions'], [{'id': 1, 'text': '2 + 2?'}])
+
+        plain = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0, identity')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertNotEqual(plain['ETag'], zipped['ETag'])
+        self.assertEqual(json.loads(plain.content)['questions'], [{'id': 1, 'text': '2 + 2?'}])
+
+    def test_accept_encoding_parsing(self):
+        self.assertTrue(accepts_gzip('gzip'))
+        self.assertTrue(accepts_gzip('deflate, GZIP ; q=0.5'))
+        self.assertTrue(accepts_gzip('*'))
+        self.assertFalse(accepts_gzip(''))
+        self.assertFalse(accepts_gzip('gzip;q=0'))
+        self.assertFalse(accepts_gzip('gzip;q=0.0, *'))
+        self.assertFalse(accepts_gzip('*;q=0'))
+        self.assertFalse(accepts_gzip('gzipped, br'))
+
+    def test_renaming_the_contest_refreshes_the_cached_paper(self):
+        self.assertEqual(json.loads(self.client.get(self.url).content)['contest_title'], 'Quiz')
+        self.contest.title = 'Final quiz'
+        self.contest.save()
+        self.assertEqual(json.loads(self.client.get(self.url).content)['contest_title'], 'Final quiz')
+
+
+@mock.patch.object(SubmissionJournal, '_ensure_drainer', lambda self: None)
+class SubmissionJournalTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(SUBMISSION_JOURNAL_ENABLED=True, SUBMISSION_JOURNAL_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.journal = SubmissionJournal(os.path.join(directory.name, 'submissions-1.jsonl'))
+        patcher = mock.patch('contest.views.get_journal', return_value=self.journal)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create(username='student')
+        self.contest = Contest.objects.create(
+            title='Quiz', description='...', deadline=timezone.now(), duration='1h', prize='Swag', organizer=self.user,
+        )
+        self.participant = Participant.objects.create(contest=self.contest, userId=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def receipt_status(self, receipt):
+        return self.client.get(f'/api/contest/submissions/receipts/{receipt}/').status_code
+
+    def test_burst_is_queued_then_drained_once(self):
+        receipts = []
+        for n in range(3):
+            response = self.client.post(f'/api/contest/contests/{self.contest.id}/submit/', {'submission': {'1': n}}, format='json')
+            self.assertEqual(response.status_code, 202)
+            receipts.append(response.json()['receipt'])
+        self.assertFalse(Submission.objects.exists())
+        self.assertEqual(self.receipt_status(receipts[0]), 202)
+
+        self.assertEqual(drain_all(), 3)
+        self.assertEqual(self.receipt_status(receipts[0]), 200)
+        self.assertEqual(drain_all(), 0)
+
+        # Replaying the journal from the start stores nothing twice
+        self.journal._write_offset(0)
+        self.journal.drain(truncate=True)
+        self.assertEqual(Submission.objects.count(), 3)
+        self.assertEqual(os.path.getsize(self.journal.path), 0)
+        self.assertEqual(self.receipt_status(uuid.uuid4()), 404)
+
+    def test_unreadable_lines_are_set_aside(self):
+        self.journal.enqueue(self.participant.id, {'1': 'a'})
+        with open(self.journal.path, 'a', encoding='utf-8') as journal:
+            journal.write('{"receipt": "half a line\n')
+            journal.write('{"participant_id": 1}\n')
+        self.journal.enqueue(self.participant.id, {'1': 'b'})
+
+        with self.assertLogs('contest.ingestion', 'WARNING'):
+            self.assertEqual(self.journal.drain(), 2)
+        self.assertEqual(self.journal._read_offset(), os.path.getsize(self.journal.path))
+        with open(self.journal.rejected_path, encoding='utf-8') as rejected:
+            self.assertEqual(len(rejected.readlines()), 2)
+
+    def test_rejected_receipt_stops_answering_queued(self):
+        receipt = self.journal.enqueue(self.participant.id, {'1': 'a'})
+        with open(self.journal.path, encoding='utf-8') as journal:
+            line = journal.read()
+        with open(self.journal.path, 'w', encoding='utf-8') as journal:
+            journal.write(line.replace('"participant_id": ', '"participant": '))
+        self.assertEqual(self.receipt_status(receipt), 202)
+        with self.assertLogs('contest.ingestion', 'WARNING'):
+            self.assertEqual(self.journal.drain(), 0)
+        self.assertEqual(self.receipt_status(receipt), 404)
+
+    def test_receipt_lookup_does_not_read_journals(self):
+        receipt = self.journal.enqueue(self.participant.id, {'1': 'a'})
+        with mock.patch('contest.ingestion.all_journals', side_effect=AssertionError), \
+                mock.patch.object(SubmissionJournal, 'drain', side_effect=AssertionError):
+            self.assertEqual(self.receipt_status(receipt), 202)
+        self.journal.drain()
+        self.assertEqual(self.receipt_status(receipt), 200)
+
+    @override_settings(SUBMISSION_DRAIN_INTERVAL=0, SUBMISSION_SWEEP_INTERVAL=0)
+    def test_drainer_also_drains_journals_of_dead_workers(self):
+        orphan = SubmissionJournal(os.path.join(os.path.dirname(self.journal.path), 'submissions-999.jsonl'))
+        receipt = orphan.enqueue(self.participant.id, {'1': 'left behind'})
+
+        class Stop(Exception):
+            pass
+
+        with mock.patch('contest.ingestion.time.sleep', side_effect=[None, Stop]), \
+                mock.patch('contest.ingestion.connection'):
+            with self.assertRaises(Stop):
+                self.journal._run()
+        self.assertEqual(Submission.objects.get().receipt, uuid.UUID(str(receipt)))
+
+    def test_owner_and_command_drains_do_not_overlap(self):
+        for n in range(300):
+            self.journal.enqueue(self.participant.id, {'1': n})
+        stored = []
+
+        def fake_insert(entries):
+            time.sleep(0.001)
+            stored.extend(entry['receipt'] for entry in entries)
+            return len(entries)
+
+        command_copy = SubmissionJournal(self.journal.path)
+        with mock.patch('contest.ingestion.DRAIN_BATCH_SIZE', 7), \
+                mock.patch('contest.ingestion._insert_batch', fake_insert):
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                drains = [pool.submit(self.journal.drain, truncate=True), pool.submit(command_copy.drain)]
+                self.assertEqual(sum(d.result() for d in drains), 300)
+        self.assertEqual(len(set(stored)), 300)
+        self.assertEqual(len(stored), 300)
+
+
+class ContestScheduleTests(TestCase):
+    def test_duration_parser(self):
+        cases = {
+            '2 hours': timedelta(hours=2),
+            '1h 30m': timedelta(minutes=90),
+            '3 days': timedelta(days=3),
+            '01:30:00': timedelta(minutes=90),
+            '90': timedelta(minutes=90),
+            ' 45 ': timedelta(minutes=45),
+            'a while': None,
+            '2 fortnights': None,
+            '': None,
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(duration_to_timedelta(text), expected)
+
+    def test_schedule_backfill_migration(self):
+        organizer = User.objects.create(username='organizer')
+        now = timezone.now()
+        contests = {
+            duration: Contest.objects.create(
+                title=duration, description='...', deadline=now + timedelta(hours=1),
+                duration=duration, prize='Swag', organizer=organizer,
+            )
+            for duration in ('90', '30 min', 'whenever')
+        }
+        # As the schema looked before 0004
+        Contest.objects.update(starts_at=None, status='upcoming')
+        importlib.import_module('contest.migrations.0004_contest_status_schedule').populate_schedule(apps, None)
+        schedule = {c.duration: (c.starts_at, c.status) for c in Contest.objects.all()}
+        self.assertEqual(schedule['90'], (contests['90'].deadline - timedelta(minutes=90), 'ongoing'))
+        self.assertEqual(schedule['30 min'], (contests['30 min'].deadline - timedelta(minutes=30), 'upcoming'))
+        self.assertEqual(schedule['whenever'], (None, 'ongoing'))
+
+
+class ResultStreamTests(TestCase):
+    def setUp(self):
+        self.organizer = User.objects.create(username='organizer')
+        self.contest = Contest.objects.create(
+            title='Live', description='...', deadline=timezone.now(), duration='1h', prize='Swag', organizer=self.organizer,
+        )
+        self.participant = Participant.objects.create(contest=self.contest, userId=self.organizer)
+
+    def test_ranking_changes_bump_the_version_column(self):
+        Submission.objects.create(participant=self.participant, submission={}, score=5)
+        self.contest.refresh_from_db()
+        self.assertEqual(self.contest.ranking_version, 1)
+        rebuild_rankings(self.contest.id)
+        self.contest.refresh_from_db()
+        self.assertEqual(self.contest.ranking_version, 2)
+
+    def test_wsgi_request_gets_one_snapshot(self):
+        Submission.objects.create(participant=self.participant, submission={}, score=5)
+        response = self.client.get(f'/api/contest/contests/{self.contest.id}/results/stream/')
+        body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.startswith('retry: 3000\n\nevent: ranking\ndata: '))
+        self.assertEqual(json.loads(body.split('data: ')[1])[0]['username'], 'organizer')
+
+    @mock.patch.object(streams, 'POLL_INTERVAL', 0.01)
+    @mock.patch.object(streams, 'ERROR_BACKOFF', 0.01)
+    async def test_broadcaster_survives_a_failed_refresh(self):
+        top_ranks = mock.Mock(side_effect=[RuntimeError('database is locked'), '["first"]'])
+        with mock.patch.object(streams, 'ranking_version', return_value=1), \
+                mock.patch.object(streams, '_top_ranks', top_ranks), self.assertLogs('contest.streams', 'ERROR'):
+            broadcaster = streams.get_broadcaster(self.contest.id)
+            queue = broadcaster.subscribe()
+            self.assertEqual(await asyncio.wait_for(queue.get(), 2), '["first"]')
+            broadcaster.unsubscribe(queue)
+        self.assertNotIn(self.contest.id, streams._broadcasters)
+
+
+class StreamingBodyTests(TestCase):
+    def chunks(self, pulled):
+        for n in range(3):
+            pulled.append(n)
+            yield f'{n}\n'
+
+    def test_wsgi_keeps_the_sync_iterator(self):
+        pulled = []
+        body = streaming_body(RequestFactory().get('/'), self.chunks(pulled))
+        self.assertEqual(next(body), '0\n')
+
+    async def test_asgi_pulls_one_chunk_at_a_time(self):
+        pulled = []
+        body = streaming_body(AsyncRequestFactory().get('/'), self.chunks(pulled))
+        self.assertEqual(await body.__anext__(), '0\n')
+        self.assertEqual(pulled, [0])
+        self.assertEqual([chunk async for chunk in body], ['1\n', '2\n'])
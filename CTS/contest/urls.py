@@ -12,16 +12,22 @@ urlpatterns = [
     # Participation
     path('contests/<int:pk>/join/', views.JoinContestView.as_view(), name='contest-join'),
     path('contests/<int:pk>/participants/', views.ParticipantListView.as_view(), name='contest-participants'),
+    path('contests/<int:pk>/participants/bulk/', views.BulkJoinContestView.as_view(), name='contest-participants-bulk'),
 
     # Submissions
     path('contests/<int:pk>/submit/', views.SubmissionCreateView.as_view(), name='contest-submit'),
+    path('contests/<int:pk>/submissions/export/', views.SubmissionExportView.as_view(), name='contest-submissions-export'),
+    path('contests/<int:pk>/grade/', views.ContestGradeView.as_view(), name='contest-grade'),
     path('submissions/', views.SubmissionListView.as_view(), name='submission-list'),
     path('submissions/<int:pk>/', views.SubmissionDetailView.as_view(), name='submission-detail'),
+    path('submissions/receipts/<uuid:receipt>/', views.SubmissionReceiptView.as_view(), name='submission-receipt'),
 
     # Question paper
     path('contests/<int:pk>/questions/', views.QuestionPaperView.as_view(), name='contest-questions'),
 
     # Results / leaderboard
     path('contests/<int:pk>/results/', views.ContestResultView.as_view(), name='contest-results'),
+    path('contests/<int:pk>/results/me/', views.MyContestRankView.as_view(), name='contest-my-rank'),
+    path('contests/<int:pk>/results/stream/', views.contest_results_stream, name='contest-results-stream'),
     path('leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
 ]
@@ -1,19 +1,39 @@
 from rest_framework import generics, views, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from django.conf import settings
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Contest, Participant, Submission, QuestionPaper
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from CTS.streaming import is_asgi, streaming_body
+from .models import Contest, Participant, Submission, QuestionPaper, ContestRanking
+from .ranking import rank_of
+from .leaderboard import get_leaderboard
+from .grading import grade_submission_async, regrade_contest_async
+from .ingestion import get_journal, is_queued
+from .streams import result_events, snapshot_event
+from .question_papers import question_paper_response
+from .exports import EXPORT_FORMATS, export_lines
+from .registration import RegistrationError, bulk_register, parse_user_ids
+from .pagination import NewestFirstCursorPagination, RankingPagination
 from .serializers import (
     ContestSerializer,
     ParticipantSerializer,
     SubmissionSerializer,
     QuestionPaperSerializer,
+    ContestRankingSerializer,
 )
 
 # ---------- Contest Views ----------
 
+def contest_queryset():
+    # Organizer joined and participants counted in the same query as the contests
+    return Contest.objects.select_related('organizer').annotate(participants_count=Count('participant'))
+
+
 class ContestListView(generics.ListCreateAPIView):
-    queryset = Contest.objects.all().order_by('-created_at')
+    queryset = contest_queryset().order_by('-created_at')
     serializer_class = ContestSerializer
     permission_classes = [AllowAny]  # Anyone can view, authenticated users can create
 
@@ -22,6 +42,14 @@ class ContestListView(generics.ListCreateAPIView):
             self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # ?status=upcoming|ongoing|past, served by the (status, deadline) index
+        status_filter = self.request.query_params.get('status')
+        if status_filter in dict(Contest.STATUS_CHOICES):
+            queryset = queryset.filter(status=status_filter)
+        return queryset
+
     def create(self, request, *args, **kwargs):
         # Pass request in serializer context so we can access user in serializer
         serializer = self.get_serializer(data=request.data, context={'request': request})
@@ -32,7 +60,7 @@ class ContestListView(generics.ListCreateAPIView):
 
 
 class ContestDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Contest.objects.all()
+    queryset = contest_queryset()
     serializer_class = ContestSerializer
     permission_classes = [AllowAny]
 
@@ -46,23 +74,71 @@ class JoinContestView(views.APIView):
         contest = get_object_or_404(Contest, pk=pk)
         user = request.user
 
-        # Check if already joined
-        if Participant.objects.filter(contest=contest, userId=user).exists():
+        # The (contest, userId) constraint rejects a second registration
+        try:
+            with transaction.atomic():
+                participant = Participant.objects.create(contest=contest, userId=user, payment_status=True)
+        except IntegrityError:
             return Response({"message": "Already joined this contest."}, status=400)
 
-        participant = Participant.objects.create(contest=contest, userId=user, payment_status=True)
         return Response(
             {"message": f"Joined contest '{contest.title}' successfully!", "participant_id": participant.id},
             status=201
         )
 
 
+class BulkJoinContestView(views.APIView):
+    """
+    POST /contests/<pk>/participants/bulk/ (organizer only)
+      {"user_ids": [1, 2, 3]}  or  multipart with a CSV as `file`
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        contest = get_object_or_404(Contest, pk=pk)
+        if contest.organizer_id != request.user.id:
+            return Response({"detail": "Only the organizer can register participants."}, status=403)
+
+        try:
+            user_ids = parse_user_ids(request.data, request.FILES.get('file'))
+        except RegistrationError as e:
+            return Response({"error": str(e)}, status=400)
+
+        result = bulk_register(contest, user_ids)
+        return Response(
+            {
+                "message": f"Registered {len(result['registered'])} users for '{contest.title}'.",
+                **result,
+            },
+            status=201 if result['registered'] else 200,
+        )
+
+
+def parse_bool(value):
+    """'true'/'1' -> True, 'false'/'0' -> False, anything else -> None (filter not applied)."""
+    return {'true': True, '1': True, 'false': False, '0': False}.get(str(value).lower())
+
+
+def parse_id(value):
+    return int(value) if value and str(value).isdigit() else None
+
+
 class ParticipantListView(generics.ListAPIView):
+    """GET /contests/<pk>/participants/?user=<id>&paid=true|false (cursor paginated)"""
     serializer_class = ParticipantSerializer
     permission_classes = [AllowAny]
+    pagination_class = NewestFirstCursorPagination
 
     def get_queryset(self):
-        return Participant.objects.filter(contest_id=self.kwargs['pk']).select_related('userId', 'contest')
+        queryset = Participant.objects.filter(contest_id=self.kwargs['pk']).select_related('userId', 'contest')
+        params = self.request.query_params
+        user_id = parse_id(params.get('user'))
+        if user_id is not None:
+            queryset = queryset.filter(userId_id=user_id)
+        paid = parse_bool(params.get('paid'))
+        if paid is not None:
+            queryset = queryset.filter(payment_status=paid)
+        return queryset
 
 
 # ---------- Submission Views ----------
@@ -71,52 +147,186 @@ class SubmissionCreateView(generics.CreateAPIView):
     serializer_class = SubmissionSerializer
     permission_classes = [IsAuthenticated]
 
+    def create(self, request, *args, **kwargs):
+        if not getattr(settings, 'SUBMISSION_JOURNAL_ENABLED', False):
+            return super().create(request, *args, **kwargs)
+
+        # Journal mode: accept right away and let the drainer insert in batches
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        participant_id = (
+            Participant.objects.filter(userId=request.user, contest_id=self.kwargs['pk'])
+            .values_list('id', flat=True)
+            .first()
+        )
+        if participant_id is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        receipt = get_journal().enqueue(participant_id, serializer.validated_data['submission'])
+        return Response({"receipt": str(receipt), "status": "queued"}, status=status.HTTP_202_ACCEPTED)
+
     def perform_create(self, serializer):
         participant = get_object_or_404(Participant, userId=self.request.user, contest_id=self.kwargs['pk'])
-        serializer.save(participant=participant)
+        submission = serializer.save(participant=participant)
+        grade_submission_async(submission.id)
 
 
 class SubmissionListView(generics.ListAPIView):
-    queryset = Submission.objects.all().select_related('participant')
+    """GET /submissions/?contest=<id>&user=<id>&scored=true|false (cursor paginated)"""
     serializer_class = SubmissionSerializer
     permission_classes = [AllowAny]
+    pagination_class = NewestFirstCursorPagination
+
+    def get_queryset(self):
+        queryset = Submission.objects.select_related('participant__userId', 'participant__contest')
+        params = self.request.query_params
+        contest_id = parse_id(params.get('contest'))
+        if contest_id is not None:
+            queryset = queryset.filter(participant__contest_id=contest_id)
+        user_id = parse_id(params.get('user'))
+        if user_id is not None:
+            queryset = queryset.filter(participant__userId_id=user_id)
+        scored = parse_bool(params.get('scored'))
+        if scored is not None:
+            queryset = queryset.filter(score__isnull=not scored)
+        return queryset
+
+
+class SubmissionExportView(views.APIView):
+    """GET /contests/<pk>/submissions/export/?file_format=csv|jsonl -> streamed export (organizer only)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        contest = get_object_or_404(Contest, pk=pk)
+        if contest.organizer_id != request.user.id:
+            return Response({"detail": "Only the organizer can export submissions."}, status=403)
+
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({"detail": "file_format must be csv or jsonl."}, status=400)
+
+        response = StreamingHttpResponse(
+            streaming_body(request, export_lines(contest.id, file_format)), content_type=EXPORT_FORMATS[file_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="contest-{contest.id}-submissions.{file_format}"'
+        return response
+
+
+class SubmissionReceiptView(views.APIView):
+    """
+    GET /submissions/receipts/<receipt>/ -> the stored submission, 202 while
+    it is still in a journal, 404 for a receipt that is in neither.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, receipt):
+        submissions = (
+            Submission.objects.select_related('participant__userId', 'participant__contest')
+            .filter(receipt=receipt, participant__userId=request.user)
+        )
+        submission = submissions.first()
+        if submission is None:
+            if is_queued(receipt):
+                return Response({"receipt": str(receipt), "status": "queued"}, status=status.HTTP_202_ACCEPTED)
+            # It may have been drained between the two lookups
+            submission = submissions.first()
+            if submission is None:
+                return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(SubmissionSerializer(submission).data)
 
 
 class SubmissionDetailView(generics.RetrieveAPIView):
-    queryset = Submission.objects.all().select_related('participant')
+    queryset = Submission.objects.select_related('participant__userId', 'participant__contest')
     serializer_class = SubmissionSerializer
     permission_classes = [AllowAny]
 
 
+class ContestGradeView(views.APIView):
+    """POST /contests/<pk>/grade/ -> re-grade every submission in the background (organizer only)."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk):
+        contest = get_object_or_404(Contest, pk=pk)
+        if contest.organizer_id != request.user.id:
+            return Response({"detail": "Only the organizer can grade this contest."}, status=403)
+        if not QuestionPaper.objects.filter(contest=contest).exists():
+            return Response({"detail": "This contest has no question paper."}, status=400)
+
+        only_ungraded = request.data.get('only_ungraded') in (True, 'true', '1')
+        regrade_contest_async(contest.id, only_ungraded=only_ungraded)
+        return Response({"message": "Grading started."}, status=status.HTTP_202_ACCEPTED)
+
+
 # ---------- Question Paper ----------
 
 class QuestionPaperView(generics.RetrieveAPIView):
     serializer_class = QuestionPaperSerializer
     permission_classes = [AllowAny]
 
-    def get_object(self):
-        return get_object_or_404(QuestionPaper, contest_id=self.kwargs['pk'])
+    def retrieve(self, request, *args, **kwargs):
+        # Pre-serialized + gzip cache with ETag / If-None-Match support
+        response = question_paper_response(request, self.kwargs['pk'])
+        if response is None:
+            raise Http404
+        return response
 
 
 # ---------- Result / Leaderboard ----------
 
-class ContestResultView(views.APIView):
+class ContestResultView(generics.ListAPIView):
+    """
+    GET /contests/<pk>/results/?limit=10            -> top 10
+    GET /contests/<pk>/results/?limit=50&offset=100 -> ranks 101-150
+    Served from the precomputed ContestRanking index.
+
+    The response is {"count", "next", "previous", "results"} with one
+    ContestRankingSerializer entry (rank, score, participant, username,
+    submission, submitted_at) per participant's best submission. It used to
+    be a bare list of every submission, ordered by score.
+    """
+    serializer_class = ContestRankingSerializer
     permission_classes = [AllowAny]
+    pagination_class = RankingPagination
+
+    def get_queryset(self):
+        return (
+            ContestRanking.objects.filter(contest_id=self.kwargs['pk'])
+            .select_related('participant__userId', 'submission')
+            .order_by('rank', 'id')
+        )
+
+
+class MyContestRankView(views.APIView):
+    permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
-        submissions = Submission.objects.filter(participant__contest_id=pk).order_by('-score')
-        serializer = SubmissionSerializer(submissions, many=True)
-        return Response(serializer.data)
+        entry = rank_of(pk, request.user)
+        if entry is None:
+            return Response({"detail": "No scored submission in this contest."}, status=404)
+        return Response(ContestRankingSerializer(entry).data)
+
+
+async def contest_results_stream(request, pk):
+    """
+    GET /contests/<pk>/results/stream/ -> live top ranks as server-sent events.
+
+    Under ASGI (CTS/asgi.py) the stream stays open and one producer per
+    contest feeds every open stream. A WSGI worker can't hold a connection
+    open without blocking, so there it sends the current ranking and closes;
+    EventSource clients reconnect after the advertised retry delay, which
+    turns the stream into polling.
+    """
+    if not await Contest.objects.filter(pk=pk).aexists():
+        raise Http404
+    events = result_events(pk) if is_asgi(request) else [await snapshot_event(pk)]
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 class LeaderboardView(views.APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        top_scores = (
-            Submission.objects
-            .select_related('participant__userId', 'participant__contest')
-            .order_by('-score')[:10]
-        )
-        serializer = SubmissionSerializer(top_scores, many=True)
-        return Response(serializer.data)
+        return Response(get_leaderboard())
@@ -1,6 +1,10 @@
 from django.contrib import admin
 from file.models import DriveNode
 from file.models import ShareLink
+from file.models import DriveSyncState
+from file.models import DriveJob
 # Register your models here.
 admin.site.register(DriveNode)
-admin.site.register(ShareLink)
\ No newline at end of file
+admin.site.register(ShareLink)
+admin.site.register(DriveSyncState)
+admin.site.register(DriveJob)
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from ...utils.drive_jobs import claim_next, clean_staged_uploads, requeue_stale, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = "Run queued Drive jobs (uploads, bulk operations, folder copy/share/size)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty")
+        parser.add_argument('--poll', type=float, default=settings.DRIVE_JOB_POLL_INTERVAL,
+                            metavar='SECONDS', help="How often to check an empty queue")
+
+    def handle(self, *args, **options):
+        name = worker_name()
+        self.stdout.write(f"Drive job worker {name} started")
+        cleaned_at = None
+        while True:
+            requeued, failed = requeue_stale()
+            if requeued or failed:
+                self.stdout.write(f"{requeued} stale jobs queued again, {failed} given up")
+            if cleaned_at is None or time.monotonic() - cleaned_at > settings.DRIVE_JOB_STALE_AFTER:
+                removed = clean_staged_uploads()
+                if removed:
+                    self.stdout.write(f"{removed} orphaned staged uploads removed")
+                cleaned_at = time.monotonic()
+
+            job_id = claim_next(name)
+            if job_id is None:
+                if options['once']:
+                    break
+                connection.close()
+                time.sleep(options['poll'])
+                continue
+
+            job = run_job(job_id)
+            self.stdout.write(f"{job.kind} job {job.pk}: {job.status}")
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS("✅ Drive job queue is empty."))
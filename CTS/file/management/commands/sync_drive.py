@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from user.models import UserProfile
+from ...utils.drive_clients import get_user_drive_service
+from ...utils.drive_sync import sync_user
+
+
+class Command(BaseCommand):
+    help = "Mirror users' CTS Google Drive folders into DriveNode (full walk first, then the changes feed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only sync this user id")
+        parser.add_argument('--full', action='store_true', help="Walk the whole folder tree again instead of replaying changes")
+        parser.add_argument('--watch', type=float, metavar='SECONDS', help="Keep running, syncing every SECONDS")
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.select_related('user').exclude(google_drive_credentials=None).exclude(google_drive_folder_id=None)
+        if options['user']:
+            profiles = profiles.filter(user_id=options['user'])
+
+        while True:
+            for profile in profiles.all():
+                try:
+                    count = sync_user(profile, get_user_drive_service(profile), full=options['full'])
+                except Exception as e:
+                    self.stderr.write(f"{profile.user.username}: {e}")
+                    continue
+                if count is None:
+                    self.stdout.write(f"{profile.user.username}: sync already running, skipped")
+                else:
+                    self.stdout.write(f"{profile.user.username}: {count} items synced")
+            if not options['watch']:
+                break
+            connection.close()
+            time.sleep(options['watch'])
+            # Only the first pass is forced to be full
+            options['full'] = False
+
+        self.stdout.write(self.style.SUCCESS("✅ Drive mirrors are up to date."))
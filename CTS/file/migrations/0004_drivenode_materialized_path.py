@@ -0,0 +1,46 @@
+# Generated by Django 5.0 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+def populate_tree_paths(apps, schema_editor):
+    DriveNode = apps.get_model('file', 'DriveNode')
+    nodes = {node.id: node for node in DriveNode.objects.all()}
+
+    def resolve(node):
+        if node.parent_id is None:
+            return '/', node.name, 0
+        parent = nodes[node.parent_id]
+        if not parent.full_path:
+            parent.tree_path, parent.full_path, parent.depth = resolve(parent)
+        return f"{parent.tree_path}{parent.id}/", f"{parent.full_path}/{node.name}", parent.depth + 1
+
+    for node in nodes.values():
+        node.tree_path, node.full_path, node.depth = resolve(node)
+    DriveNode.objects.bulk_update(nodes.values(), ['tree_path', 'full_path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file', '0003_remove_sharelink_node_sharelink_file_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='drivenode',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='drivenode',
+            name='full_path',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='drivenode',
+            name='tree_path',
+            field=models.CharField(db_index=True, default='/', editable=False, max_length=1024),
+        ),
+        migrations.RunPython(populate_tree_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0 on 2026-10-18 16:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file', '0004_drivenode_materialized_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriveSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('root_folder_id', models.CharField(max_length=200)),
+                ('page_token', models.CharField(blank=True, max_length=200, null=True)),
+                ('last_full_sync', models.DateTimeField(blank=True, null=True)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='drivenode',
+            name='drive_modified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='drivenode',
+            name='drive_file_id',
+            field=models.CharField(blank=True, max_length=200, null=True),
+        ),
+        migrations.AlterField(
+            model_name='drivenode',
+            name='web_view_link',
+            field=models.URLField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='drivenode',
+            constraint=models.UniqueConstraint(fields=('owner', 'drive_file_id'), name='unique_owner_drive_file'),
+        ),
+        migrations.AddField(
+            model_name='drivesyncstate',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='drive_sync', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
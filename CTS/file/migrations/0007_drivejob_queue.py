@@ -0,0 +1,43 @@
+# Generated by Django 5.0 on 2026-10-18 17:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file', '0006_drivejob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='drivejob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='drivejob',
+            name='claimed_by',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='drivejob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='drivejob',
+            name='kind',
+            field=models.CharField(choices=[('copy_folder', 'Copy folder'), ('share_folder', 'Share folder'), ('folder_size', 'Folder size'), ('upload', 'Upload'), ('bulk', 'Bulk operation')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='drivejob',
+            index=models.Index(fields=['status', 'created_at'], name='file_drivej_status_4df4d1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='drivejob',
+            index=models.Index(fields=['user', '-created_at'], name='file_drivej_user_id_05dd0d_idx'),
+        ),
+    ]
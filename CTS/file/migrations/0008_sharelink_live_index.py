@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-18 17:07
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file', '0007_drivejob_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sharelink',
+            index=models.Index(fields=['is_active', 'expires_at'], name='file_sharel_is_acti_b01a7e_idx'),
+        ),
+    ]
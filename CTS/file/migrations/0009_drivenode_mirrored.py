@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-18 17:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def flag_mirrored_trees(apps, schema_editor):
+    """
+    Rows written by the mirror before this flag existed: each synced user's
+    root folder node and everything below it. Other rows stay local; anything
+    missed is mirrored again by the next sync.
+    """
+    DriveNode = apps.get_model('file', 'DriveNode')
+    DriveSyncState = apps.get_model('file', 'DriveSyncState')
+    for state in DriveSyncState.objects.all():
+        roots = DriveNode.objects.filter(owner_id=state.user_id, parent=None, drive_file_id=state.root_folder_id)
+        for root in roots:
+            DriveNode.objects.filter(owner_id=state.user_id, tree_path__startswith=f"/{root.pk}/").update(mirrored=True)
+        roots.update(mirrored=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file', '0008_sharelink_live_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='drivenode',
+            name='unique_owner_drive_file',
+        ),
+        migrations.AddField(
+            model_name='drivenode',
+            name='mirrored',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(flag_mirrored_trees, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='drivenode',
+            constraint=models.UniqueConstraint(condition=models.Q(('mirrored', True)), fields=('owner', 'drive_file_id'), name='unique_mirrored_drive_file'),
+        ),
+    ]
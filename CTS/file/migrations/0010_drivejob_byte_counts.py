@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file', '0009_drivenode_mirrored'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='drivejob',
+            name='completed',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='drivejob',
+            name='total',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-18 17:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('file', '0010_drivejob_byte_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='drivenode',
+            constraint=models.UniqueConstraint(condition=models.Q(('mirrored', False)), fields=('drive_file_id',), name='unique_local_drive_file'),
+        ),
+    ]
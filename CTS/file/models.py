@@ -1,13 +1,28 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
 import uuid
 from django.utils import timezone
 from datetime import timedelta
 
 
+class DriveNodeQuerySet(models.QuerySet):
+    def local(self):
+        """Nodes managed through the /nodes/ API."""
+        return self.filter(mirrored=False)
+
+    def mirrored(self):
+        """Nodes written by the Drive mirror (file/utils/drive_sync.py)."""
+        return self.filter(mirrored=True)
+
+
 class DriveNode(models.Model):
     """
     Represents both files and folders in a Google Drive-like tree structure.
+
+    The same table holds each user's mirror of their CTS Drive folder, flagged
+    `mirrored`; the two trees never share nodes.
     """
 
     # Basic Info
@@ -15,10 +30,11 @@ class DriveNode(models.Model):
     is_folder = models.BooleanField(default=False)
 
     # Google Drive Details
-    drive_file_id = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    drive_file_id = models.CharField(max_length=200, null=True, blank=True)
     mime_type = models.CharField(max_length=100, null=True, blank=True)
-    web_view_link = models.URLField(null=True, blank=True)
+    web_view_link = models.URLField(max_length=500, null=True, blank=True)
     size = models.BigIntegerField(null=True, blank=True)  # in bytes
+    drive_modified_at = models.DateTimeField(null=True, blank=True)
 
     # Tree Structure
     parent = models.ForeignKey(
@@ -29,6 +45,15 @@ class DriveNode(models.Model):
         on_delete=models.CASCADE
     )
 
+    # Materialized path (kept current by save())
+    # tree_path holds the ids of all ancestors, e.g. "/1/5/" for a node under 1 -> 5.
+    tree_path = models.CharField(max_length=1024, default='/', editable=False, db_index=True)
+    full_path = models.TextField(default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
+
+    # Written and deleted only by the Drive mirror; hidden from the /nodes/ API
+    mirrored = models.BooleanField(default=False, editable=False)
+
     # Ownership and Timestamps
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='drive_nodes')
     created_at = models.DateTimeField(auto_now_add=True)
@@ -38,25 +63,155 @@ class DriveNode(models.Model):
         verbose_name = "Drive Node"
         verbose_name_plural = "Drive Nodes"
         ordering = ['name']
+        constraints = [
+            # The same Drive file can be mirrored for every user who can see it
+            models.UniqueConstraint(
+                fields=['owner', 'drive_file_id'], condition=Q(mirrored=True), name='unique_mirrored_drive_file',
+            ),
+            # Local nodes keep the original rule: one node per uploaded Drive file
+            models.UniqueConstraint(
+                fields=['drive_file_id'], condition=Q(mirrored=False), name='unique_local_drive_file',
+            ),
+        ]
+
+    objects = DriveNodeQuerySet.as_manager()
 
     def __str__(self):
         return f"{'📁' if self.is_folder else '📄'} {self.name}"
 
+    def save(self, *args, **kwargs):
+        previous = None
+        if self.pk:
+            previous = DriveNode.objects.filter(pk=self.pk).values('tree_path', 'full_path', 'depth').first()
+
+        if self.parent_id:
+            parent = self.parent
+            moved_into_subtree = previous and parent.tree_path.startswith(f"{previous['tree_path']}{self.pk}/")
+            if moved_into_subtree or parent.pk == self.pk:
+                raise ValueError("A node cannot be moved inside itself.")
+            self.tree_path = f"{parent.tree_path}{parent.pk}/"
+            self.full_path = f"{parent.full_path}/{self.name}"
+            self.depth = parent.depth + 1
+        else:
+            self.tree_path = '/'
+            self.full_path = self.name
+            self.depth = 0
+
+        # The row and its subtree's paths change together or not at all
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+            # A move or rename rewrites the prefix of every descendant in one UPDATE
+            if previous and (previous['tree_path'] != self.tree_path or previous['full_path'] != self.full_path):
+                old_prefix = f"{previous['tree_path']}{self.pk}/"
+                new_prefix = f"{self.tree_path}{self.pk}/"
+                DriveNode.objects.filter(tree_path__startswith=old_prefix).update(
+                    tree_path=Concat(
+                        Value(new_prefix), Substr('tree_path', len(old_prefix) + 1),
+                        output_field=models.CharField(),
+                    ),
+                    full_path=Concat(
+                        Value(self.full_path), Substr('full_path', len(previous['full_path']) + 1),
+                        output_field=models.TextField(),
+                    ),
+                    depth=F('depth') + (self.depth - previous['depth']),
+                )
+
     def get_path(self):
         """
         Returns the full path from root to this file/folder.
         """
-        path = [self.name]
-        parent = self.parent
-        while parent:
-            path.append(parent.name)
-            parent = parent.parent
-        return '/'.join(reversed(path))
+        return self.full_path
+
+    def get_ancestors(self):
+        """
+        Returns the ancestors of this node, root first, in a single query.
+        """
+        ids = [int(i) for i in self.tree_path.strip('/').split('/') if i]
+        return DriveNode.objects.filter(id__in=ids).order_by('depth')
+
+    def get_descendants(self):
+        """
+        Returns every node below this one in a single indexed prefix query.
+        """
+        return DriveNode.objects.filter(tree_path__startswith=f"{self.tree_path}{self.pk}/")
 
     @property
     def is_root(self):
         return self.parent is None
 
+class DriveSyncState(models.Model):
+    """
+    Where a user's DriveNode mirror of their CTS Drive folder is up to.
+    `page_token` is the Drive changes-feed position after the last sync.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='drive_sync')
+    root_folder_id = models.CharField(max_length=200)
+    page_token = models.CharField(max_length=200, null=True, blank=True)
+    last_full_sync = models.DateTimeField(null=True, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Drive sync for {self.user.username} ({self.last_synced_at or 'never'})"
+
+
+class DriveJob(models.Model):
+    """
+    A queued or running Drive operation and its progress; the table doubles as
+    the job queue (see file/utils/drive_jobs.py). For folder jobs `total` grows
+    as the tree is discovered; for uploads it counts bytes.
+    """
+    KIND_CHOICES = [
+        ('copy_folder', 'Copy folder'),
+        ('share_folder', 'Share folder'),
+        ('folder_size', 'Folder size'),
+        ('upload', 'Upload'),
+        ('bulk', 'Bulk operation'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='drive_jobs')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    # Byte counts for uploads, so they must hold more than 2 GiB
+    total = models.PositiveBigIntegerField(default=0)
+    completed = models.PositiveBigIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    # Queue bookkeeping: which worker holds the job, how often it was tried,
+    # and when it last showed signs of life (stale jobs are picked up again)
+    claimed_by = models.CharField(max_length=100, blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.user.username} ({self.status})"
+
+
+class ShareLinkQuerySet(models.QuerySet):
+    def live(self):
+        """Links that still work: active and not past their expiry."""
+        return self.filter(Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now()), is_active=True)
+
+
 class ShareLink(models.Model):
     """
     Represents a shareable link for a file or folder
@@ -69,7 +224,15 @@ class ShareLink(models.Model):
     is_active = models.BooleanField(default=True)
     download_count = models.IntegerField(default=0)
     last_accessed = models.DateTimeField(null=True, blank=True)
-    
+
+    objects = ShareLinkQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Counting live links reads only this index
+            models.Index(fields=['is_active', 'expires_at']),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.expires_at:
             # Default expiry of 7 days
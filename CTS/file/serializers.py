@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import DriveNode, ShareLink
+from .models import DriveNode, ShareLink, DriveJob
 from django.urls import reverse
 
 
@@ -25,8 +25,6 @@ class ShareLinkSerializer(serializers.ModelSerializer):
 class DriveNodeSerializer(serializers.ModelSerializer):
     children = serializers.SerializerMethodField(read_only=True)
     path = serializers.SerializerMethodField(read_only=True)
-    share_links = ShareLinkSerializer(many=True, read_only=True)
-    has_active_share = serializers.SerializerMethodField()
 
     class Meta:
         model = DriveNode
@@ -36,9 +34,92 @@ class DriveNodeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['owner', 'created_at', 'updated_at']
 
+    def validate_parent(self, parent):
+        if parent and parent.mirrored:
+            raise serializers.ValidationError("Mirrored Drive folders can't hold local nodes.")
+        node = self.instance
+        if node and parent and (parent.pk == node.pk or parent.tree_path.startswith(f"{node.tree_path}{node.pk}/")):
+            raise serializers.ValidationError("A node cannot be moved inside itself.")
+        return parent
+
     def get_children(self, obj):
-        """List children nodes for folders."""
-        return DriveNodeSerializer(obj.children.all(), many=True).data if obj.is_folder else []
+        """List children nodes for folders (whole subtree loaded in one query)."""
+        if not obj.is_folder:
+            return []
+        return serialize_node_tree(obj.get_descendants().order_by('depth', 'name'))
 
     def get_path(self, obj):
         return obj.get_path()
+
+
+class DriveNodeFlatSerializer(DriveNodeSerializer):
+    """Same as DriveNodeSerializer but without the nested `children`."""
+
+    class Meta(DriveNodeSerializer.Meta):
+        fields = [f for f in DriveNodeSerializer.Meta.fields if f != 'children']
+
+
+def _node_levels(nodes, max_depth=None):
+    """
+    Yields (node, level) for every node within `max_depth` levels.
+    Nodes must be ordered parents-first (e.g. by `depth`); a node whose parent
+    is not in `nodes` is treated as a root at level 0.
+    """
+    levels = {}
+    for node in nodes:
+        parent_level = levels.get(node.parent_id)
+        level = 0 if parent_level is None else parent_level + 1
+        levels[node.id] = level
+        if max_depth is None or level < max_depth:
+            yield node, level
+
+
+def serialize_node_tree(nodes, max_depth=None, flat=False):
+    """
+    Serializes already-loaded nodes without any further queries.
+    Every node is serialized exactly once and then attached to its parent in
+    memory, so the cost is linear in the number of nodes.
+    """
+    included = [node for node, _ in _node_levels(nodes, max_depth)]
+    data = DriveNodeFlatSerializer(included, many=True).data
+    if flat:
+        return data
+
+    by_id = {}
+    roots = []
+    for node, item in zip(included, data):
+        item['children'] = []
+        by_id[node.id] = item
+        parent = by_id.get(node.parent_id)
+        if parent is None:
+            roots.append(item)
+        else:
+            parent['children'].append(item)
+    return roots
+
+
+# Job params that only mean something on the server (the staged upload's file path)
+PRIVATE_JOB_PARAMS = ('path',)
+
+
+class DriveJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DriveJob
+        fields = [
+            'id', 'kind', 'params', 'status', 'total', 'completed', 'failed', 'progress',
+            'result', 'errors', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['params'] = {k: v for k, v in (data['params'] or {}).items() if k not in PRIVATE_JOB_PARAMS}
+        return data
+
+    def get_progress(self, obj):
+        # Share of the discovered items done so far; the total grows during the walk
+        if obj.status == 'succeeded':
+            return 1.0
+        return round(obj.completed / obj.total, 3) if obj.total else 0.0
@@ -1,3 +1,789 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+import httplib2
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone as django_timezone
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest, MediaIoBaseUpload
+from rest_framework.test import APIClient
+
+from .models import DriveJob, DriveNode, ShareLink
+from .utils import drive_jobs, drive_tree
+from .utils.drive_clients import DriveClientCache
+from .utils.drive_sync import mirrored_listing, sync_user
+from .utils.drive_operations import bulk_move, run_resumable_upload, upload_chunk_size
+
+
+class DriveNodePathTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='owner')
+        self.docs = DriveNode.objects.create(name='Docs', is_folder=True, owner=self.user)
+        self.notes = DriveNode.objects.create(name='Notes', is_folder=True, parent=self.docs, owner=self.user)
+        self.week = DriveNode.objects.create(name='Week 1', is_folder=True, parent=self.notes, owner=self.user)
+        self.pdf = DriveNode.objects.create(name='a.pdf', parent=self.week, owner=self.user)
+        self.archive = DriveNode.objects.create(name='Archive', is_folder=True, owner=self.user)
+
+    def test_move_rewrites_subtree_paths_and_depths(self):
+        self.notes.parent = self.archive
+        self.notes.save()
+        self.pdf.refresh_from_db()
+        self.assertEqual(self.pdf.full_path, 'Archive/Notes/Week 1/a.pdf')
+        self.assertEqual(self.pdf.tree_path, f'/{self.archive.pk}/{self.notes.pk}/{self.week.pk}/')
+        self.assertEqual(self.pdf.depth, 3)
+
+        self.notes.parent = None
+        self.notes.save()
+        self.pdf.refresh_from_db()
+        self.assertEqual((self.pdf.full_path, self.pdf.depth), ('Notes/Week 1/a.pdf', 2))
+        self.assertEqual(list(self.pdf.get_ancestors()), [self.notes, self.week])
+
+    def test_move_into_own_subtree_is_rejected(self):
+        self.notes.parent = self.week
+        with self.assertRaises(ValueError):
+            self.notes.save()
+
+    def test_failed_subtree_rewrite_leaves_node_unmoved(self):
+        self.notes.parent = self.archive
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.notes.save()
+        self.notes.refresh_from_db()
+        self.assertEqual((self.notes.parent_id, self.notes.full_path), (self.docs.pk, 'Docs/Notes'))
+
+
+class DriveNodeListingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='owner')
+        docs = DriveNode.objects.create(name='Docs', is_folder=True, owner=self.user)
+        notes = DriveNode.objects.create(name='Notes', is_folder=True, parent=docs, owner=self.user)
+        DriveNode.objects.create(name='a.pdf', parent=notes, owner=self.user)
+        DriveNode.objects.create(name='Archive', is_folder=True, owner=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_default_listing_is_flat(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/files/nodes/').json()
+        self.assertEqual([n['name'] for n in data], ['Archive', 'Docs', 'Notes', 'a.pdf'])
+        self.assertNotIn('children', data[0])
+        self.assertEqual(data[2]['parent'], data[1]['id'])
+
+    def test_deep_chain_is_listed_once(self):
+        parent = DriveNode.objects.get(name='a.pdf').parent
+        for level in range(30):
+            parent = DriveNode.objects.create(name=f'level{level}', is_folder=True, parent=parent, owner=self.user)
+        self.assertEqual(len(json.dumps(self.client.get('/api/files/nodes/').json()).split('"name"')) - 1, 34)
+        tree = self.client.get('/api/files/nodes/', {'tree': 1}).json()
+        self.assertEqual(len(json.dumps(tree).split('"name"')) - 1, 34)
+
+    def test_tree_and_depth_options(self):
+        tree = self.client.get('/api/files/nodes/', {'tree': 1}).json()
+        self.assertEqual([n['name'] for n in tree], ['Archive', 'Docs'])
+        self.assertEqual(tree[1]['children'][0]['children'][0]['name'], 'a.pdf')
+        shallow = self.client.get('/api/files/nodes/', {'tree': 1, 'depth': 2}).json()
+        self.assertEqual(shallow[1]['children'][0]['children'], [])
+        self.assertEqual(len(self.client.get('/api/files/nodes/', {'depth': 2}).json()), 3)
+
+
+def fake_refresh(credentials, request):
+    credentials.token = f'token-{fake_refresh.calls}'
+    credentials.expiry = datetime.utcnow() + timedelta(hours=1)
+    fake_refresh.calls += 1
+
+
+@mock.patch('file.utils.drive_clients.drive_discovery_document', lambda: '{}')
+@mock.patch('file.utils.drive_clients.build_from_document', lambda document, http: object())
+@mock.patch('google.oauth2.credentials.Credentials.refresh', fake_refresh)
+class DriveClientCacheTests(TestCase):
+    def setUp(self):
+        fake_refresh.calls = 0
+        self.cache = DriveClientCache(max_size=2, ttl=60)
+        self.profiles = []
+        for i in range(3):
+            profile = User.objects.create(username=f'user{i}').profile
+            profile.google_drive_credentials = {
+                'token': 'stale',
+                'refresh_token': f'refresh-{i}',
+                'scopes': ['https://www.googleapis.com/auth/drive'],
+                'expiry': (datetime.utcnow() - timedelta(minutes=1)).isoformat(),
+            }
+            profile.save()
+            self.profiles.append(profile)
+
+    def test_client_is_reused_and_token_refreshed_once(self):
+        profile = self.profiles[0]
+        first = self.cache.get(profile)
+        self.assertIs(self.cache.get(profile), first)
+        self.assertEqual(fake_refresh.calls, 1)
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.google_drive_credentials['token'], 'token-0')
+        self.assertEqual(profile.google_drive_credentials['refresh_token'], 'refresh-0')
+
+    def test_least_recently_used_user_is_evicted(self):
+        first = self.cache.get(self.profiles[0])
+        self.cache.get(self.profiles[1])
+        self.cache.get(self.profiles[0])
+        self.cache.get(self.profiles[2])
+        self.assertIs(self.cache.get(self.profiles[0]), first)
+        self.assertEqual(set(self.cache._clients), {self.profiles[0].user_id, self.profiles[2].user_id})
+
+    def test_reconnected_account_gets_new_client(self):
+        profile = self.profiles[0]
+        first = self.cache.get(profile)
+        profile.google_drive_credentials = {**profile.google_drive_credentials, 'refresh_token': 'new'}
+        self.assertIsNot(self.cache.get(profile), first)
+
+
+class FlakyUploadSession:
+    """Fake resumable-upload endpoint that drops the connection on one chunk."""
+
+    def __init__(self, size, drop_on_request):
+        self.size = size
+        self.drop_on_request = drop_on_request
+        self.requests = 0
+        self.received = bytearray()
+        self.largest_body = 0
+
+    def progress(self):
+        return httplib2.Response({'status': 308, 'range': f'bytes=0-{len(self.received) - 1}'}), b''
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        self.requests += 1
+        if uri.endswith('/start'):
+            return httplib2.Response({'status': 200, 'location': 'https://upload/session'}), b''
+        if headers.get('Content-Range', '').startswith('bytes */'):
+            return self.progress()
+        if self.requests == self.drop_on_request:
+            raise socket.timeout('connection dropped')
+        chunk = body.read()
+        self.largest_body = max(self.largest_body, len(chunk))
+        self.received.extend(chunk)
+        if len(self.received) == self.size:
+            return httplib2.Response({'status': 200}), json.dumps({'id': 'drive-id'}).encode()
+        return self.progress()
+
+
+@override_settings(DRIVE_UPLOAD_CHUNK_SIZE=256 * 1024 + 1)
+@mock.patch('file.utils.drive_operations.time.sleep', lambda seconds: None)
+class ResumableUploadTests(TestCase):
+    def test_chunks_are_bounded_and_upload_resumes_after_a_drop(self):
+        data = os.urandom(700 * 1024)
+        session = FlakyUploadSession(len(data), drop_on_request=3)
+        media = MediaIoBaseUpload(io.BytesIO(data), 'video/mp4', chunksize=upload_chunk_size(), resumable=True)
+        request = HttpRequest(
+            session, lambda resp, content: json.loads(content), 'https://upload/start',
+            method='POST', body='{}', headers={'content-type': 'application/json'}, resumable=media,
+        )
+
+        self.assertEqual(run_resumable_upload(request), {'id': 'drive-id'})
+        self.assertEqual(bytes(session.received), data)
+        self.assertEqual(session.largest_body, 256 * 1024)
+
+
+class ResponseBody(io.BytesIO):
+    def close(self):
+        self.consumed = self.tell()
+        super().close()
+
+
+class RangedMediaSession:
+    """Fake Drive media endpoint answering ranged GETs from an in-memory file."""
+
+    def __init__(self, data, honour_ranges=True):
+        self.data = data
+        self.honour_ranges = honour_ranges
+        self.ranges = []
+        self.bodies = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def get(self, uri, headers=None, stream=False, **kwargs):
+        first, last = headers['range'][len('bytes='):].split('-')
+        self.ranges.append((int(first), int(last)))
+        response = requests.Response()
+        if self.honour_ranges:
+            response.status_code, response.raw = 206, ResponseBody(self.data[int(first):int(last) + 1])
+        else:
+            response.status_code, response.raw = 200, ResponseBody(self.data)
+        self.bodies.append(response.raw)
+        return response
+
+
+@override_settings(DRIVE_DOWNLOAD_CHUNK_SIZE=1000)
+class DriveDownloadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='viewer')
+        self.user.profile.google_drive_credentials = {'token': 't', 'refresh_token': 'r'}
+        self.user.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        self.data = os.urandom(2500)
+        self.media = RangedMediaSession(self.data)
+        service = mock.Mock()
+        service.files().get().execute.return_value = {
+            'name': 'lecture.mp4', 'mimeType': 'video/mp4', 'size': '2500', 'md5Checksum': 'abc',
+        }
+        service.files().get_media.return_value = mock.Mock(uri='https://media', headers={})
+        for patcher in (
+            mock.patch('file.views_drive.get_user_drive_service', return_value=service),
+            mock.patch('file.utils.drive_operations.AuthorizedSession', lambda credentials: self.media),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.url = '/api/files/drive/file-1/download/'
+
+    def test_full_download_is_streamed_in_chunks(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Content-Length'], '2500')
+        self.assertEqual(self.media.ranges, [(0, 999), (1000, 1999), (2000, 2499)])
+
+    def test_range_request_returns_partial_content(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1500-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 1500-2499/2500')
+        self.assertEqual(b''.join(response.streaming_content), self.data[1500:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+
+    def test_unsatisfiable_and_stale_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=3000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */2500')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-0')
+        self.assertEqual(response.status_code, 416)
+
+    def test_malformed_ranges_get_the_whole_file(self):
+        for header in ('bytes=abc-', 'bytes=5-2', 'bytes=-', 'items=0-9', 'bytes=1-2-3'):
+            response = self.client.get(self.url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertNotIn('Content-Range', response)
+            self.assertEqual(b''.join(response.streaming_content), self.data)
+
+    def test_ignored_range_streams_the_whole_body(self):
+        self.media.honour_ranges = False
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1200-1299')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.data[1200:1300])
+        # Read in 1000-byte chunks up to the end of the range, not the whole 2500 bytes
+        self.assertEqual(self.media.ranges, [(1200, 1299)])
+        self.assertEqual(self.media.bodies[0].consumed, 2000)
+
+
+class FakeDrive:
+    """In-memory stand-in for the parts of the Drive v3 API the mirror uses."""
+
+    PAGE_SIZE = 2
+
+    def __init__(self):
+        self.items = {}
+        self.changes_log = []
+        self.list_calls = 0
+
+    def add(self, item_id, name, parent=None, folder=False):
+        item = {
+            'id': item_id, 'name': name, 'parents': [parent] if parent else [],
+            'mimeType': 'application/vnd.google-apps.folder' if folder else 'text/plain',
+            'modifiedTime': '2026-01-01T00:00:00.000Z', 'trashed': False,
+        }
+        if not folder:
+            item['size'] = '10'
+        self.items[item_id] = item
+        self.changes_log.append({'fileId': item_id, 'removed': False, 'file': dict(item)})
+
+    def update(self, item_id, **fields):
+        self.items[item_id].update(fields)
+        self.changes_log.append({'fileId': item_id, 'removed': False, 'file': dict(self.items[item_id])})
+
+    def remove(self, item_id):
+        del self.items[item_id]
+        self.changes_log.append({'fileId': item_id, 'removed': True})
+
+    def request(self, result):
+        return mock.Mock(execute=mock.Mock(return_value=result))
+
+    def files(self):
+        return mock.Mock(get=self.get, list=self.list)
+
+    def changes(self):
+        return mock.Mock(getStartPageToken=self.start_token, list=self.list_changes)
+
+    def get(self, fileId, fields=None):
+        return self.request(dict(self.items[fileId]))
+
+    def list(self, q, pageToken=None, **kwargs):
+        self.list_calls += 1
+        parents = set(re.findall(r"'([^']+)' in parents", q))
+        matches = [dict(i) for i in self.items.values() if parents & set(i['parents'])]
+        start = int(pageToken or 0)
+        result = {'files': matches[start:start + self.PAGE_SIZE]}
+        if start + self.PAGE_SIZE < len(matches):
+            result['nextPageToken'] = str(start + self.PAGE_SIZE)
+        return self.request(result)
+
+    def start_token(self):
+        return self.request({'startPageToken': str(len(self.changes_log))})
+
+    def list_changes(self, pageToken, **kwargs):
+        start = int(pageToken)
+        page = self.changes_log[start:start + self.PAGE_SIZE]
+        result = {'changes': page}
+        if start + self.PAGE_SIZE < len(self.changes_log):
+            result['nextPageToken'] = str(start + self.PAGE_SIZE)
+        else:
+            result['newStartPageToken'] = str(len(self.changes_log))
+        return self.request(result)
+
+
+class DriveMirrorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='mirror')
+        self.profile = self.user.profile
+        self.profile.google_drive_credentials = {'token': 't', 'refresh_token': 'r'}
+        self.profile.google_drive_folder_id = 'root'
+        self.profile.save()
+
+        self.drive = FakeDrive()
+        self.drive.add('root', 'CTS', folder=True)
+        self.drive.add('notes', 'Notes', 'root', folder=True)
+        for i in range(5):
+            self.drive.add(f'file{i}', f'file{i}.txt', 'notes')
+        self.drive.add('week1', 'Week 1', 'notes', folder=True)
+        self.drive.add('slides', 'slides.txt', 'week1')
+        self.drive.add('elsewhere', 'Other', folder=True)
+
+    def listing(self, folder_id):
+        return [f['name'] for f in mirrored_listing(self.user, folder_id)]
+
+    def test_full_sync_follows_every_page(self):
+        self.assertEqual(sync_user(self.profile, self.drive), 9)
+        self.assertEqual(self.listing('notes'), ['Week 1'] + [f'file{i}.txt' for i in range(5)])
+        self.assertEqual(DriveNode.objects.get(drive_file_id='slides').full_path, 'CTS/Notes/Week 1/slides.txt')
+        self.assertIsNone(mirrored_listing(self.user, 'elsewhere'))
+
+    def test_changes_feed_keeps_mirror_current(self):
+        sync_user(self.profile, self.drive)
+        self.drive.update('week1', name='Week One')
+        self.drive.update('file0', parents=['week1'])
+        self.drive.remove('file1')
+        self.drive.update('file2', parents=['elsewhere'])
+        self.drive.add('extra', 'Extra', 'elsewhere', folder=True)
+        self.drive.add('extra-file', 'inside.txt', 'extra')
+        # Moving a folder in from elsewhere brings its unchanged children too
+        self.drive.items['extra']['parents'] = ['root']
+        self.drive.changes_log.append({'fileId': 'extra', 'removed': False, 'file': dict(self.drive.items['extra'])})
+
+        self.drive.list_calls = 0
+        sync_user(self.profile, self.drive)
+        self.assertEqual(self.listing('notes'), ['Week One', 'file3.txt', 'file4.txt'])
+        self.assertEqual(self.listing('week1'), ['file0.txt', 'slides.txt'])
+        self.assertEqual(self.listing('extra'), ['inside.txt'])
+        self.assertEqual(DriveNode.objects.get(drive_file_id='slides').full_path, 'CTS/Notes/Week One/slides.txt')
+        self.assertLessEqual(self.drive.list_calls, 2)
+
+    def test_listing_view_serves_mirror_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch('file.views_drive.get_user_drive_service', return_value=self.drive), \
+                mock.patch('file.utils.drive_sync.sync_in_background') as sync_in_background:
+            # No mirror yet: the full walk is left to the background and Drive answers live
+            response = client.get('/api/files/drive/list/', {'folder_id': 'notes'})
+            self.assertEqual(response.json()['debug_info']['source'], 'drive')
+            sync_in_background.assert_called_once_with(self.user.profile)
+
+            sync_user(self.profile, self.drive)
+            response = client.get('/api/files/drive/list/', {'folder_id': 'notes'})
+            self.assertEqual(response.json()['debug_info']['source'], 'mirror')
+            self.assertEqual(len(response.json()['files']), 6)
+
+            with self.assertNumQueries(2):  # freshness check, listing
+                client.get('/api/files/drive/list/', {'folder_id': 'notes'})
+
+    def test_mirror_leaves_local_nodes_alone(self):
+        outside = DriveNode.objects.create(name='Linked', drive_file_id='not-in-cts', owner=self.user)
+        same_file = DriveNode.objects.create(name='My copy', drive_file_id='file0', owner=self.user)
+        sync_user(self.profile, self.drive)
+        self.drive.remove('file0')
+        sync_user(self.profile, self.drive, full=True)
+
+        self.assertEqual(set(DriveNode.objects.local()), {outside, same_file})
+        self.assertFalse(DriveNode.objects.mirrored().filter(drive_file_id='file0').exists())
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual({n['name'] for n in client.get('/api/files/nodes/', {'flat': 1}).json()}, {'Linked', 'My copy'})
+        mirrored_folder = DriveNode.objects.mirrored().get(drive_file_id='notes')
+        self.assertEqual(client.get(f'/api/files/nodes/{mirrored_folder.pk}/').status_code, 404)
+
+    def test_local_nodes_keep_unique_drive_ids(self):
+        DriveNode.objects.create(name='Upload', drive_file_id='upload', owner=self.user)
+        other = User.objects.create(username='other')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DriveNode.objects.create(name='Upload again', drive_file_id='upload', owner=other)
+        # ...while a mirrored copy of the same Drive file is fine
+        DriveNode.objects.create(name='Upload', drive_file_id='upload', owner=self.user, mirrored=True)
+
+    def test_folders_swapping_places_fall_back_to_a_full_sync(self):
+        self.drive.add('inner', 'Inner', 'week1', folder=True)
+        sync_user(self.profile, self.drive)
+        # week1 moves below its own former child in one page of changes
+        self.drive.update('inner', parents=['notes'])
+        self.drive.update('week1', parents=['inner'])
+
+        with self.assertLogs('file.utils.drive_sync', 'WARNING'):
+            sync_user(self.profile, self.drive)
+        self.assertEqual(DriveNode.objects.get(drive_file_id='slides').full_path, 'CTS/Notes/Inner/Week 1/slides.txt')
+        self.assertEqual(self.listing('notes'), ['Inner'] + [f'file{i}.txt' for i in range(5)])
+
+
+class FakeBatchDrive:
+    """Records batch sizes; calls listed in `rate_limited` fail once with a 429."""
+
+    def __init__(self, rate_limited=(), missing=()):
+        self.batches = []
+        self.rate_limited = set(rate_limited)
+        self.missing = set(missing)
+
+    def files(self):
+        return mock.Mock(
+            get=lambda fileId, fields: ('get', fileId),
+            update=lambda fileId, **kwargs: ('update', fileId, kwargs),
+            copy=lambda fileId, body: ('copy', fileId),
+            delete=lambda fileId: ('delete', fileId),
+        )
+
+    def new_batch_http_request(self, callback):
+        drive = self
+        calls = []
+
+        class Batch:
+            def add(self, request, request_id):
+                calls.append((request_id, request))
+
+            def execute(self):
+                drive.batches.append([request for _, request in calls])
+                for request_id, request in calls:
+                    file_id = request[1]
+                    if file_id in drive.missing:
+                        callback(request_id, None, HttpError(httplib2.Response({'status': 404}), b'not found'))
+                    elif file_id in drive.rate_limited:
+                        drive.rate_limited.discard(file_id)
+                        callback(request_id, None, HttpError(httplib2.Response({'status': 429}), b'slow down'))
+                    elif request[0] == 'get':
+                        callback(request_id, {'parents': ['old']}, None)
+                    else:
+                        callback(request_id, {'id': file_id, **request[2]} if request[0] == 'update' else {'id': file_id}, None)
+
+        return Batch()
+
+
+@override_settings(DRIVE_BATCH_RETRIES=2)
+@mock.patch('file.utils.drive_operations.time.sleep', lambda seconds: None)
+class BulkDriveOperationTests(TestCase):
+    def test_move_of_300_files_takes_three_batches_when_source_is_known(self):
+        drive = FakeBatchDrive()
+        ids = [f'f{i}' for i in range(300)]
+        results = bulk_move(drive, ids, 'dest', previous_parent_id='src')
+        self.assertEqual([len(batch) for batch in drive.batches], [100, 100, 100])
+        self.assertTrue(all(item['ok'] for item in results))
+        self.assertEqual(results[0]['result']['removeParents'], 'src')
+
+    def test_parents_are_looked_up_in_batches_and_failures_reported_per_item(self):
+        drive = FakeBatchDrive(rate_limited={'f3'}, missing={'f5'})
+        ids = [f'f{i}' for i in range(150)]
+        results = bulk_move(drive, ids, 'dest')
+        # 2 batches of gets, 1 retry of the rate-limited get, 2 batches of updates
+        self.assertEqual([len(batch) for batch in drive.batches], [100, 50, 1, 100, 49])
+        self.assertEqual([item['file_id'] for item in results if not item['ok']], ['f5'])
+        self.assertEqual(results[3]['result']['removeParents'], 'old')
+        self.assertEqual([item['file_id'] for item in results], ids)
+
+
+class FakeTreeDrive:
+    """Thread-safe in-memory Drive tree; the first `rate_limit` calls answer 429."""
+
+    def __init__(self, rate_limit=0):
+        self.items = {}
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+    def add(self, name, parent=None, folder=False, size=0):
+        with self.lock:
+            self.next_id += 1
+            item_id = f'id{self.next_id}'
+        self.items[item_id] = {
+            'id': item_id, 'name': name, 'parents': [parent] if parent else [],
+            'mimeType': 'application/vnd.google-apps.folder' if folder else 'text/plain', 'size': str(size),
+            'webViewLink': f'https://drive/{item_id}',
+        }
+        return item_id
+
+    def request(self, produce):
+        def execute():
+            with self.lock:
+                if self.rate_limit:
+                    self.rate_limit -= 1
+                    raise HttpError(httplib2.Response({'status': 429}), b'rate limited')
+            return produce()
+        return mock.Mock(execute=execute)
+
+    def files(self):
+        return mock.Mock(
+            get=lambda fileId, fields: self.request(lambda: dict(self.items[fileId])),
+            list=lambda q, pageToken=None, **kwargs: self.request(lambda: self.list(q, pageToken)),
+            create=lambda body, fields: self.request(lambda: {'id': self.add(body['name'], body['parents'][0], folder=True)}),
+            copy=lambda fileId, body, fields: self.request(lambda: {'id': self.add(
+                body['name'], body['parents'][0], size=int(self.items[fileId]['size']))}),
+        )
+
+    def permissions(self):
+        return mock.Mock(create=lambda fileId, body, fields: self.request(lambda: {'id': 'perm'}))
+
+    def list(self, q, page_token):
+        parent = re.search(r"'([^']+)' in parents", q).group(1)
+        children = [dict(i) for i in list(self.items.values()) if parent in i['parents']]
+        start = int(page_token or 0)
+        result = {'files': children[start:start + 3]}
+        if start + 3 < len(children):
+            result['nextPageToken'] = str(start + 3)
+        return result
+
+    def tree(self, folder_id):
+        children = sorted((i for i in self.items.values() if folder_id in i['parents']), key=lambda i: i['name'])
+        return [(i['name'], self.tree(i['id']) if i['mimeType'].endswith('folder') else i['size']) for i in children]
+
+
+@override_settings(DRIVE_USER_RATE=1000, DRIVE_USER_MAX_RATE=1000, DRIVE_JOB_WORKERS=4)
+@mock.patch('file.utils.drive_tree.time.sleep', lambda seconds: None)
+class DriveTreeJobTests(TestCase):
+    def setUp(self):
+        drive_tree._limiters.clear()
+        self.user = User.objects.create(username='teacher')
+        self.drive = FakeTreeDrive()
+        self.course = self.drive.add('Course', folder=True)
+        for week in range(3):
+            folder = self.drive.add(f'Week {week}', self.course, folder=True)
+            for n in range(4):
+                self.drive.add(f'notes{n}.pdf', folder, size=100)
+            self.drive.add('Extra', folder, folder=True)
+        self.drive.add('syllabus.pdf', self.course, size=50)
+        patcher = mock.patch('file.utils.drive_tree.get_user_drive_service', return_value=self.drive)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_job(self, kind, **params):
+        job = DriveJob.objects.create(user=self.user, kind=kind, params=params)
+        drive_jobs.run_job(job.pk)
+        job.refresh_from_db()
+        return job
+
+    def test_folder_size(self):
+        job = self.run_job('folder_size', folder_id=self.course)
+        self.assertEqual(job.status, 'succeeded')
+        self.assertEqual(job.result, {'bytes': 1250, 'files': 13, 'folders': 6})
+        self.assertEqual((job.completed, job.total), (19, 19))
+
+    def test_copy_folder_recreates_tree_despite_rate_limits(self):
+        self.drive.rate_limit = 5
+        target = self.drive.add('Archive', folder=True)
+        job = self.run_job('copy_folder', folder_id=self.course, destination_id=target, name='Course 2026')
+        self.assertEqual(job.status, 'succeeded', job.errors)
+        self.assertEqual(self.drive.tree(target), [('Course 2026', self.drive.tree(self.course))])
+        self.assertEqual((job.result['files'], job.result['folders'], job.failed), (13, 6, 0))
+        self.assertLess(drive_tree.limiter_for(self.user.id).rate, 1000)
+
+    def test_share_folder_records_links_for_every_file(self):
+        job = self.run_job('share_folder', folder_id=self.course, role='reader', email=None)
+        self.assertEqual(job.result['files_shared'], 13)
+        self.assertEqual(ShareLink.objects.filter(created_by=self.user).count(), 14)
+
+    def test_status_endpoint_is_per_user(self):
+        job = DriveJob.objects.create(user=self.user, kind='folder_size', params={})
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(f'/api/files/drive/jobs/{job.pk}/').json()['status'], 'queued')
+        client.force_authenticate(User.objects.create(username='other'))
+        self.assertEqual(client.get(f'/api/files/drive/jobs/{job.pk}/').status_code, 404)
+
+
+@override_settings(DRIVE_JOB_RUNNER='worker', DRIVE_JOB_STALE_AFTER=60, DRIVE_JOB_MAX_ATTEMPTS=2)
+class DriveJobQueueTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='teacher')
+        self.user.profile.google_drive_credentials = {'token': 't'}
+        self.user.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_request_is_queued_and_run_by_worker(self):
+        response = self.client.post('/api/files/drive/bulk/', {
+            'operation': 'move', 'file_ids': ['a', 'b', 'a'], 'destination_id': 'dest', 'source_id': 'src',
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = DriveJob.objects.get(pk=response.json()['job_id'])
+        self.assertEqual((job.kind, job.status, job.params['file_ids']), ('bulk', 'queued', ['a', 'b']))
+
+        drive = FakeBatchDrive()
+        # The worker drops its DB connection between jobs; keep the test transaction's
+        with mock.patch('file.utils.drive_jobs.get_user_drive_service', return_value=drive), \
+                mock.patch('file.management.commands.run_drive_jobs.connection'):
+            call_command('run_drive_jobs', once=True, stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result['succeeded']), ('succeeded', 1, 2))
+        self.assertEqual(len(drive.batches), 1)
+        self.assertEqual(self.client.get('/api/files/drive/jobs/').json()[0]['id'], str(job.pk))
+
+    def test_job_listing_hides_the_staged_upload_path(self):
+        DriveJob.objects.create(
+            user=self.user, kind='upload', total=5 * 2 ** 30,
+            params={'path': '/srv/cts/drive_uploads/abc', 'filename': 'lecture.mp4', 'parent_id': None},
+        )
+        job = self.client.get('/api/files/drive/jobs/').json()[0]
+        self.assertEqual(job['params'], {'filename': 'lecture.mp4', 'parent_id': None})
+        self.assertEqual(job['total'], 5 * 2 ** 30)
+
+    def test_job_is_claimed_once(self):
+        job = DriveJob.objects.create(user=self.user, kind='folder_size', params={'folder_id': 'x'})
+        self.assertEqual(drive_jobs.claim_next('w1'), job.pk)
+        self.assertIsNone(drive_jobs.claim_next('w2'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.claimed_by), ('running', 'w1'))
+
+    def test_stale_jobs_are_requeued_until_attempts_run_out(self):
+        job = DriveJob.objects.create(user=self.user, kind='folder_size', params={'folder_id': 'x'})
+        for expected in ['queued', 'failed']:
+            drive_jobs.claim_next('w1')
+            DriveJob.objects.filter(pk=job.pk).update(heartbeat_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+            drive_jobs.requeue_stale()
+            job.refresh_from_db()
+            self.assertEqual(job.status, expected)
+
+    def test_stale_copies_fail_instead_of_starting_over(self):
+        copies = [
+            DriveJob.objects.create(user=self.user, kind='bulk', params={'operation': 'copy', 'file_ids': ['a']}),
+            DriveJob.objects.create(user=self.user, kind='copy_folder', params={'folder_id': 'x', 'destination_id': 'y'}),
+        ]
+        move = DriveJob.objects.create(user=self.user, kind='bulk', params={'operation': 'move', 'file_ids': ['a']})
+        while drive_jobs.claim_next('w1'):
+            pass
+        DriveJob.objects.update(heartbeat_at=datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+        self.assertEqual(drive_jobs.requeue_stale(), (1, 2))
+        for job in copies:
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'failed')
+            self.assertIn('may already have been copied', job.errors[0])
+        move.refresh_from_db()
+        self.assertEqual(move.status, 'queued')
+
+    def test_bulk_job_heartbeats_after_every_batch(self):
+        file_ids = [f'f{i}' for i in range(250)]
+        job = DriveJob.objects.create(user=self.user, kind='bulk', params={'operation': 'copy', 'file_ids': file_ids})
+        drive_jobs.claim(job.pk, 'w1')
+        long_ago = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        DriveJob.objects.filter(pk=job.pk).update(heartbeat_at=long_ago)
+
+        drive = FakeBatchDrive()
+        seen = []
+        new_batch = drive.new_batch_http_request
+
+        def recording_batch(callback):
+            seen.append(DriveJob.objects.values_list('total', 'completed', 'heartbeat_at').get(pk=job.pk))
+            return new_batch(callback)
+
+        drive.new_batch_http_request = recording_batch
+        with mock.patch('file.utils.drive_jobs.get_user_drive_service', return_value=drive):
+            job = drive_jobs.run_job(job.pk)
+        self.assertEqual([(total, completed) for total, completed, _ in seen], [(250, 0), (250, 100), (250, 200)])
+        self.assertTrue(all(beat > long_ago for _, _, beat in seen[1:]))
+        self.assertEqual((job.status, job.completed, job.attempts), ('succeeded', 250, 1))
+
+    def test_thread_mode_recovers_abandoned_jobs_and_uploads(self):
+        cache.clear()
+        upload_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(DRIVE_JOB_RUNNER='thread', DRIVE_JOB_UPLOAD_DIR=upload_dir))
+        long_ago = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        paths = {}
+        for name in ('orphan', 'pending', 'fresh'):
+            paths[name] = os.path.join(upload_dir, name)
+            open(paths[name], 'wb').close()
+            if name != 'fresh':
+                os.utime(paths[name], (long_ago.timestamp(), long_ago.timestamp()))
+        abandoned = DriveJob.objects.create(user=self.user, kind='upload', params={'path': paths['pending']})
+        recent = DriveJob.objects.create(user=self.user, kind='folder_size', params={'folder_id': 'x'})
+        DriveJob.objects.filter(pk=abandoned.pk).update(created_at=long_ago)
+
+        with mock.patch.object(drive_jobs, 'start_thread') as start_thread:
+            with self.captureOnCommitCallbacks(execute=True):
+                job = drive_jobs.enqueue(self.user, 'folder_size', folder_id='y')
+            drive_jobs.recover_threads()  # throttled: nothing more is started
+        self.assertEqual([c.args[0] for c in start_thread.call_args_list], [job.pk, abandoned.pk])
+        self.assertNotIn(recent.pk, [c.args[0] for c in start_thread.call_args_list])
+        self.assertEqual(sorted(os.listdir(upload_dir)), ['fresh', 'pending'])
+
+
+class SharedFilesCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create(username='alice')
+        self.bob = User.objects.create(username='bob')
+        past = django_timezone.now() - timedelta(days=1)
+        ShareLink.objects.bulk_create([
+            ShareLink(file_id='f1', created_by=self.alice, expires_at=None),
+            ShareLink(file_id='f1', created_by=self.alice, expires_at=django_timezone.now() + timedelta(days=1)),
+            ShareLink(file_id='f2', created_by=self.bob, expires_at=django_timezone.now() + timedelta(days=1)),
+            ShareLink(file_id='f2', created_by=self.bob, expires_at=past),
+            ShareLink(file_id='f3', created_by=self.bob, is_active=False),
+        ])
+
+    def test_counts_only_live_links_with_breakdowns(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='admin', is_staff=True))
+        data = client.get('/api/files/drive/totalShared/', {'breakdown': 'user'}).json()
+        self.assertEqual(data['total_shared_files'], 3)
+        self.assertEqual([(row['created_by__username'], row['count']) for row in data['by_user']], [('alice', 2), ('bob', 1)])
+        data = client.get('/api/files/drive/totalShared/', {'breakdown': 'file', 'limit': 1}).json()
+        self.assertEqual(data['by_file'], [{'file_id': 'f1', 'count': 2}])
+        self.assertEqual(client.get('/api/files/drive/totalShared/', {'breakdown': 'size'}).status_code, 400)
+
+    def test_breakdowns_are_staff_only(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/files/drive/totalShared/').json()['total_shared_files'], 3)
+        for user in (None, self.alice):
+            client.force_authenticate(user)
+            for breakdown in ('user', 'file'):
+                response = client.get('/api/files/drive/totalShared/', {'breakdown': breakdown})
+                self.assertIn(response.status_code, (401, 403))
+                self.assertNotIn(f'by_{breakdown}', response.json())
+
+    def test_counts_are_cached(self):
+        client = APIClient()
+        client.get('/api/files/drive/totalShared/')
+        ShareLink.objects.create(file_id='f4', created_by=self.alice)
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/api/files/drive/totalShared/').json()['total_shared_files'], 3)
@@ -16,6 +16,12 @@ urlpatterns = [
     path('drive/upload', views_drive.upload_to_drive, name='drive_upload'),
     path('drive/folder', views_drive.create_drive_folder, name='drive_create_folder'),
     path('drive/move/', views_drive.move_drive_file, name='drive_move_file'),
+    path('drive/bulk/', views_drive.bulk_drive_operation, name='drive_bulk_operation'),
+    path('drive/jobs/', views_drive.list_drive_jobs, name='list_drive_jobs'),
+    path('drive/jobs/<uuid:job_id>/', views_drive.drive_job_status, name='drive_job_status'),
+    path('drive/<str:file_id>/copy-tree/', views_drive.copy_drive_folder, name='drive_copy_folder'),
+    path('drive/<str:file_id>/share-tree/', views_drive.share_drive_folder, name='drive_share_folder'),
+    path('drive/<str:file_id>/size/', views_drive.drive_folder_size, name='drive_folder_size'),
     path('drive/<str:file_id>/rename/', views_drive.rename_drive_file, name='drive_rename'),
     path('drive/<str:file_id>/download/', views_drive.download_drive_file, name='drive_download'),
     path('drive/<str:file_id>/', views_drive.delete_drive_file, name='drive_delete'),
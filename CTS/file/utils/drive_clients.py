@@ -0,0 +1,135 @@
+"""
+Per-user Google Drive clients, cached between requests.
+
+Building a client used to mean a discovery fetch, new Credentials and a new
+HTTP connection on every request, plus a token refresh whenever the stored
+token had expired. Here:
+
+- the Drive v3 discovery document is loaded once per process (from the copy
+  bundled with google-api-python-client >= 2, from GOOGLE_DRIVE_DISCOVERY_FILE,
+  or fetched once) and every client is built from it;
+- each user's Credentials live in an LRU cache with a TTL, so a refresh happens
+  once per token expiry and the new token is written back to
+  UserProfile.google_drive_credentials for the other workers;
+- each thread keeps its own httplib2 connection per user (httplib2 is not
+  thread-safe), which stays open across requests.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import httplib2
+import requests
+from django.conf import settings
+from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import DISCOVERY_URI, build_from_document
+
+from user.models import UserProfile
+from user.utils.google_auth import credentials_from_dict, credentials_to_dict
+
+# Token refreshes go through one pooled session instead of a new connection each
+_refresh_session = requests.Session()
+
+
+@lru_cache(maxsize=None)
+def drive_discovery_document():
+    path = getattr(settings, 'GOOGLE_DRIVE_DISCOVERY_FILE', None)
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+    except ImportError:
+        get_static_doc = None
+    if get_static_doc:
+        document = get_static_doc('drive', 'v3')
+        if document:
+            return document
+
+    response = _refresh_session.get(DISCOVERY_URI.format(api='drive', apiVersion='v3'), timeout=30)
+    response.raise_for_status()
+    return response.text
+
+
+class _UserClient:
+    def __init__(self, credentials, refresh_token):
+        self.credentials = credentials
+        self.refresh_token = refresh_token
+        # Last token this process saw stored, so only our own refreshes are written back
+        self.saved_token = credentials.token
+        self.created = time.monotonic()
+        self.refresh_lock = threading.Lock()
+        self.local = threading.local()
+
+
+class DriveClientCache:
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, profile):
+        stored = profile.google_drive_credentials or {}
+        refresh_token = stored.get('refresh_token')
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._clients.get(profile.user_id)
+            # A reconnect elsewhere swaps the refresh token; rebuild from the profile then
+            if entry and (now - entry.created > self.ttl or entry.refresh_token != refresh_token):
+                del self._clients[profile.user_id]
+                entry = None
+            if entry is None:
+                entry = _UserClient(credentials_from_dict(stored), refresh_token)
+                self._clients[profile.user_id] = entry
+                while len(self._clients) > self.max_size:
+                    self._clients.popitem(last=False)
+            self._clients.move_to_end(profile.user_id)
+        return entry
+
+    def get(self, profile):
+        """Returns a Drive v3 service for `profile`'s stored credentials."""
+        entry = self._entry(profile)
+        credentials = entry.credentials
+
+        with entry.refresh_lock:
+            if not credentials.valid and credentials.refresh_token:
+                credentials.refresh(Request(_refresh_session))
+            # Also catches refreshes AuthorizedHttp did on a 401 during an earlier call
+            if credentials.token != entry.saved_token:
+                save_refreshed_token(profile, credentials)
+                entry.saved_token = credentials.token
+
+        service = getattr(entry.local, 'service', None)
+        if service is None:
+            http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=settings.GOOGLE_DRIVE_HTTP_TIMEOUT))
+            service = build_from_document(drive_discovery_document(), http=http)
+            entry.local.service = service
+        return service
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._clients.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+
+def save_refreshed_token(profile, credentials):
+    stored = profile.google_drive_credentials or {}
+    refreshed = {**stored, **credentials_to_dict(credentials)}
+    profile.google_drive_credentials = refreshed
+    UserProfile.objects.filter(pk=profile.pk).update(google_drive_credentials=refreshed)
+
+
+drive_clients = DriveClientCache(settings.DRIVE_CLIENT_CACHE_SIZE, settings.DRIVE_CLIENT_CACHE_TTL)
+
+
+def get_user_drive_service(profile):
+    return drive_clients.get(profile)
@@ -0,0 +1,228 @@
+"""
+Background jobs for slow Drive operations.
+
+Views create a DriveJob row and answer 202 with its id; the row is the queue.
+With DRIVE_JOB_RUNNER = 'worker' the `run_drive_jobs` command claims and runs
+queued jobs, so request workers only pay for one INSERT. With 'thread' (the
+default, handy in development) the job runs on a thread of the web process
+once the request's transaction commits.
+
+Claiming is a conditional UPDATE on the status column, so several workers can
+poll the same table without row locks. A job whose heartbeat stops (worker
+killed mid-job) is queued again, up to DRIVE_JOB_MAX_ATTEMPTS tries, unless
+running it again from the start would create duplicate copies; those fail.
+In 'thread' mode, where no worker loop watches the table, enqueue() does the
+same recovery now and then and also restarts jobs whose process died before
+they were claimed.
+"""
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from file.models import DriveJob
+from .drive_clients import get_user_drive_service
+from .drive_operations import bulk_copy, bulk_delete, bulk_move, bulk_rename, stream_upload
+from .drive_sync import mark_stale
+from .drive_tree import OPERATIONS as TREE_OPERATIONS, TreeJob
+
+# Jobs after which the DriveNode mirror must pull the changes feed again
+CHANGES_DRIVE = {'upload', 'bulk', 'copy_folder'}
+# Jobs that create Drive files; a rerun after a partial run would copy them twice
+NOT_REPEATABLE = Q(kind='copy_folder') | Q(kind='bulk', params__operation='copy')
+
+
+def stage_upload(uploaded_file):
+    """
+    Keeps an uploaded file on disk for the job that sends it to Drive. Django
+    deletes its own temp file when the request ends, so that one is hard
+    linked into place (copied only across filesystems); small in-memory
+    uploads are written out chunk by chunk.
+    """
+    os.makedirs(settings.DRIVE_JOB_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(settings.DRIVE_JOB_UPLOAD_DIR, uuid.uuid4().hex)
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        uploaded_file.file.flush()
+        try:
+            os.link(uploaded_file.temporary_file_path(), path)
+        except OSError:
+            shutil.copyfile(uploaded_file.temporary_file_path(), path)
+    else:
+        with open(path, 'wb') as staged:
+            for chunk in uploaded_file.chunks():
+                staged.write(chunk)
+    return path
+
+
+def run_upload(job, profile, path, filename, parent_id=None, mime_type=None):
+    service = get_user_drive_service(profile)
+
+    # Verify parent folder exists and is accessible
+    try:
+        service.files().get(fileId=parent_id, fields="id").execute()
+    except Exception:
+        # Fallback to CTS root folder if specified folder is inaccessible
+        parent_id = profile.google_drive_folder_id
+
+    def progress(sent):
+        DriveJob.objects.filter(pk=job.pk).update(completed=sent, heartbeat_at=timezone.now())
+
+    DriveJob.objects.filter(pk=job.pk).update(total=os.path.getsize(path))
+    with open(path, 'rb') as staged:
+        uploaded = stream_upload(service, staged, filename, parent_id, mime_type, progress=progress)
+    DriveJob.objects.filter(pk=job.pk).update(completed=F('total'))
+    return {"file_id": uploaded['id'], "parent_id": parent_id}
+
+
+def run_bulk(job, profile, operation, file_ids=None, destination_id=None, source_id=None, names=None):
+    service = get_user_drive_service(profile)
+
+    def progress(done):
+        DriveJob.objects.filter(pk=job.pk).update(completed=done, heartbeat_at=timezone.now())
+
+    DriveJob.objects.filter(pk=job.pk).update(total=len(names or file_ids))
+    if operation == 'move':
+        results = bulk_move(service, file_ids, destination_id, source_id, progress=progress)
+    elif operation == 'copy':
+        results = bulk_copy(service, file_ids, destination_id, progress=progress)
+    elif operation == 'rename':
+        results = bulk_rename(service, names, progress=progress)
+    else:
+        results = bulk_delete(service, file_ids, progress=progress)
+
+    succeeded = sum(1 for item in results if item['ok'])
+    DriveJob.objects.filter(pk=job.pk).update(total=len(results), completed=succeeded, failed=len(results) - succeeded)
+    return {"operation": operation, "succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+
+def run_job(job_id):
+    """Runs a claimed DriveJob to completion, recording its result or error."""
+    job = DriveJob.objects.select_related('user__profile').get(pk=job_id)
+    profile = job.user.profile
+    DriveJob.objects.filter(pk=job.pk).update(started_at=timezone.now())
+
+    tree = None
+    try:
+        if job.kind in TREE_OPERATIONS:
+            tree = TreeJob(job, profile)
+            result = TREE_OPERATIONS[job.kind](tree, **job.params)
+        elif job.kind == 'upload':
+            result = run_upload(job, profile, **job.params)
+        else:
+            result = run_bulk(job, profile, **job.params)
+    except Exception as e:
+        errors = [*(tree.errors if tree else []), str(e)]
+        DriveJob.objects.filter(pk=job.pk).update(status='failed', errors=errors, finished_at=timezone.now())
+    else:
+        DriveJob.objects.filter(pk=job.pk).update(status='succeeded', result=result, finished_at=timezone.now())
+    finally:
+        if job.kind in CHANGES_DRIVE:
+            mark_stale(job.user)
+        if job.kind == 'upload' and os.path.exists(job.params['path']):
+            os.remove(job.params['path'])
+    return DriveJob.objects.get(pk=job.pk)
+
+
+def start_thread(job_id):
+    """Runs a queued job on a thread of this process, if nobody claims it first."""
+    def work():
+        try:
+            if claim(job_id, f'thread:{os.getpid()}'):
+                run_job(job_id)
+        finally:
+            connection.close()
+
+    threading.Thread(target=work, name=f'drive-job-{job_id}', daemon=True).start()
+
+
+def enqueue(user, kind, **params):
+    """Queues a Drive job; in 'thread' mode it also starts running after commit."""
+    job = DriveJob.objects.create(user=user, kind=kind, params=params)
+
+    if settings.DRIVE_JOB_RUNNER == 'thread':
+        transaction.on_commit(lambda: start_thread(job.pk))
+        transaction.on_commit(recover_threads)
+    return job
+
+
+def claim(job_id, worker):
+    """Takes a queued job for `worker`; False if someone else got it first."""
+    return bool(DriveJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', claimed_by=worker, attempts=F('attempts') + 1, heartbeat_at=timezone.now(),
+    ))
+
+
+def claim_next(worker):
+    """The oldest queued job, claimed for `worker`, or None when the queue is empty."""
+    for job_id in DriveJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)[:10]:
+        if claim(job_id, worker):
+            return job_id
+    return None
+
+
+def requeue_stale():
+    """
+    Puts back jobs whose worker stopped sending heartbeats; gives up after
+    DRIVE_JOB_MAX_ATTEMPTS, or at once for jobs that aren't safe to repeat.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.DRIVE_JOB_STALE_AFTER)
+    stale = DriveJob.objects.filter(status='running', heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=settings.DRIVE_JOB_MAX_ATTEMPTS).update(
+        status='failed', errors=['The worker running this job stopped responding.'], finished_at=timezone.now(),
+    )
+    failed += stale.filter(NOT_REPEATABLE).update(
+        status='failed', finished_at=timezone.now(), errors=[
+            'The worker running this job stopped responding. Some items may already have been copied, '
+            'so the job was not started again; check the destination before retrying.',
+        ],
+    )
+    requeued = stale.update(status='queued', claimed_by='')
+    return requeued, failed
+
+
+def clean_staged_uploads():
+    """Removes staged uploads that no queued or running job will send any more."""
+    directory = settings.DRIVE_JOB_UPLOAD_DIR
+    if not os.path.isdir(directory):
+        return 0
+    pending = {
+        job.params.get('path')
+        for job in DriveJob.objects.filter(kind='upload', status__in=['queued', 'running']).only('params')
+    }
+    # Younger files may belong to a request that hasn't created its job yet
+    cutoff = time.time() - settings.DRIVE_JOB_STALE_AFTER
+    removed = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.path not in pending and entry.stat().st_mtime < cutoff:
+            os.remove(entry.path)
+            removed += 1
+    return removed
+
+
+def recover_threads():
+    """
+    'thread' mode's stand-in for the worker loop, run at most once every
+    DRIVE_JOB_STALE_AFTER seconds: requeues stale jobs, restarts jobs queued
+    for that long (the process that should have run them is gone) and cleans
+    up their staged uploads.
+    """
+    if not cache.add('drive_jobs:recovery', 1, settings.DRIVE_JOB_STALE_AFTER):
+        return
+    requeue_stale()
+    cutoff = timezone.now() - timedelta(seconds=settings.DRIVE_JOB_STALE_AFTER)
+    for job_id in DriveJob.objects.filter(status='queued', created_at__lt=cutoff).values_list('pk', flat=True):
+        start_thread(job_id)
+    clean_staged_uploads()
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
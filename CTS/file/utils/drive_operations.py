@@ -1,15 +1,20 @@
 import os
 import sys
-from io import BytesIO
+import time
+import socket
 import mimetypes
 import django
+import httplib2
 import requests
-from googleapiclient.discovery import build
+from django.conf import settings
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseUpload
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import AuthorizedSession, Request
 from google.oauth2.credentials import Credentials
 from dotenv import load_dotenv
 from file.models import ShareLink, DriveNode
+from .drive_clients import drive_discovery_document
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,7 +25,11 @@ django.setup()
 
 
 def get_drive_service(credentials_dict):
-    """Get a Google Drive service instance from credentials."""
+    """
+    Get a Google Drive service instance from credentials.
+
+    Uncached; request handlers use drive_clients.get_user_drive_service(profile).
+    """
 
     GOOGLE_OAUTH2_CLIENT_ID = os.getenv("GOOGLE_OAUTH2_CLIENT_ID")
     GOOGLE_OAUTH2_CLIENT_SECRET = os.getenv("GOOGLE_OAUTH2_CLIENT_SECRET")
@@ -41,25 +50,37 @@ def get_drive_service(credentials_dict):
     if not credentials.valid and credentials.expired and credentials.refresh_token:
         credentials.refresh(Request())
 
-    return build('drive', 'v3', credentials=credentials)
+    return build_from_document(drive_discovery_document(), credentials=credentials)
+
+
+FILE_FIELDS = "id, name, mimeType, size, modifiedTime, parents, webViewLink, iconLink, thumbnailLink"
+
 
+def iter_files(service, query, fields=FILE_FIELDS, order_by=None, page_size=1000):
+    """Yield every file matching `query`, following nextPageToken across pages."""
+    page_token = None
+    while True:
+        params = dict(q=query, pageSize=page_size, fields=f"nextPageToken, files({fields})")
+        if order_by:
+            params['orderBy'] = order_by
+        if page_token:
+            params['pageToken'] = page_token
+        results = service.files().list(**params).execute()
+        yield from results.get('files', [])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
 
-def list_files(service, folder_id=None, page_size=100):
-    """List files in a specific folder or root."""
+
+def list_files(service, folder_id=None, page_size=1000):
+    """List every file in a specific folder or root."""
     try:
         query_parts = ["trashed = false"]
         if folder_id:
             query_parts.append(f"'{folder_id}' in parents")
         query = " and ".join(query_parts)
 
-        results = service.files().list(
-            q=query,
-            pageSize=page_size,
-            fields="files(id, name, mimeType, size, modifiedTime, parents, webViewLink, iconLink, thumbnailLink)",
-            orderBy="folder,name"
-        ).execute()
-
-        return results.get('files', [])
+        return list(iter_files(service, query, order_by="folder,name", page_size=page_size))
     except Exception as e:
         raise Exception(f"Failed to list files: {str(e)}")
 
@@ -77,28 +98,141 @@ def create_folder(service, name, parent_id=None):
         raise Exception(f"Failed to create folder: {str(e)}")
 
 
-def upload_file(service, file_obj, filename, parent_id=None):
-    """Upload a file to Google Drive."""
-    mime_type, _ = mimetypes.guess_type(filename)
+def upload_chunk_size():
+    """DRIVE_UPLOAD_CHUNK_SIZE rounded to the 256 KiB multiple Drive requires."""
+    quantum = 256 * 1024
+    return max(quantum, settings.DRIVE_UPLOAD_CHUNK_SIZE // quantum * quantum)
+
+
+def run_resumable_upload(request, progress=None):
+    """
+    Sends a resumable upload one chunk at a time.
+
+    A dropped connection or a failed chunk doesn't restart the upload: the
+    request remembers its session, asks Drive how much it already has and
+    carries on from there, up to DRIVE_UPLOAD_MAX_RESUMES times in a row.
+    """
+    response = None
+    failures = 0
+    while response is None:
+        try:
+            status, response = request.next_chunk(num_retries=3)
+            failures = 0
+            if status and progress:
+                progress(status.resumable_progress)
+        except (HttpError, httplib2.HttpLib2Error, socket.error) as e:
+            status_code = getattr(getattr(e, 'resp', None), 'status', None)
+            if status_code is not None and status_code < 500 and status_code not in (408, 429):
+                raise
+            failures += 1
+            if failures > settings.DRIVE_UPLOAD_MAX_RESUMES:
+                raise
+            time.sleep(min(2 ** failures, 30))
+    return response
+
+
+def stream_upload(service, file_obj, filename, parent_id=None, mime_type=None, fields='id', progress=None):
+    """
+    Upload a file-like object to Google Drive without reading it into memory.
+
+    `file_obj` only needs read/seek (a Django UploadedFile works as is: small
+    ones sit in memory, larger ones are spooled to disk by Django), and each
+    request body is a chunk_size slice of it.
+    """
+    if not mime_type:
+        mime_type, _ = mimetypes.guess_type(filename)
     mime_type = mime_type or 'application/octet-stream'
 
     file_metadata = {'name': filename}
     if parent_id:
         file_metadata['parents'] = [parent_id]
 
+    file_obj.seek(0)
+    media = MediaIoBaseUpload(file_obj, mimetype=mime_type, chunksize=upload_chunk_size(), resumable=True)
+    request = service.files().create(body=file_metadata, media_body=media, fields=fields)
+    return run_resumable_upload(request, progress)
+
+
+def upload_file(service, file_obj, filename, parent_id=None):
+    """Upload a file to Google Drive."""
     try:
-        media = MediaIoBaseUpload(BytesIO(file_obj.read()), mimetype=mime_type, resumable=True)
-        file = service.files().create(body=file_metadata, media_body=media, fields='id').execute()
+        file = stream_upload(service, file_obj, filename, parent_id)
         return file.get('id')
     except Exception as e:
         raise Exception(f"Failed to upload file: {str(e)}")
 
 
-def move_file(service, file_id, new_parent_id):
-    """Move a file to a different folder."""
+def _get_range(session, uri, headers):
+    """One ranged GET with the body left unread, retried on network errors and 5xx."""
+    for attempt in range(settings.DRIVE_DOWNLOAD_RETRIES + 1):
+        try:
+            resp = session.get(uri, headers=headers, stream=True, timeout=settings.GOOGLE_DRIVE_HTTP_TIMEOUT)
+        except (requests.RequestException, socket.error):
+            if attempt == settings.DRIVE_DOWNLOAD_RETRIES:
+                raise
+        else:
+            if resp.status_code < 500 or attempt == settings.DRIVE_DOWNLOAD_RETRIES:
+                return resp
+            resp.close()
+        time.sleep(min(2 ** attempt, 10))
+
+
+def _slice_stream(chunks, start, end):
+    """The bytes of `chunks` from offset `start` to `end` (inclusive, None for all)."""
+    offset = 0
+    for chunk in chunks:
+        low, high = max(start - offset, 0), len(chunk) if end is None else min(end + 1 - offset, len(chunk))
+        offset += len(chunk)
+        if low < high:
+            yield chunk[low:high]
+        if end is not None and offset > end:
+            return
+
+
+def iter_file_chunks(service, file_id, start=0, end=None, chunk_size=None):
+    """
+    Yield the bytes of a Drive file from `start` to `end` (inclusive) in ranged
+    GETs of at most `chunk_size` bytes, so only one chunk is held at a time.
+
+    The GETs go through a streaming session (httplib2 reads whole bodies), so
+    if Drive ignores the range and answers 200 with the whole file, that body
+    is read chunk by chunk too and only the wanted bytes are passed on.
+    """
+    chunk_size = chunk_size or settings.DRIVE_DOWNLOAD_CHUNK_SIZE
+    media = service.files().get_media(fileId=file_id)
+    position = start
+    with AuthorizedSession(media.http.credentials) as session:
+        while end is None or position <= end:
+            last = position + chunk_size - 1
+            if end is not None:
+                last = min(last, end)
+            headers = {**media.headers, 'range': f'bytes={position}-{last}'}
+
+            with _get_range(session, media.uri, headers) as resp:
+                if resp.status_code == 416:
+                    return
+                if resp.status_code == 200:
+                    # The range was ignored and this is the whole file
+                    yield from _slice_stream(resp.iter_content(chunk_size), position, end)
+                    return
+                if resp.status_code != 206:
+                    raise HttpError(httplib2.Response({'status': resp.status_code}), resp.content, uri=media.uri)
+                content = resp.content
+            if content:
+                yield content
+            if len(content) < last - position + 1:
+                return
+            position += len(content)
+
+
+def move_file(service, file_id, new_parent_id, previous_parent_id=None):
+    """Move a file to a different folder (one call when the current folder is known)."""
     try:
-        file = service.files().get(fileId=file_id, fields='parents').execute()
-        previous_parents = ",".join(file.get('parents', []))
+        if previous_parent_id:
+            previous_parents = previous_parent_id
+        else:
+            file = service.files().get(fileId=file_id, fields='parents').execute()
+            previous_parents = ",".join(file.get('parents', []))
         updated = service.files().update(
             fileId=file_id,
             addParents=new_parent_id,
@@ -138,6 +272,117 @@ def delete_file(service, file_id):
         raise Exception(f"Failed to delete file: {str(e)}")
 
 
+# Drive accepts at most 100 calls in one batch request
+DRIVE_BATCH_LIMIT = 100
+
+
+def is_retryable(error):
+    """Rate limits (429, or 403 with a rateLimitExceeded reason) and server errors."""
+    status_code = getattr(getattr(error, 'resp', None), 'status', None)
+    if status_code == 403:
+        return b'ratelimitexceeded' in (getattr(error, 'content', b'') or b'').lower()
+    return status_code in (429, 500, 502, 503, 504)
+
+
+def run_batch(service, calls, progress=None):
+    """
+    Send `calls` ({key: HttpRequest}) as Drive batch requests of up to 100.
+
+    Returns {key: (result, error)} with error None on success. Calls that were
+    rate limited or hit a server error go into one more batch after a pause,
+    up to DRIVE_BATCH_RETRIES times. `progress(done)` is called after every
+    batch with the number of calls settled so far.
+    """
+    results = {}
+    pending = dict(calls)
+    for attempt in range(settings.DRIVE_BATCH_RETRIES + 1):
+        retry = {}
+        keys = list(pending)
+        for start in range(0, len(keys), DRIVE_BATCH_LIMIT):
+            chunk = {str(i): key for i, key in enumerate(keys[start:start + DRIVE_BATCH_LIMIT])}
+
+            def collect(request_id, response, exception, chunk=chunk):
+                key = chunk[request_id]
+                if exception is not None and is_retryable(exception) and attempt < settings.DRIVE_BATCH_RETRIES:
+                    retry[key] = pending[key]
+                else:
+                    results[key] = (response, exception)
+
+            batch = service.new_batch_http_request(callback=collect)
+            for request_id, key in chunk.items():
+                batch.add(pending[key], request_id=request_id)
+            batch.execute()
+            if progress:
+                progress(len(results))
+        if not retry:
+            break
+        # Batched calls share the caller's quota; back off before trying the leftovers
+        time.sleep(min(2 ** attempt, 10))
+        pending = retry
+    return results
+
+
+def batch_results(results, file_ids):
+    """Per-item outcome list, in the order the ids were given."""
+    items = []
+    for file_id in file_ids:
+        result, error = results.get(file_id, (None, Exception("Not attempted")))
+        if error is None:
+            items.append({"file_id": file_id, "ok": True, "result": result})
+        else:
+            items.append({"file_id": file_id, "ok": False, "error": str(error)})
+    return items
+
+
+def bulk_move(service, file_ids, new_parent_id, previous_parent_id=None, progress=None):
+    """
+    Move many files: one batched get of their parents (skipped when the caller
+    says which folder they are in) and one batched update.
+    """
+    previous = {file_id: previous_parent_id for file_id in file_ids}
+    failed = {}
+    if not previous_parent_id:
+        # Looking up parents moves nothing yet, so it only reports signs of life
+        parents = run_batch(service, {
+            file_id: service.files().get(fileId=file_id, fields='parents') for file_id in file_ids
+        }, progress and (lambda done: progress(0)))
+        for file_id, (result, error) in parents.items():
+            if error is None:
+                previous[file_id] = ",".join(result.get('parents', []))
+            else:
+                failed[file_id] = (None, error)
+
+    results = run_batch(service, {
+        file_id: service.files().update(
+            fileId=file_id, addParents=new_parent_id, removeParents=previous[file_id], fields='id, parents'
+        )
+        for file_id in file_ids if file_id not in failed
+    }, progress and (lambda done: progress(done + len(failed))))
+    return batch_results({**results, **failed}, file_ids)
+
+
+def bulk_copy(service, file_ids, new_parent_id=None, progress=None):
+    body = {'parents': [new_parent_id]} if new_parent_id else {}
+    results = run_batch(
+        service, {file_id: service.files().copy(fileId=file_id, body=body) for file_id in file_ids}, progress,
+    )
+    return batch_results(results, file_ids)
+
+
+def bulk_rename(service, names, progress=None):
+    """`names` maps file id -> new name."""
+    results = run_batch(service, {
+        file_id: service.files().update(fileId=file_id, body={'name': name}, fields='id, name')
+        for file_id, name in names.items()
+    }, progress)
+    return batch_results(results, list(names))
+
+
+def bulk_delete(service, file_ids, progress=None):
+    results = run_batch(service, {file_id: service.files().delete(fileId=file_id) for file_id in file_ids}, progress)
+    return batch_results(results, file_ids)
+
+
 def make_file_shareable(service, file_id, user=None, anyone=True, email=None, role="reader"):
     """Make a Google Drive file shareable and record in DB."""
     if not anyone and not email:
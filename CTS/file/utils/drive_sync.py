@@ -0,0 +1,297 @@
+"""
+Mirrors each user's CTS Drive folder into DriveNode rows.
+
+A full sync walks the folder tree level by level, fetching each level with
+paginated files().list calls over up to FOLDER_BATCH parent folders at once,
+then writes it with bulk inserts. The Drive changes feed position is recorded
+before the walk starts, so later syncs only replay changes().list from that
+token. Folder listings can then come from the mirror in one query.
+
+Mirrored rows are flagged `mirrored` and share nothing with the nodes of the
+/nodes/ API, so a sync only ever creates, updates or deletes its own rows.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from googleapiclient.errors import HttpError
+
+from file.models import DriveNode, DriveSyncState
+from .drive_clients import get_user_drive_service
+from .drive_operations import iter_files
+
+logger = logging.getLogger(__name__)
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+SYNC_FIELDS = "id, name, mimeType, size, modifiedTime, parents, webViewLink, trashed"
+# Parent folders OR-ed into one files().list query during a full sync
+FOLDER_BATCH = 40
+METADATA_FIELDS = ['name', 'is_folder', 'mime_type', 'size', 'web_view_link', 'drive_modified_at']
+
+
+def node_values(item):
+    return {
+        'name': item['name'],
+        'is_folder': item['mimeType'] == FOLDER_MIME_TYPE,
+        'mime_type': item['mimeType'],
+        'size': int(item['size']) if item.get('size') else None,
+        'web_view_link': item.get('webViewLink'),
+        'drive_modified_at': parse_datetime(item['modifiedTime']) if item.get('modifiedTime') else None,
+    }
+
+
+def node_as_drive_file(node, parent_id):
+    """A mirrored node in the shape files().list returns it."""
+    return {
+        'id': node.drive_file_id,
+        'name': node.name,
+        'mimeType': node.mime_type,
+        'size': str(node.size) if node.size is not None else None,
+        'modifiedTime': node.drive_modified_at.isoformat().replace('+00:00', 'Z') if node.drive_modified_at else None,
+        'parents': [parent_id],
+        'webViewLink': node.web_view_link,
+    }
+
+
+class DriveMirror:
+    def __init__(self, user, service, root_folder_id):
+        self.user = user
+        self.service = service
+        self.root_folder_id = root_folder_id
+
+    def nodes(self):
+        return DriveNode.objects.mirrored().filter(owner=self.user)
+
+    def parent_of(self, item, known):
+        if item['id'] == self.root_folder_id:
+            return None
+        return next((known[p] for p in item.get('parents', []) if p in known), None)
+
+    def upsert(self, items, known):
+        """
+        Writes one batch of Drive items whose parents are already mirrored.
+
+        New items are bulk inserted with their tree path worked out from the
+        parent. Renamed or moved items go through save(), which also rewrites
+        their subtree. Anything else that changed is bulk updated. Returns the
+        mirrored nodes keyed by Drive id.
+        """
+        existing = {n.drive_file_id: n for n in self.nodes().filter(drive_file_id__in=[i['id'] for i in items])}
+        created, changed = [], []
+
+        for item in items:
+            parent = self.parent_of(item, known)
+            values = node_values(item)
+            node = existing.get(item['id'])
+            if node is None:
+                node = DriveNode(owner=self.user, drive_file_id=item['id'], parent=parent, mirrored=True, **values)
+                if parent:
+                    node.tree_path = f"{parent.tree_path}{parent.pk}/"
+                    node.full_path = f"{parent.full_path}/{node.name}"
+                    node.depth = parent.depth + 1
+                else:
+                    node.tree_path, node.full_path, node.depth = '/', node.name, 0
+                created.append(node)
+            elif node.name != values['name'] or node.parent_id != (parent.pk if parent else None):
+                for field, value in values.items():
+                    setattr(node, field, value)
+                node.parent = parent
+                node.save()
+            elif any(getattr(node, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(node, field, value)
+                changed.append(node)
+
+        if created:
+            DriveNode.objects.bulk_create(created, batch_size=500, ignore_conflicts=True)
+            # Re-read to get primary keys on backends that don't return them from bulk inserts
+            existing.update(
+                (n.drive_file_id, n) for n in self.nodes().filter(drive_file_id__in=[n.drive_file_id for n in created])
+            )
+        if changed:
+            DriveNode.objects.bulk_update(changed, METADATA_FIELDS, batch_size=500)
+        return {item['id']: existing[item['id']] for item in items if item['id'] in existing}
+
+    def walk(self, folder_ids, seen):
+        """Yield the levels of items below `folder_ids`, skipping anything in `seen`."""
+        frontier = list(folder_ids)
+        while frontier:
+            level = {}
+            for start in range(0, len(frontier), FOLDER_BATCH):
+                parents = " or ".join(f"'{folder_id}' in parents" for folder_id in frontier[start:start + FOLDER_BATCH])
+                for item in iter_files(self.service, f"trashed = false and ({parents})", SYNC_FIELDS):
+                    if item['id'] not in seen:
+                        level[item['id']] = item
+            seen.update(level)
+            if level:
+                yield list(level.values())
+            frontier = [item_id for item_id, item in level.items() if item['mimeType'] == FOLDER_MIME_TYPE]
+
+    def full_sync(self):
+        # Taken before the walk, so nothing that changes during it is missed
+        page_token = self.service.changes().getStartPageToken().execute()['startPageToken']
+        root = self.service.files().get(fileId=self.root_folder_id, fields=SYNC_FIELDS).execute()
+        levels = [[root], *self.walk([root['id']], {root['id']})]
+
+        with transaction.atomic():
+            known = {}
+            for level in levels:
+                for start in range(0, len(level), 500):
+                    known.update(self.upsert(level[start:start + 500], known))
+
+            stale = set(self.nodes().exclude(drive_file_id=None).values_list('drive_file_id', flat=True)) - set(known)
+            if stale:
+                self.nodes().filter(drive_file_id__in=list(stale)).delete()
+
+            now = timezone.now()
+            self.save_state(page_token=page_token, last_full_sync=now, last_synced_at=now)
+        return len(known)
+
+    def apply_changes(self, page_token):
+        """Replays the changes feed from `page_token`; returns the number of changes seen."""
+        latest = {}
+        while True:
+            response = self.service.changes().list(
+                pageToken=page_token,
+                pageSize=1000,
+                spaces='drive',
+                includeRemoved=True,
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({SYNC_FIELDS}))",
+            ).execute()
+            for change in response.get('changes', []):
+                # Only the last change of each file matters
+                latest.pop(change['fileId'], None)
+                latest[change['fileId']] = change
+            if 'newStartPageToken' in response:
+                page_token = response['newStartPageToken']
+                break
+            page_token = response['nextPageToken']
+
+        gone = {file_id for file_id, change in latest.items()
+                if change.get('removed') or change.get('file', {}).get('trashed')}
+        pending = {file_id: change['file'] for file_id, change in latest.items() if file_id not in gone and 'file' in change}
+
+        # A folder moved in from elsewhere in the Drive brings children that have no changes of their own
+        mirrored = set(self.nodes().filter(drive_file_id__in=list(pending)).values_list('drive_file_id', flat=True))
+        parent_ids = {p for item in pending.values() for p in item.get('parents', [])}
+        known = {n.drive_file_id: n for n in self.nodes().filter(drive_file_id__in=list(parent_ids))}
+        arrived = [
+            file_id for file_id, item in pending.items()
+            if item['mimeType'] == FOLDER_MIME_TYPE and file_id not in mirrored
+            and any(p in known or p in pending for p in item.get('parents', []))
+        ]
+        for level in self.walk(arrived, set(pending)):
+            pending.update((item['id'], item) for item in level)
+        pending = list(pending.values())
+
+        with transaction.atomic():
+            # A child can come before its new parent folder in the feed
+            while pending:
+                ready = [i for i in pending if i['id'] == self.root_folder_id or self.parent_of(i, known)]
+                if not ready:
+                    break
+                known.update(self.upsert(ready, known))
+                done = {i['id'] for i in ready}
+                pending = [i for i in pending if i['id'] not in done]
+
+            # Whatever is left now lives outside the CTS folder
+            gone.update(item['id'] for item in pending)
+            if gone:
+                self.nodes().filter(drive_file_id__in=list(gone)).delete()
+
+            self.save_state(page_token=page_token, last_synced_at=timezone.now())
+        return len(latest)
+
+    def save_state(self, **fields):
+        DriveSyncState.objects.update_or_create(
+            user=self.user, defaults={'root_folder_id': self.root_folder_id, **fields},
+        )
+
+
+def sync_user(profile, service, full=False):
+    """
+    Brings `profile`'s mirror up to date: a full sync the first time, when the
+    root folder changed or when asked, otherwise just the pending changes.
+    Returns None when another sync for this user is already running.
+    """
+    lock_key = f'drive_sync:{profile.user_id}:lock'
+    if not cache.add(lock_key, 1, settings.DRIVE_SYNC_LOCK_TIMEOUT):
+        return None
+    try:
+        root_folder_id = profile.google_drive_folder_id
+        mirror = DriveMirror(profile.user, service, root_folder_id)
+        state = DriveSyncState.objects.filter(user_id=profile.user_id).first()
+        if full or not state or not state.page_token or state.root_folder_id != root_folder_id:
+            return mirror.full_sync()
+        try:
+            return mirror.apply_changes(state.page_token)
+        except HttpError as e:
+            # An expired or unknown page token means starting over
+            if e.resp.status not in (400, 404, 410):
+                raise
+            logger.warning("Drive changes token rejected for user %s, running a full sync", profile.user_id)
+            return mirror.full_sync()
+        except ValueError:
+            # A page that moves folders into each other's old places can't be replayed item by item
+            logger.warning("Drive changes for user %s don't apply in order, running a full sync", profile.user_id)
+            return mirror.full_sync()
+    finally:
+        cache.delete(lock_key)
+
+
+def sync_in_background(profile):
+    """Runs sync_user on a thread once the current transaction commits."""
+    def work():
+        try:
+            sync_user(profile, get_user_drive_service(profile))
+        except Exception:
+            logger.exception("Drive sync failed for user %s", profile.user_id)
+        finally:
+            connection.close()
+
+    transaction.on_commit(
+        lambda: threading.Thread(target=work, name=f'drive-sync-{profile.user_id}', daemon=True).start()
+    )
+
+
+def ensure_fresh(profile, service):
+    """
+    Syncs the mirror if it is older than DRIVE_SYNC_INTERVAL seconds (or marked
+    stale). Replaying the changes feed happens inline; a full walk (no mirror
+    yet, or a new root folder) runs in the background and listings are served
+    live from Drive until it is done.
+    """
+    state = (
+        DriveSyncState.objects.filter(user_id=profile.user_id)
+        .only('last_synced_at', 'root_folder_id', 'page_token').first()
+    )
+    if not state or not state.page_token or state.root_folder_id != profile.google_drive_folder_id:
+        sync_in_background(profile)
+        return
+    if state.last_synced_at and (timezone.now() - state.last_synced_at).total_seconds() < settings.DRIVE_SYNC_INTERVAL:
+        return
+    sync_user(profile, service)
+
+
+def mark_stale(user):
+    """Makes the next listing pull the changes feed, e.g. right after this app changed the Drive."""
+    DriveSyncState.objects.filter(user=user).update(last_synced_at=None)
+
+
+def mirrored_listing(user, folder_id):
+    """
+    Children of `folder_id` from the mirror, folders first, in one query.
+    Returns None when that folder isn't mirrored.
+    """
+    nodes = list(
+        DriveNode.objects.mirrored().filter(owner=user, parent__owner=user, parent__drive_file_id=folder_id)
+        .order_by('-is_folder', 'name')
+    )
+    folders = DriveNode.objects.mirrored().filter(owner=user, drive_file_id=folder_id, is_folder=True)
+    if not nodes and not folders.exists():
+        return None
+    return [node_as_drive_file(node, folder_id) for node in nodes]
@@ -0,0 +1,272 @@
+"""
+Recursive Drive folder operations: copy, share and size.
+
+A folder tree is walked by a bounded thread pool. Each task lists one folder
+or copies one item, and returns the follow-up tasks it found. Every Drive call
+goes through the user's AdaptiveRateLimiter, so parallel workers back off
+together when Drive starts answering with rate-limit errors. Progress is
+written to the DriveJob row, which the job-status endpoint reads.
+"""
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from functools import partial
+
+import httplib2
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+
+from file.models import DriveJob, ShareLink
+from .drive_clients import get_user_drive_service
+from .drive_operations import is_retryable
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+
+class AdaptiveRateLimiter:
+    """
+    Spaces one user's Drive calls `1 / rate` seconds apart. The rate is halved
+    on every rate-limit answer and creeps back up by DRIVE_RATE_STEP per
+    success (additive increase, multiplicative decrease).
+    """
+
+    def __init__(self, rate, min_rate, max_rate):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.rate
+        if slot > now:
+            time.sleep(slot - now)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + settings.DRIVE_RATE_STEP)
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._next_slot = max(self._next_slot, time.monotonic() + 1 / self.rate)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(user_id):
+    """The process-wide limiter shared by all of one user's jobs."""
+    with _limiters_lock:
+        if user_id not in _limiters:
+            _limiters[user_id] = AdaptiveRateLimiter(
+                settings.DRIVE_USER_RATE, settings.DRIVE_USER_MIN_RATE, settings.DRIVE_USER_MAX_RATE,
+            )
+        return _limiters[user_id]
+
+
+def is_rate_limited(error):
+    status_code = getattr(getattr(error, 'resp', None), 'status', None)
+    return status_code == 429 or (status_code == 403 and is_retryable(error))
+
+
+def limited_execute(limiter, request):
+    """Executes a Drive request under `limiter`, retrying rate limits and server errors with jittered backoff."""
+    for attempt in range(settings.DRIVE_JOB_MAX_RETRIES + 1):
+        limiter.acquire()
+        try:
+            result = request.execute()
+        except (HttpError, httplib2.HttpLib2Error, socket.error) as e:
+            if isinstance(e, HttpError) and not is_retryable(e) or attempt == settings.DRIVE_JOB_MAX_RETRIES:
+                raise
+            if is_rate_limited(e):
+                limiter.throttled()
+            time.sleep(min(2 ** attempt, 32) + random.random())
+        else:
+            limiter.succeeded()
+            return result
+
+
+class TreeJob:
+    """Runs one DriveJob's folder walk on a bounded thread pool."""
+
+    def __init__(self, job, profile):
+        self.job = job
+        self.profile = profile
+        self.limiter = limiter_for(profile.user_id)
+        self.counts = Counter()
+        self.errors = []
+        self._lock = threading.Lock()
+        self._reported = 0
+
+    # ----- Called from pool threads -----
+
+    def call(self, make_request):
+        # Each pool thread gets its own connection from the per-user client cache
+        service = get_user_drive_service(self.profile)
+        return limited_execute(self.limiter, make_request(service))
+
+    def list_children(self, folder_id, fields):
+        page_token = None
+        while True:
+            response = self.call(lambda service: service.files().list(
+                q=f"'{folder_id}' in parents and trashed = false",
+                fields=f"nextPageToken, files({fields})",
+                pageSize=1000,
+                pageToken=page_token,
+            ))
+            yield from response.get('files', [])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return
+
+    def count(self, **increments):
+        with self._lock:
+            self.counts.update(increments)
+
+    def _run_task(self, task, item_name):
+        try:
+            return task() or []
+        except Exception as e:
+            with self._lock:
+                self.counts['failed'] += 1
+                if len(self.errors) < 50:
+                    self.errors.append(f"{item_name}: {e}")
+            return []
+        finally:
+            connection.close()
+
+    # ----- Coordinator -----
+
+    def run(self, tasks):
+        """`tasks` are (callable, name) pairs; each callable returns more of them."""
+        with ThreadPoolExecutor(max_workers=settings.DRIVE_JOB_WORKERS, thread_name_prefix=f'drive-job-{self.job.pk}') as pool:
+            running = {pool.submit(self._run_task, task, name) for task, name in tasks}
+            while running:
+                done, running = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.update(pool.submit(self._run_task, task, name) for task, name in future.result())
+                self.report()
+        self.report(force=True)
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._reported < settings.DRIVE_JOB_PROGRESS_INTERVAL:
+            return
+        self._reported = now
+        with self._lock:
+            fields = dict(
+                total=self.counts['total'], completed=self.counts['completed'],
+                failed=self.counts['failed'], errors=list(self.errors),
+            )
+        DriveJob.objects.filter(pk=self.job.pk).update(heartbeat_at=timezone.now(), **fields)
+
+
+def copy_folder(tree, folder_id, destination_id, name=None):
+    """Copies `folder_id` and everything under it into `destination_id`."""
+    source = tree.call(lambda s: s.files().get(fileId=folder_id, fields='id, name'))
+    root = tree.call(lambda s: s.files().create(
+        body={'name': name or source['name'], 'mimeType': FOLDER_MIME_TYPE, 'parents': [destination_id]},
+        fields='id, webViewLink',
+    ))
+    # Copying into the source's own subtree must not pick up the copies again
+    created_ids = {root['id']}
+
+    def copy_file(item, target_id):
+        tree.call(lambda s: s.files().copy(fileId=item['id'], body={'name': item['name'], 'parents': [target_id]}, fields='id'))
+        tree.count(completed=1, files=1)
+
+    def copy_subfolder(item, target_id):
+        created = tree.call(lambda s: s.files().create(
+            body={'name': item['name'], 'mimeType': FOLDER_MIME_TYPE, 'parents': [target_id]}, fields='id',
+        ))
+        with tree._lock:
+            created_ids.add(created['id'])
+        tree.count(completed=1, folders=1)
+        return copy_contents(item['id'], created['id'])
+
+    def copy_contents(source_id, target_id):
+        tasks = []
+        for item in tree.list_children(source_id, 'id, name, mimeType'):
+            if item['id'] in created_ids:
+                continue
+            task = copy_subfolder if item['mimeType'] == FOLDER_MIME_TYPE else copy_file
+            tasks.append((partial(task, item, target_id), item['name']))
+        tree.count(total=len(tasks))
+        return tasks
+
+    tree.run([(partial(copy_contents, folder_id, root['id']), source['name'])])
+    return {'folder_id': root['id'], 'web_view_link': root.get('webViewLink'),
+            'files': tree.counts['files'], 'folders': tree.counts['folders']}
+
+
+def folder_size(tree, folder_id):
+    """Total bytes, files and folders under `folder_id`."""
+    def measure(source_id):
+        tasks = []
+        for item in tree.list_children(source_id, 'id, name, mimeType, size'):
+            if item['mimeType'] == FOLDER_MIME_TYPE:
+                tree.count(folders=1, total=1)
+                tasks.append((partial(measure_folder, item['id']), item['name']))
+            else:
+                tree.count(files=1, bytes=int(item.get('size') or 0), total=1, completed=1)
+        return tasks
+
+    def measure_folder(source_id):
+        tasks = measure(source_id)
+        tree.count(completed=1)
+        return tasks
+
+    tree.run([(partial(measure, folder_id), folder_id)])
+    return {'bytes': tree.counts['bytes'], 'files': tree.counts['files'], 'folders': tree.counts['folders']}
+
+
+def share_folder(tree, folder_id, role='reader', email=None):
+    """
+    Shares `folder_id` and records a ShareLink for every file under it.
+
+    Drive applies a folder's permissions to everything inside it, so one
+    permission on the folder shares the whole tree. The walk only collects
+    the links, instead of adding thousands of redundant permissions.
+    """
+    permission = {'type': 'user', 'role': role, 'emailAddress': email} if email else {'type': 'anyone', 'role': role}
+    tree.call(lambda s: s.permissions().create(fileId=folder_id, body=permission, fields='id'))
+    root = tree.call(lambda s: s.files().get(fileId=folder_id, fields='id, webViewLink'))
+    shared = []
+
+    def collect(source_id):
+        tasks = []
+        for item in tree.list_children(source_id, 'id, name, mimeType, webViewLink'):
+            tree.count(total=1, completed=1)
+            if item['mimeType'] == FOLDER_MIME_TYPE:
+                tasks.append((partial(collect, item['id']), item['name']))
+            else:
+                with tree._lock:
+                    shared.append(item['id'])
+        return tasks
+
+    tree.run([(partial(collect, folder_id), folder_id)])
+
+    expires_at = timezone.now() + timedelta(days=7)
+    ShareLink.objects.bulk_create(
+        [ShareLink(file_id=file_id, created_by=tree.job.user, expires_at=expires_at) for file_id in [folder_id, *shared]],
+        batch_size=500,
+    )
+    return {'view_link': root.get('webViewLink'), 'files_shared': len(shared)}
+
+
+OPERATIONS = {
+    'copy_folder': copy_folder,
+    'share_folder': share_folder,
+    'folder_size': folder_size,
+}
@@ -0,0 +1,45 @@
+"""
+Counts of live share links for the dashboard.
+
+Everything is a COUNT/GROUP BY in the database (the total reads only the
+(is_active, expires_at) index) and is cached for SHARE_STATS_CACHE_TTL
+seconds, so the counter costs the same however many links pile up.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from file.models import ShareLink
+
+BREAKDOWNS = {
+    'user': ('created_by_id', 'created_by__username'),
+    'file': ('file_id',),
+}
+
+
+def cached(key, compute):
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.SHARE_STATS_CACHE_TTL)
+    return value
+
+
+def live_link_count():
+    return cached('share_stats:total', lambda: ShareLink.objects.live().count())
+
+
+def live_link_breakdown(by, limit):
+    """The `limit` users or files with the most live links, most first."""
+    fields = BREAKDOWNS[by]
+
+    def compute():
+        rows = (
+            ShareLink.objects.live()
+            .values(*fields)
+            .annotate(count=Count('id'))
+            .order_by('-count', fields[0])[:limit]
+        )
+        return list(rows)
+
+    return cached(f'share_stats:{by}:{limit}', compute)
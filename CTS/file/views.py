@@ -3,16 +3,46 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from .models import DriveNode
-from .serializers import DriveNodeSerializer
+from .serializers import DriveNodeSerializer, serialize_node_tree
+
 
+def tree_options(request):
+    """
+    Reads the `?depth=`, `?flat=1` and `?tree=1` query params used by the tree
+    listings. Raises ValueError on an invalid depth.
+    """
+    depth = request.query_params.get('depth')
+    if depth is not None:
+        depth = int(depth)
+        if depth < 1:
+            raise ValueError
+    flat = request.query_params.get('flat') in ('1', 'true')
+    tree = request.query_params.get('tree') in ('1', 'true')
+    return depth, flat, tree
 
-# 🔹 List all nodes (for logged-in user) OR create new node
+
+# 🔹 List all nodes (for logged-in user), optionally as a tree, OR create new node
 class DriveNodeListCreateView(generics.ListCreateAPIView):
     serializer_class = DriveNodeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return DriveNode.objects.filter(owner=self.request.user)
+        return DriveNode.objects.local().filter(owner=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        """
+        GET /nodes/                -> every node once, without nesting (`parent` links them)
+        GET /nodes/?depth=2        -> only the nodes of the top two levels
+        GET /nodes/?tree=1         -> only the roots, with the tree nested below them
+        GET /nodes/?tree=1&depth=2 -> the same, cut after two levels
+        """
+        try:
+            depth, _, tree = tree_options(request)
+        except ValueError:
+            return Response({"error": "depth must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        nodes = self.get_queryset().order_by('depth', 'name')
+        return Response(serialize_node_tree(nodes, max_depth=depth, flat=not tree))
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
@@ -24,7 +54,7 @@ class DriveNodeRetrieveUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return DriveNode.objects.filter(owner=self.request.user)
+        return DriveNode.objects.local().filter(owner=self.request.user)
 
 
 # 🔹 Get all children of a folder
@@ -32,10 +62,14 @@ class DriveFolderChildrenView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, folder_id):
-        folder = get_object_or_404(DriveNode, id=folder_id, owner=request.user, is_folder=True)
-        children = folder.children.all()
-        serializer = DriveNodeSerializer(children, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        folder = get_object_or_404(DriveNode.objects.local(), id=folder_id, owner=request.user, is_folder=True)
+        try:
+            depth, flat, _ = tree_options(request)
+        except ValueError:
+            return Response({"error": "depth must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        nodes = folder.get_descendants().order_by('depth', 'name')
+        return Response(serialize_node_tree(nodes, max_depth=depth, flat=flat), status=status.HTTP_200_OK)
 
 
 # 🔹 Create a new folder
@@ -48,7 +82,7 @@ class CreateFolderView(APIView):
 
         parent = None
         if parent_id:
-            parent = get_object_or_404(DriveNode, id=parent_id, owner=request.user)
+            parent = get_object_or_404(DriveNode.objects.local(), id=parent_id, owner=request.user)
 
         folder = DriveNode.objects.create(
             name=name,
@@ -66,8 +100,8 @@ from rest_framework import status, permissions
 from django.shortcuts import get_object_or_404
 from .models import DriveNode
 from .serializers import DriveNodeSerializer
-from .utils.google_drive import get_drive_service, upload_to_drive
-import tempfile
+from .utils.drive_clients import get_user_drive_service
+from .utils.drive_operations import stream_upload
 
 class UploadFileView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -84,19 +118,24 @@ class UploadFileView(APIView):
         parent = None
         parent_drive_id = None
         if parent_id:
-            parent = get_object_or_404(DriveNode, id=parent_id, owner=request.user)
+            parent = get_object_or_404(DriveNode.objects.local(), id=parent_id, owner=request.user)
             parent_drive_id = parent.drive_file_id
 
-        # Save the file temporarily
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            for chunk in uploaded_file.chunks():
-                temp_file.write(chunk)
-            temp_file_path = temp_file.name
+        profile = request.user.profile
+        if not profile.google_drive_credentials:
+            return Response({"error": "Google Drive not connected"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        # Upload to Google Drive
+        # Stream the upload to Google Drive in resumable chunks, straight from Django's upload file
         try:
-            service = get_drive_service(request.user)
-            drive_file = upload_to_drive(service, temp_file_path, name, uploaded_file.content_type, parent_drive_id)
+            service = get_user_drive_service(profile)
+            drive_file = stream_upload(
+                service,
+                uploaded_file,
+                name or uploaded_file.name,
+                parent_drive_id,
+                mime_type=uploaded_file.content_type,
+                fields='id, name, webViewLink, mimeType, size',
+            )
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -119,6 +158,6 @@ class NodePathView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, pk):
-        node = get_object_or_404(DriveNode, id=pk, owner=request.user)
+        node = get_object_or_404(DriveNode.objects.local(), id=pk, owner=request.user)
         path = node.get_path()
         return Response({'path': path}, status=status.HTTP_200_OK)
@@ -1,45 +1,72 @@
+import re
+
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.core.exceptions import ValidationError
+from django.conf import settings
+
+from CTS.streaming import streaming_body
 
+from .utils.drive_clients import get_user_drive_service
+from .utils.drive_sync import ensure_fresh, mark_stale, mirrored_listing
 from .utils.drive_operations import (
-    get_drive_service,
     list_files,
     create_folder,
-    upload_file,
     move_file,
     copy_file,
     rename_file,
     delete_file,
-    make_file_shareable
+    make_file_shareable,
+    iter_file_chunks,
 )
 
-from .models import ShareLink
+from .models import DriveJob
+from .serializers import DriveJobSerializer
+from .utils.drive_jobs import enqueue, stage_upload
+from .utils.share_stats import BREAKDOWNS, live_link_breakdown, live_link_count
 from django.http import JsonResponse
 
 @api_view(['GET'])
 def total_shared_files(request):
     """
     Returns the total number of active, non-expired shared files across all users.
+
+    ?breakdown=user or ?breakdown=file adds the top `limit` (default 20, at
+    most 100) users or files by live links; those name other users and their
+    files, so they are for staff only. Counts are cached for
+    SHARE_STATS_CACHE_TTL seconds.
     """
-    # Fetch all active share links
-    shared_links = ShareLink.objects.all()
-    print()
-    # Exclude expired ones
-    active_links = [link for link in shared_links if not link.is_expired]
+    data = {"total_shared_files": live_link_count()}
+
+    breakdown = request.query_params.get('breakdown')
+    if breakdown:
+        if not IsAdminUser().has_permission(request, None):
+            return Response({"error": "Breakdowns are only available to staff"}, status=status.HTTP_403_FORBIDDEN)
+        if breakdown not in BREAKDOWNS:
+            return Response({"error": "breakdown must be user or file"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        data[f"by_{breakdown}"] = live_link_breakdown(breakdown, limit)
 
-    return JsonResponse({
-        "total_shared_files": len(shared_links),
-    })
+    return JsonResponse(data)
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_drive_files(request):
-    """List files from user's Google Drive CTS folder."""
+    """
+    List files from user's Google Drive CTS folder.
+
+    Served from the local DriveNode mirror (brought up to date from the Drive
+    changes feed at most every DRIVE_SYNC_INTERVAL seconds); folders outside
+    the mirror, or every folder while the first sync runs in the background,
+    are listed live from Drive, every page of them.
+    """
     try:
         user_profile = request.user.profile
         if not user_profile.google_drive_credentials:
@@ -48,22 +75,24 @@ def list_drive_files(request):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        folder_id = request.query_params.get('folder_id', user_profile.google_drive_folder_id)
-        print(f"Listing files for folder_id: {folder_id}")  # Debug info
-        print(f"User's root folder_id: {user_profile.google_drive_folder_id}")  # Debug info
-        service = get_drive_service(user_profile.google_drive_credentials)
-        
-        try:
-            # Verify the folder exists and user has access
-            if folder_id:
-                folder = service.files().get(fileId=folder_id, fields="id, name").execute()
-                print(f"Current folder: {folder.get('name', 'Unknown')} ({folder_id})")  # Debug info
-        except Exception as e:
-            print(f"Error accessing folder: {str(e)}")  # Debug info
-            # If folder not found or inaccessible, fall back to root folder
-            folder_id = user_profile.google_drive_folder_id
-        
-        files = list_files(service, folder_id)
+        folder_id = request.query_params.get('folder_id') or user_profile.google_drive_folder_id
+        service = get_user_drive_service(user_profile)
+
+        source = "mirror"
+        if user_profile.google_drive_folder_id:
+            ensure_fresh(user_profile, service)
+        files = mirrored_listing(request.user, folder_id)
+        if files is None:
+            source = "drive"
+            try:
+                files = list_files(service, folder_id)
+            except Exception as e:
+                print(f"Error accessing folder: {str(e)}")  # Debug info
+                # If folder not found or inaccessible, fall back to root folder
+                folder_id = user_profile.google_drive_folder_id
+                files = mirrored_listing(request.user, folder_id)
+                if files is None:
+                    files = list_files(service, folder_id)
         
         # Add debug info to response
         response_data = {
@@ -71,7 +100,8 @@ def list_drive_files(request):
             "debug_info": {
                 "total_files": len(files),
                 "current_folder_id": folder_id,
-                "root_folder_id": user_profile.google_drive_folder_id
+                "root_folder_id": user_profile.google_drive_folder_id,
+                "source": source,
             }
         }
         
@@ -92,7 +122,7 @@ def list_drive_files(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def upload_to_drive(request):
-    """Upload a file to Google Drive."""
+    """Upload a file to Google Drive. Returns a job to poll; its result has the file_id."""
     try:
         user_profile = request.user.profile
         if not user_profile.google_drive_credentials:
@@ -112,23 +142,11 @@ def upload_to_drive(request):
         parent_id = request.data.get('parent_id')
         if not parent_id:
             parent_id = user_profile.google_drive_folder_id
-        
-        service = get_drive_service(user_profile.google_drive_credentials)
-        
-        # Verify parent folder exists and is accessible
-        try:
-            service.files().get(fileId=parent_id, fields="id, name").execute()
-        except Exception as e:
-            print(f"Error verifying parent folder: {str(e)}")
-            # Fallback to CTS root folder if specified folder is inaccessible
-            parent_id = user_profile.google_drive_folder_id
-        
-        file_id = upload_file(service, file_obj, file_obj.name, parent_id)
-        
-        return Response({
-            "file_id": file_id,
-            "parent_id": parent_id  # Return the actual parent ID used
-        })
+
+        # The Drive transfer runs as a job; the parent folder is checked there
+        job = enqueue(request.user, 'upload', path=stage_upload(file_obj), filename=file_obj.name,
+                      parent_id=parent_id, mime_type=file_obj.content_type)
+        return drive_job_response(job)
     except Exception as e:
         return Response(
             {"error": str(e)},
@@ -159,7 +177,7 @@ def create_drive_folder(request):
         if not parent_id:
             parent_id = user_profile.google_drive_folder_id
             
-        service = get_drive_service(user_profile.google_drive_credentials)
+        service = get_user_drive_service(user_profile)
         
         # Verify parent folder exists and is accessible
         try:
@@ -174,6 +192,7 @@ def create_drive_folder(request):
             parent_id = user_profile.google_drive_folder_id
         
         folder_id = create_folder(service, name, parent_id)
+        mark_stale(request.user)
         
         return Response({
             "folder_id": folder_id,
@@ -200,6 +219,7 @@ def move_drive_file(request):
 
         file_id = request.data.get('file_id')
         destination_id = request.data.get('destination_id')
+        source_id = request.data.get('source_id')  # current folder, saves a lookup
         operation = request.data.get('operation', 'move')  # 'move' or 'copy'
 
         if not file_id or not destination_id:
@@ -208,12 +228,13 @@ def move_drive_file(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        service = get_drive_service(user_profile.google_drive_credentials)
+        service = get_user_drive_service(user_profile)
         
         if operation == 'copy':
             result = copy_file(service, file_id, destination_id)
         else:
-            result = move_file(service, file_id, destination_id)
+            result = move_file(service, file_id, destination_id, source_id)
+        mark_stale(request.user)
         
         return Response(result)
     except Exception as e:
@@ -222,6 +243,74 @@ def move_drive_file(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def bulk_drive_operation(request):
+    """
+    Apply one operation to many files with batched Drive calls.
+
+    {"operation": "move" | "copy", "file_ids": [...], "destination_id": "...", "source_id": "..."}
+    {"operation": "delete", "file_ids": [...]}
+    {"operation": "rename", "items": [{"file_id": "...", "new_name": "..."}]}
+
+    Runs as a job; its result has an entry per file, and one failing file
+    doesn't fail the rest.
+    """
+    try:
+        user_profile = request.user.profile
+        if not user_profile.google_drive_credentials:
+            return Response(
+                {"error": "Google Drive not connected"},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+        operation = request.data.get('operation')
+        if operation == 'rename':
+            items = request.data.get('items')
+            if not isinstance(items, list) or not all(isinstance(i, dict) and i.get('file_id') and i.get('new_name') for i in items):
+                return Response(
+                    {"error": "items must be a list of {file_id, new_name}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            file_ids = [item['file_id'] for item in items]
+        elif operation in ('move', 'copy', 'delete'):
+            file_ids = request.data.get('file_ids')
+            if not isinstance(file_ids, list) or not file_ids:
+                return Response(
+                    {"error": "file_ids must be a non-empty list"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if operation != 'delete' and not request.data.get('destination_id'):
+                return Response(
+                    {"error": "Destination folder ID is required"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        else:
+            return Response(
+                {"error": "operation must be move, copy, rename or delete"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        file_ids = list(dict.fromkeys(file_ids))
+        if len(file_ids) > settings.DRIVE_BULK_MAX_ITEMS:
+            return Response(
+                {"error": f"At most {settings.DRIVE_BULK_MAX_ITEMS} files per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if operation == 'rename':
+            job = enqueue(request.user, 'bulk', operation=operation,
+                          names={item['file_id']: item['new_name'] for item in items})
+        else:
+            job = enqueue(request.user, 'bulk', operation=operation, file_ids=file_ids,
+                          destination_id=request.data.get('destination_id'), source_id=request.data.get('source_id'))
+        return drive_job_response(job)
+    except Exception as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def rename_drive_file(request, file_id):
@@ -241,8 +330,9 @@ def rename_drive_file(request, file_id):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        service = get_drive_service(user_profile.google_drive_credentials)
+        service = get_user_drive_service(user_profile)
         result = rename_file(service, file_id, new_name)
+        mark_stale(request.user)
         
         return Response(result)
     except Exception as e:
@@ -263,8 +353,9 @@ def delete_drive_file(request, file_id):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        service = get_drive_service(user_profile.google_drive_credentials)
+        service = get_user_drive_service(user_profile)
         delete_file(service, file_id)
+        mark_stale(request.user)
         
         return Response(status=status.HTTP_204_NO_CONTENT)
     except Exception as e:
@@ -273,10 +364,42 @@ def delete_drive_file(request, file_id):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+def parse_byte_range(header, size):
+    """
+    Parses a single `Range: bytes=...` header against a file of `size` bytes.
+
+    Returns (start, end) inclusive, or None to serve the whole file: no header,
+    one we don't handle such as multiple ranges, or a malformed one (RFC 9110
+    says to ignore those). Raises ValueError only when a valid range can't be
+    satisfied, which is answered with 416.
+    """
+    match = re.fullmatch(r'bytes=\s*([0-9]*)-([0-9]*)\s*', header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-N: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError("Range not satisfiable")
+        return max(size - int(last), 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, min(int(last), size - 1) if last else size - 1
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def download_drive_file(request, file_id):
-    """Download a file from Google Drive."""
+    """
+    Stream a file from Google Drive in chunks.
+
+    Honours a single `Range` header (206 Partial Content), optionally guarded
+    by `If-Range` against the file's md5 ETag, so players and resumed downloads
+    only pull the bytes they need.
+    """
     try:
         user_profile = request.user.profile
         if not user_profile.google_drive_credentials:
@@ -285,20 +408,41 @@ def download_drive_file(request, file_id):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        service = get_drive_service(user_profile.google_drive_credentials)
+        service = get_user_drive_service(user_profile)
         
         # Get file metadata first
-        file = service.files().get(fileId=file_id, fields='name, mimeType').execute()
-        
-        # Download file content
-        request = service.files().get_media(fileId=file_id)
-        file_content = request.execute()
-        
-        # Create response with proper content type and filename
-        response = HttpResponse(
-            file_content,
-            content_type=file.get('mimeType', 'application/octet-stream')
+        file = service.files().get(fileId=file_id, fields='name, mimeType, size, md5Checksum').execute()
+        if file.get('size') is None:
+            return Response(
+                {"error": "Google Docs files can't be downloaded directly; export them instead."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        size = int(file['size'])
+        etag = f'"{file["md5Checksum"]}"' if file.get('md5Checksum') else None
+
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range != etag:
+            range_header = None
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        response = StreamingHttpResponse(
+            streaming_body(request, iter_file_chunks(service, file_id, start, end) if size else ()),
+            status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+            content_type=file.get('mimeType', 'application/octet-stream'),
         )
+        response['Content-Length'] = str(end - start + 1) if size else '0'
+        response['Accept-Ranges'] = 'bytes'
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        if etag:
+            response['ETag'] = etag
         response['Content-Disposition'] = f'attachment; filename="{file["name"]}"'
         
         return response
@@ -328,7 +472,7 @@ def share_drive_file(request, file_id):
             )
 
         # Create Drive service
-        service = get_drive_service(user_profile.google_drive_credentials)
+        service = get_user_drive_service(user_profile)
 
         # Call the share function
         links = make_file_shareable(service, file_id,user=request.user, anyone=True)
@@ -352,4 +496,74 @@ def share_drive_file(request, file_id):
         return Response(
             {"error": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+def drive_job_response(job):
+    return Response(
+        {"job_id": str(job.id), "status": job.status, "status_url": f"/api/files/drive/jobs/{job.id}/"},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def copy_drive_folder(request, file_id):
+    """Start copying a folder and everything in it into destination_id. Returns a job to poll."""
+    user_profile = request.user.profile
+    if not user_profile.google_drive_credentials:
+        return Response({"error": "Google Drive not connected"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    destination_id = request.data.get('destination_id') or user_profile.google_drive_folder_id
+    if not destination_id:
+        return Response({"error": "Destination folder ID is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = enqueue(request.user, 'copy_folder', folder_id=file_id, destination_id=destination_id,
+                  name=request.data.get('name'))
+    return drive_job_response(job)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def share_drive_folder(request, file_id):
+    """Start sharing a folder (anyone with the link, or one email) and recording links for its files."""
+    user_profile = request.user.profile
+    if not user_profile.google_drive_credentials:
+        return Response({"error": "Google Drive not connected"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    role = request.data.get('role', 'reader')
+    if role not in ('reader', 'commenter', 'writer'):
+        return Response({"error": "role must be reader, commenter or writer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = enqueue(request.user, 'share_folder', folder_id=file_id, role=role, email=request.data.get('email'))
+    return drive_job_response(job)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def drive_folder_size(request, file_id):
+    """Start adding up the size of a folder tree."""
+    user_profile = request.user.profile
+    if not user_profile.google_drive_credentials:
+        return Response({"error": "Google Drive not connected"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    job = enqueue(request.user, 'folder_size', folder_id=file_id)
+    return drive_job_response(job)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def drive_job_status(request, job_id):
+    """Progress and, once finished, the result of one of the user's Drive jobs."""
+    job = DriveJob.objects.filter(pk=job_id, user=request.user).first()
+    if job is None:
+        return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(DriveJobSerializer(job).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def list_drive_jobs(request):
+    """The user's most recent Drive jobs, newest first."""
+    jobs = DriveJob.objects.filter(user=request.user).order_by('-created_at')[:20]
+    return Response(DriveJobSerializer(jobs, many=True).data)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from ...models import ForumPost
+
+
+class Command(BaseCommand):
+    help = "Recompute ForumPost.comment_count from the Comment table"
+
+    def handle(self, *args, **options):
+        updated = ForumPost.rebuild_comment_counts()
+        self.stdout.write(self.style.SUCCESS(f"✅ Rebuilt comment counts for {updated} forum posts."))
@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-18 16:38
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_comment_counts(apps, schema_editor):
+    ForumPost = apps.get_model('forum', 'ForumPost')
+    Comment = apps.get_model('forum', 'Comment')
+    counts = (
+        Comment.objects.filter(post=OuterRef('pk'))
+        .values('post')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    ForumPost.objects.update(comment_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0003_postreaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='forumpost',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_comment_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0 on 2026-10-18 17:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0004_forumpost_comment_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumpost',
+            index=models.Index(fields=['-likes', '-id'], name='forumpost_likes_idx'),
+        ),
+    ]
@@ -1,4 +1,8 @@
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 # Create your models here.
 class ForumPost(models.Model):
@@ -10,10 +14,28 @@ class ForumPost(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     likes = models.PositiveIntegerField(default=0)
     dislikes = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Keyset pages of the "most liked" feed (?ordering=-likes)
+            models.Index(fields=['-likes', '-id'], name='forumpost_likes_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def rebuild_comment_counts(cls):
+        """Recomputes comment_count for every post from Comment in one UPDATE."""
+        counts = (
+            Comment.objects.filter(post=OuterRef('pk'))
+            .values('post')
+            .annotate(total=Count('id'))
+            .values('total')
+        )
+        return cls.objects.update(comment_count=Coalesce(Subquery(counts), 0))
+
 class PostReaction(models.Model):
     LIKE = 'like'
     DISLIKE = 'dislike'
@@ -37,4 +59,15 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f'Comment by {self.author.username} on {self.post.title}'
\ No newline at end of file
+        return f'Comment by {self.author.username} on {self.post.title}'
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    if created:
+        ForumPost.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    ForumPost.objects.filter(pk=instance.post_id, comment_count__gt=0).update(comment_count=F('comment_count') - 1)
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+POST_COUNT_KEY = 'forum:post_count'
+
+
+class ForumCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the forum feed, newest first.
+    Pages are addressed by opaque `next`/`previous` cursors on `id`, so every
+    page costs one indexed range query no matter how deep the client scrolls.
+
+    `?ordering=-likes` pages through the most liked posts instead (ties newest
+    first). Responses carry the total number of posts as `count`, cached for
+    FORUM_COUNT_CACHE_TTL seconds so it doesn't cost a COUNT(*) per page.
+    """
+    ordering = '-id'
+    orderings = {
+        '-id': ('-id',),
+        '-likes': ('-likes', '-id'),
+    }
+    page_size = getattr(settings, 'FORUM_PAGE_SIZE', 20)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        return self.orderings.get(request.query_params.get('ordering'), (self.ordering,))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = cache.get(POST_COUNT_KEY)
+        if self.count is None:
+            self.count = queryset.count()
+            cache.set(POST_COUNT_KEY, self.count, getattr(settings, 'FORUM_COUNT_CACHE_TTL', 60))
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,265 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, When
+from django.db.models.functions import Greatest
+
+from .models import ForumPost, PostReaction
+
+logger = logging.getLogger(__name__)
+
+# SQLite has a single writer; a locked database is retried a few times before giving up
+LOCK_RETRIES = 10
+LOCK_BACKOFF = 0.01  # seconds, doubled on every retry
+
+COUNTER_FIELDS = {
+    PostReaction.LIKE: 'likes',
+    PostReaction.DISLIKE: 'dislikes',
+}
+
+
+def _increment(field):
+    return {field: F(field) + 1}
+
+
+def _decrement(field):
+    return {field: Greatest(F(field) - 1, 0)}
+
+
+def _apply_reaction(user, post_id, action):
+    field = COUNTER_FIELDS[action]
+    posts = ForumPost.objects.filter(pk=post_id)
+
+    with transaction.atomic():
+        while True:
+            try:
+                # Write first so the transaction takes the write lock straight away
+                with transaction.atomic():
+                    PostReaction.objects.create(user=user, post_id=post_id, reaction_type=action)
+                posts.update(**_increment(field))
+                break
+            except IntegrityError:
+                # The user already reacted (possibly in a concurrent request)
+                reaction = PostReaction.objects.select_for_update().filter(user=user, post_id=post_id).first()
+                if reaction is None:
+                    # ...and that reaction was removed again in the meantime
+                    continue
+                if reaction.reaction_type == action:
+                    # Same reaction again -> toggle it off
+                    if PostReaction.objects.filter(pk=reaction.pk, reaction_type=action).delete()[0]:
+                        posts.update(**_decrement(field))
+                else:
+                    # Switch reaction -> move one count between the columns
+                    other = COUNTER_FIELDS[reaction.reaction_type]
+                    switched = PostReaction.objects.filter(
+                        pk=reaction.pk, reaction_type=reaction.reaction_type
+                    ).update(reaction_type=action)
+                    if switched:
+                        posts.update(**_increment(field), **_decrement(other))
+                break
+
+        return posts.values('likes', 'dislikes').get()
+
+
+def apply_reaction(user, post_id, action):
+    """
+    Toggles `action` ('like' or 'dislike') for `user` on a post and returns
+    the post's current {'likes': ..., 'dislikes': ...}.
+
+    Counters are changed with conditional F() updates on the counter columns
+    only, in the same transaction as the PostReaction row, so concurrent
+    reactions never lose updates. A race on the (user, post) unique
+    constraint is resolved by treating the request as a toggle/switch.
+    """
+    delay = LOCK_BACKOFF
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return _apply_reaction(user, post_id, action)
+        except OperationalError as e:
+            if 'locked' not in str(e) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(delay)
+            delay *= 2
+
+
+class ReactionBuffer:
+    """
+    Write-behind buffer for reactions on hot posts (FORUM_REACTION_BUFFERING).
+
+    Each toggle only updates in-process state: the user's latest reaction and
+    a net likes/dislikes delta per post. A background thread flushes both to
+    the database every FORUM_REACTION_FLUSH_INTERVAL seconds in one
+    transaction, so a burst of thousands of toggles costs a handful of
+    writes. Responses add the unflushed deltas to the stored counters
+    (read-your-writes). Buffered reactions are lost if the process dies
+    before the next flush, and each worker process keeps its own buffer.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'FORUM_REACTION_FLUSH_INTERVAL', 1.0)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # (user_id, post_id) -> reaction_type, or None when removed
+        self._deltas = defaultdict(lambda: defaultdict(int))  # post_id -> field -> delta
+        self._inflight = {}
+        self._inflight_deltas = {}
+        # Bumped when a flush starts and when it ends (odd while one is running),
+        # so readers can tell whether a database read raced with a flush
+        self._flushes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def react(self, user, post_id, action):
+        """Toggles `action` for `user` and returns the post's counts including unflushed deltas."""
+        key = (user.id, post_id)
+        while True:
+            generation = self._flushes
+            stored = self._stored_reaction(user, post_id)
+
+            with self._lock:
+                if key in self._pending:
+                    current = self._pending[key]
+                elif key in self._inflight:
+                    current = self._inflight[key]
+                elif generation != self._flushes:
+                    # A flush committed after `stored` was read; read it again
+                    continue
+                else:
+                    current = stored
+                new = None if current == action else action
+
+                self._pending[key] = new
+                if current:
+                    self._deltas[post_id][COUNTER_FIELDS[current]] -= 1
+                if new:
+                    self._deltas[post_id][COUNTER_FIELDS[new]] += 1
+                break
+
+        self._ensure_flusher()
+        return self.counts(post_id)
+
+    def _stored_reaction(self, user, post_id):
+        return (
+            PostReaction.objects.filter(user=user, post_id=post_id)
+            .values_list('reaction_type', flat=True)
+            .first()
+        )
+
+    def counts(self, post_id):
+        """
+        Stored counters for a post plus whatever is still waiting in the buffer.
+
+        While a flush runs, a database read may or may not include its deltas
+        (that depends on whether it has committed yet), so the read is only
+        used when no flush started or ended around it.
+        """
+        while True:
+            generation = self._flushes
+            if generation % 2:
+                # Wait for the running flush instead of guessing
+                with self._flush_lock:
+                    pass
+                continue
+            counts = ForumPost.objects.filter(pk=post_id).values('likes', 'dislikes').get()
+            with self._lock:
+                if generation != self._flushes:
+                    continue
+                for field, delta in (self._deltas.get(post_id) or {}).items():
+                    counts[field] = max(0, counts[field] + delta)
+                return counts
+
+    def flush(self):
+        """Writes buffered reactions and net counter deltas in a single transaction."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._inflight, self._pending = self._pending, {}
+                self._inflight_deltas, self._deltas = self._deltas, defaultdict(lambda: defaultdict(int))
+                self._flushes += 1
+            flushed = len(self._inflight)
+
+            try:
+                with transaction.atomic():
+                    self._write_reactions(self._inflight)
+                    self._write_counters(self._inflight_deltas)
+            except Exception:
+                # Put everything back so the next flush retries it
+                with self._lock:
+                    for key, reaction in self._inflight.items():
+                        self._pending.setdefault(key, reaction)
+                    for post_id, deltas in self._inflight_deltas.items():
+                        for field, delta in deltas.items():
+                            self._deltas[post_id][field] += delta
+                raise
+            finally:
+                with self._lock:
+                    self._inflight, self._inflight_deltas = {}, {}
+                    self._flushes += 1
+            return flushed
+
+    def _write_reactions(self, reactions):
+        removed = Q(pk__in=[])
+        kept = []
+        for (user_id, post_id), reaction_type in reactions.items():
+            if reaction_type is None:
+                removed |= Q(user_id=user_id, post_id=post_id)
+            else:
+                kept.append(PostReaction(user_id=user_id, post_id=post_id, reaction_type=reaction_type))
+
+        PostReaction.objects.filter(removed).delete()
+        PostReaction.objects.bulk_create(
+            kept,
+            update_conflicts=True,
+            unique_fields=['user', 'post'],
+            update_fields=['reaction_type'],
+        )
+
+    def _write_counters(self, deltas):
+        updates = {}
+        for field in COUNTER_FIELDS.values():
+            whens = [
+                When(pk=post_id, then=Greatest(F(field) + post_deltas[field], 0))
+                for post_id, post_deltas in deltas.items()
+                if post_deltas.get(field)
+            ]
+            if whens:
+                updates[field] = Case(*whens, default=F(field), output_field=PositiveIntegerField())
+        if updates:
+            ForumPost.objects.filter(pk__in=list(deltas)).update(**updates)
+
+    def _ensure_flusher(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='reaction-flusher', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush_quietly()
+            finally:
+                connection.close()
+
+    def flush_quietly(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Error flushing reaction buffer")
+
+
+reaction_buffer = ReactionBuffer()
+atexit.register(reaction_buffer.flush_quietly)
+
+
+def react(user, post_id, action):
+    """Applies a reaction directly, or through the write-behind buffer when enabled."""
+    if getattr(settings, 'FORUM_REACTION_BUFFERING', False):
+        return reaction_buffer.react(user, post_id, action)
+    return apply_reaction(user, post_id, action)
@@ -5,16 +5,12 @@ from .models import Comment
 
 class ForumPostSerializer(serializers.ModelSerializer):
     author_username = serializers.CharField(source='author.username', read_only=True)
-    comment_count = serializers.SerializerMethodField()
 
     class Meta:
         model = ForumPost
         fields = ['id', 'author', 'author_username', 'title', 'content', 'media_link', 
                  'created_at', 'likes', 'dislikes', 'comment_count']
-        read_only_fields = ['author', 'likes', 'dislikes']
-
-    def get_comment_count(self, obj):
-        return obj.comments.count()
+        read_only_fields = ['author', 'likes', 'dislikes', 'comment_count']
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -1,3 +1,206 @@
-from django.test import TestCase
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from .models import ForumPost, PostReaction
+from .reactions import ReactionBuffer
+
+
+class PostReactionConcurrencyTests(TransactionTestCase):
+    WORKERS = 16
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.post = ForumPost.objects.create(author=self.author, title='Hot post', content='...')
+
+    def react(self, user, action):
+        try:
+            client = APIClient()
+            client.force_authenticate(user)
+            return client.post(f'/api/forum/forum/{self.post.id}/{action}/').status_code
+        finally:
+            connection.close()
+
+    def run_parallel(self, calls):
+        with ThreadPoolExecutor(max_workers=self.WORKERS) as pool:
+            return list(pool.map(lambda call: self.react(*call), calls))
+
+    def assertCountsMatchReactions(self):
+        self.post.refresh_from_db()
+        reactions = PostReaction.objects.filter(post=self.post)
+        self.assertEqual(self.post.likes, reactions.filter(reaction_type='like').count())
+        self.assertEqual(self.post.dislikes, reactions.filter(reaction_type='dislike').count())
+
+    def test_parallel_likes_are_not_lost(self):
+        users = [User.objects.create(username=f'user{i}') for i in range(300)]
+        calls = [(user, 'like' if i % 3 else 'dislike') for i, user in enumerate(users)]
+
+        statuses = self.run_parallel(calls)
+
+        self.assertEqual(set(statuses), {200})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes, 200)
+        self.assertEqual(self.post.dislikes, 100)
+        self.assertCountsMatchReactions()
+
+    def test_parallel_toggles_by_same_users_stay_consistent(self):
+        users = [User.objects.create(username=f'user{i}') for i in range(20)]
+        calls = [(users[i % 20], ('like', 'dislike', 'like')[i % 3]) for i in range(300)]
+
+        statuses = self.run_parallel(calls)
+
+        self.assertEqual(set(statuses), {200})
+        self.assertCountsMatchReactions()
+
+
+class ForumFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create(username='author')
+        self.posts = [
+            ForumPost.objects.create(author=author, title=f'Post {i}', content='...', likes=i % 4)
+            for i in range(7)
+        ]
+        self.client = APIClient()
+
+    def pages(self, **params):
+        response = self.client.get('/api/forum/forum/', {'page_size': 3, **params}).json()
+        pages = [response]
+        while response['next']:
+            response = self.client.get(response['next']).json()
+            pages.append(response)
+        return pages
+
+    def test_cursor_pages_cover_every_post_once_with_total_count(self):
+        pages = self.pages()
+        ids = [post['id'] for page in pages for post in page['results']]
+        self.assertEqual(ids, [post.id for post in reversed(self.posts)])
+        self.assertEqual({page['count'] for page in pages}, {7})
+        self.assertEqual(len(pages), 3)
+
+    def test_most_liked_ordering(self):
+        pages = self.pages(ordering='-likes')
+        ordered = [(post['likes'], post['id']) for page in pages for post in page['results']]
+        self.assertEqual(ordered, sorted(((p.likes, p.id) for p in self.posts), reverse=True))
+
+    @override_settings(FORUM_COUNT_CACHE_TTL=60)
+    def test_count_is_cached(self):
+        self.client.get('/api/forum/forum/')
+        ForumPost.objects.create(author=self.posts[0].author, title='New', content='...')
+        self.assertEqual(self.client.get('/api/forum/forum/').json()['count'], 7)
+
+
+class CommentCountTests(TestCase):
+    def test_comment_count_follows_creates_and_deletes(self):
+        author = User.objects.create(username='author')
+        post = ForumPost.objects.create(author=author, title='Post', content='...')
+        client = APIClient()
+        client.force_authenticate(author)
+        for text in ('first', 'second'):
+            self.assertEqual(client.post(f'/api/forum/forum/{post.id}/comments/', {'content': text}).status_code, 201)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 2)
+
+        post.comments.first().delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+        ForumPost.objects.filter(pk=post.pk).update(comment_count=40)
+        ForumPost.rebuild_comment_counts()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+
+@mock.patch.object(ReactionBuffer, '_ensure_flusher', lambda self: None)
+class ReactionBufferTests(TestCase):
+    def setUp(self):
+        author = User.objects.create(username='author')
+        self.post = ForumPost.objects.create(author=author, title='Hot post', content='...')
+        self.users = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.buffer = ReactionBuffer()
+
+    def test_toggles_are_merged_and_flushed_in_one_go(self):
+        self.buffer.react(self.users[0], self.post.id, 'like')
+        self.buffer.react(self.users[1], self.post.id, 'like')
+        self.buffer.react(self.users[1], self.post.id, 'like')  # toggled off again
+        counts = self.buffer.react(self.users[2], self.post.id, 'dislike')
+        self.assertEqual(counts, {'likes': 1, 'dislikes': 1})
+        self.assertFalse(PostReaction.objects.exists())
+
+        self.assertEqual(self.buffer.flush(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes, self.post.dislikes), (1, 1))
+        self.assertEqual(
+            dict(PostReaction.objects.values_list('user__username', 'reaction_type')),
+            {'user0': 'like', 'user2': 'dislike'},
+        )
+
+        # Switching after the flush moves the stored reaction between counters
+        self.assertEqual(self.buffer.react(self.users[0], self.post.id, 'dislike'), {'likes': 0, 'dislikes': 2})
+        self.buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes, self.post.dislikes), (0, 2))
+
+    def test_flush_landing_after_stored_read_is_not_double_counted(self):
+        user = self.users[0]
+        self.buffer.react(user, self.post.id, 'like')
+        read = ReactionBuffer._stored_reaction
+
+        def read_then_flush(buffer, *args):
+            stored = read(buffer, *args)
+            if buffer._flushes == 0:
+                buffer.flush()
+            return stored
+
+        with mock.patch.object(ReactionBuffer, '_stored_reaction', read_then_flush):
+            counts = self.buffer.react(user, self.post.id, 'like')
+        self.assertEqual(counts, {'likes': 0, 'dislikes': 0})
+        self.buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes, 0)
+        self.assertFalse(PostReaction.objects.exists())
+
+
+@mock.patch.object(ReactionBuffer, '_ensure_flusher', lambda self: None)
+class ReactionBufferFlushRaceTests(TransactionTestCase):
+    def test_counts_read_while_a_flush_commits_are_not_double_counted(self):
+        author = User.objects.create(username='author')
+        post = ForumPost.objects.create(author=author, title='Hot post', content='...')
+        buffer = ReactionBuffer()
+        buffer.react(author, post.id, 'like')
+
+        committed, release = threading.Event(), threading.Event()
+        atomic = transaction.atomic
+
+        @contextmanager
+        def pause_after_commit(*args, **kwargs):
+            with atomic(*args, **kwargs):
+                yield
+            if not connection.in_atomic_block:
+                # Committed, but the in-flight deltas are not cleared yet
+                committed.set()
+                release.wait(5)
+
+        def run(func, *args):
+            try:
+                return func(*args)
+            finally:
+                connection.close()
+
+        with mock.patch('forum.reactions.transaction.atomic', pause_after_commit), ThreadPoolExecutor(2) as pool:
+            flush = pool.submit(run, buffer.flush)
+            self.assertTrue(committed.wait(5))
+            read = pool.submit(run, buffer.counts, post.id)
+            time.sleep(0.05)
+            release.set()
+            self.assertEqual(flush.result(), 1)
+            self.assertEqual(read.result(), {'likes': 1, 'dislikes': 0})
+        self.assertEqual(buffer.counts(post.id), {'likes': 1, 'dislikes': 0})
@@ -2,8 +2,11 @@ from rest_framework import views, status
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.shortcuts import get_object_or_404
-from .models import ForumPost, Comment, PostReaction
+from django.db import transaction
+from .models import ForumPost, Comment
 from .serializers import ForumPostSerializer, CommentSerializer
+from .pagination import ForumCursorPagination
+from .reactions import react
 
 class ForumView(views.APIView):
 
@@ -15,7 +18,8 @@ class ForumView(views.APIView):
 
     def get(self, request, pk=None):
         """
-        GET /forum/          -> all posts
+        GET /forum/          -> posts, newest first (cursor paginated, with total `count`)
+        GET /forum/?ordering=-likes -> most liked posts first
         GET /forum/<id>/     -> post by id
         GET /forum/user/     -> all posts of logged-in user
         """
@@ -33,10 +37,11 @@ class ForumView(views.APIView):
             serializer = ForumPostSerializer(post)
             return Response(serializer.data)
 
-        # GET /forum/
-        posts = ForumPost.objects.all().order_by('-id')
+        # GET /forum/?cursor=<cursor>&page_size=<n>&ordering=<-id|-likes>
+        paginator = ForumCursorPagination()
+        posts = paginator.paginate_queryset(ForumPost.objects.select_related('author'), request, view=self)
         serializer = ForumPostSerializer(posts, many=True)
-        return Response(serializer.data)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         """
@@ -68,7 +73,9 @@ class CommentListCreateView(views.APIView):
         post = get_object_or_404(ForumPost, id=post_id)
         serializer = CommentSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(author=request.user, post=post)
+            # The comment and its post's comment_count are committed together
+            with transaction.atomic():
+                serializer.save(author=request.user, post=post)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -78,47 +85,12 @@ class PostReactionView(views.APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, post_id, action):
-        post = get_object_or_404(ForumPost, id=post_id)
         if action not in ['like', 'dislike']:
             return Response({'detail': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
-            
-        # Try to get existing reaction
-        try:
-            existing_reaction = PostReaction.objects.get(user=request.user, post=post)
-            
-            if existing_reaction.reaction_type == action:
-                # If same reaction, remove it (toggle off)
-                if action == 'like':
-                    post.likes = max(0, post.likes - 1)
-                else:
-                    post.dislikes = max(0, post.dislikes - 1)
-                existing_reaction.delete()
-            else:
-                # If different reaction, update it
-                if action == 'like':
-                    post.likes += 1
-                    post.dislikes = max(0, post.dislikes - 1)
-                else:
-                    post.dislikes += 1
-                    post.likes = max(0, post.likes - 1)
-                existing_reaction.reaction_type = action
-                existing_reaction.save()
-                
-        except PostReaction.DoesNotExist:
-            # No existing reaction, create new one
-            PostReaction.objects.create(
-                user=request.user,
-                post=post,
-                reaction_type=action
-            )
-            if action == 'like':
-                post.likes += 1
-            else:
-                post.dislikes += 1
-                
-        post.save()
-        
+        post = get_object_or_404(ForumPost.objects.only('id'), id=post_id)
+
+        counts = react(request.user, post.id, action)
         return Response({
-            'likes': post.likes,
-            'dislikes': post.dislikes
+            'likes': counts['likes'],
+            'dislikes': counts['dislikes']
         })
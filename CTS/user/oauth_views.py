@@ -12,6 +12,7 @@ from .utils.google_auth import (
 )
 
 from django.middleware.csrf import get_token
+from file.utils.drive_clients import drive_clients
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -126,6 +127,7 @@ def google_oauth_callback(request):
     # Store credentials in user profile
     profile = request.user.profile
     profile.google_drive_credentials = credentials_dict
+    drive_clients.invalidate(user.id)
     
     # Create CTS root folder
     drive_service = get_google_drive_service(credentials_dict)
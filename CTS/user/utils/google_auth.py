@@ -1,4 +1,5 @@
 import os
+from datetime import datetime
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
@@ -41,6 +42,8 @@ def credentials_from_dict(credentials_dict):
         client_id=GOOGLE_OAUTH2_CLIENT_ID,
         client_secret=GOOGLE_OAUTH2_CLIENT_SECRET,
         scopes=credentials_dict.get('scopes'),
+        # Naive UTC, as google-auth expects; lets expired tokens be refreshed up front
+        expiry=datetime.fromisoformat(credentials_dict['expiry']) if credentials_dict.get('expiry') else None,
     )
 
 
@@ -50,6 +53,7 @@ def credentials_to_dict(credentials):
         'token': credentials.token,
         'refresh_token': credentials.refresh_token,
         'scopes': credentials.scopes,
+        'expiry': credentials.expiry.isoformat() if credentials.expiry else None,
     }
 
 
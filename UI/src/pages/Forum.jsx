@@ -43,29 +43,43 @@ const Forum = () => {
   const [isDialogOpen, setIsDialogOpen] = useState(false);
   const [postButton, setPostButton] = useState("Create Post");
   const [posts, setPosts] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const { isAuthenticated } = useContext(AuthContext);
   const { toast } = useToast();
 
+  const toPost = (p) => ({
+    id: p.id,
+    author: p.author_username || "Unknown",
+    title: p.title,
+    content: p.content,
+    date: p.created_at,
+    likes: p.likes || 0,
+    dislikes: p.dislikes || 0,
+    mediaUrl: p.media_link || null,
+    comment_count: p.comment_count || 0,
+  });
+
+  // The feed is cursor-paginated: each page links to the next one until `next` is null
+  const fetchPosts = async (url) => {
+    setLoadingMore(true);
+    try {
+      const res = await instance.get(url || "/forum/forum/");
+      const data = res.data.results.map(toPost);
+      setPosts((prev) => {
+        if (!url) return data;
+        const seen = new Set(prev.map((post) => post.id));
+        return [...prev, ...data.filter((post) => !seen.has(post.id))];
+      });
+      setNextPage(res.data.next);
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
-    const fetchPosts = async () => {
-      try {
-        const res = await instance.get("/forum/forum/");
-        const data = res.data.map((p) => ({
-          id: p.id,
-          author: p.author_username || "Unknown",
-          title: p.title,
-          content: p.content,
-          date: p.created_at,
-          likes: p.likes || 0,
-          dislikes: p.dislikes || 0,
-          mediaUrl: p.media_link || null,
-          comment_count: p.comment_count || 0,
-        }));
-        setPosts(data);
-      } catch (err) {
-        console.error(err);
-      }
-    };
     fetchPosts();
   }, []);
 
@@ -340,6 +354,14 @@ const Forum = () => {
             </Card>
           ))}
         </div>
+
+        {nextPage && (
+          <div className="flex justify-center">
+            <Button variant="outline" onClick={() => fetchPosts(nextPage)} disabled={loadingMore}>
+              {loadingMore ? "Loading..." : "Load more"}
+            </Button>
+          </div>
+        )}
       </div>
     </div>
   );
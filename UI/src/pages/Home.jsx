@@ -44,18 +44,20 @@ const Home = () => {
         const [
           contestsRes,
           forumRes,
+          topPostsRes,
           coursesRes,
           filesShared
         ] = await Promise.all([
           instance.get('/contest/contests/'),
-          instance.get('/forum/forum/'),
+          instance.get('/forum/forum/', { params: { page_size: 1 } }),
+          instance.get('/forum/forum/', { params: { ordering: '-likes' } }),
           instance.get('/course/courses/'),
           instance.get('/files/drive/totalShared/'),
         ]);
         // Update stats
         setStats({
           activeContests: contestsRes.data.length,
-          forumPosts: forumRes.data.length,
+          forumPosts: forumRes.data.count,
           filesShared:filesShared.data.total_shared_files, // You can add file count endpoint
           courses: coursesRes.data.length
         });
@@ -66,8 +68,8 @@ const Home = () => {
           .slice(0, 3);
         setContests(sortedContests);
 
-        // Sort forum posts by likes
-        const sortedPosts = forumRes.data
+        // Most liked posts come sorted by the server; rank them by net score
+        const sortedPosts = topPostsRes.data.results
           .sort((a, b) => (b.likes - b.dislikes) - (a.likes - a.dislikes))
           .slice(0, 4);
         setForumPosts(sortedPosts);
@@ -57,6 +57,11 @@ export const driveService = {
             });
 
             console.log('Upload response:', response.data); // Debug info
+            // The server queues the transfer to Drive and answers 202 with a job
+            if (response.status === 202) {
+                const job = await driveService.waitForJob(response.data.job_id);
+                return job.result;
+            }
             return response.data;
         } catch (error) {
             console.error('Upload error:', error.response || error); // Debug info
@@ -64,6 +69,21 @@ export const driveService = {
         }
     },
 
+    // Poll a background Drive job until it finishes
+    waitForJob: async (jobId, interval = 1000) => {
+        while (true) {
+            const response = await axios.get(`/files/drive/jobs/${jobId}/`);
+            const job = response.data;
+            if (job.status === 'succeeded') {
+                return job;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.errors?.[job.errors.length - 1] || 'Drive job failed');
+            }
+            await new Promise((resolve) => setTimeout(resolve, interval));
+        }
+    },
+
     // Create new folder
     createFolder: async (name, parentFolderId = null) => {
         try {